@@ -0,0 +1,35 @@
+"""Use a sequence for defaultcard.number
+
+Revision ID: 0e0ed9e19ee5
+Revises: 4acb2a9ba26b
+Create Date: 2026-10-18 11:02:47.815530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '0e0ed9e19ee5'
+down_revision = '4acb2a9ba26b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all 建表时 number 可能已经是 serial，这里统一成显式的序列并对齐到当前最大编号
+    op.execute('CREATE SEQUENCE IF NOT EXISTS defaultcard_number_seq')
+    op.execute('ALTER SEQUENCE defaultcard_number_seq OWNED BY defaultcard.number')
+    op.execute(
+        "SELECT setval('defaultcard_number_seq', "
+        "COALESCE((SELECT MAX(number) FROM defaultcard), 0) + 1, false)"
+    )
+    op.execute(
+        "ALTER TABLE defaultcard ALTER COLUMN number "
+        "SET DEFAULT nextval('defaultcard_number_seq')"
+    )
+
+
+def downgrade():
+    op.execute('ALTER TABLE defaultcard ALTER COLUMN number DROP DEFAULT')
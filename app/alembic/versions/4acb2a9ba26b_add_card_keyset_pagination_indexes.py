@@ -0,0 +1,34 @@
+"""Add card keyset pagination indexes
+
+Revision ID: 4acb2a9ba26b
+Revises: 1a31ce608336
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4acb2a9ba26b'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 卡片表由 SQLModel.metadata.create_all 建立，索引可能已经存在
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_defaultcard_category_time_number '
+        'ON defaultcard (category, time, number)'
+    )
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_addreplycard_number_time '
+        'ON addreplycard (number, time, number_primary)'
+    )
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_addreplycard_number_time')
+    op.execute('DROP INDEX IF EXISTS ix_defaultcard_category_time_number')
@@ -0,0 +1,51 @@
+"""Repair imageUrls stored as split characters
+
+Revision ID: 5c9d27e4b813
+Revises: b6e81d0c3a47
+Create Date: 2026-10-18 14:31:44.903516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5c9d27e4b813'
+down_revision = 'b6e81d0c3a47'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('defaultcard', 'addreplycard')
+
+
+def upgrade():
+    for table in TABLES:
+        # 列如果被建成了普通字符串，先转成 varchar[]，'{a,b}' 会被 Postgres 正确解析
+        op.execute(f'''
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = '{table}' AND column_name = 'imageUrls'
+                      AND data_type <> 'ARRAY'
+                ) THEN
+                    ALTER TABLE {table}
+                        ALTER COLUMN "imageUrls" TYPE varchar[] USING "imageUrls"::varchar[];
+                END IF;
+            END $$;
+        ''')
+        # 已经按字符拆开存进数组的行：['{', 'a', ',', 'b', '}'] -> ['a', 'b']
+        op.execute(f'''
+            UPDATE {table}
+            SET "imageUrls" = string_to_array(btrim(array_to_string("imageUrls", ''), '{{}}'), ',')
+            WHERE array_length("imageUrls", 1) > 1
+              AND "imageUrls"[1] = '{{'
+              AND "imageUrls"[array_length("imageUrls", 1)] = '}}'
+        ''')
+
+
+def downgrade():
+    # 数据修复不可逆，降级时保持修复后的数据
+    pass
@@ -0,0 +1,32 @@
+"""Make (reply_id, user_id) the primary key of replylike
+
+Revision ID: 7d3f1c52ab90
+Revises: 0e0ed9e19ee5
+Create Date: 2026-10-18 11:48:09.662913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f1c52ab90'
+down_revision = '0e0ed9e19ee5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 原主键只有 reply_id，同一条内容只能被一个用户点赞
+    op.drop_constraint('replylike_pkey', 'replylike', type_='primary')
+    op.create_primary_key('replylike_pkey', 'replylike', ['reply_id', 'user_id'])
+
+
+def downgrade():
+    op.drop_constraint('replylike_pkey', 'replylike', type_='primary')
+    op.execute(
+        'DELETE FROM replylike a USING replylike b '
+        'WHERE a.reply_id = b.reply_id AND a.created_at > b.created_at'
+    )
+    op.create_primary_key('replylike_pkey', 'replylike', ['reply_id'])
@@ -0,0 +1,118 @@
+"""Convert card time columns to timestamptz
+
+Revision ID: 8e2b61f4d0a5
+Revises: d3a7f5e21c90
+Create Date: 2026-10-18 16:02:37.281940
+
+"""
+import logging
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from app.core.config import settings
+from app.utils import parse_card_time
+
+
+# revision identifiers, used by Alembic.
+revision = '8e2b61f4d0a5'
+down_revision = 'd3a7f5e21c90'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 5000
+# (表名, 主键)
+TABLES = (('defaultcard', 'number'), ('addreplycard', 'number_primary'))
+# 无法解析的旧时间统一放到最早，避免冲到列表最前面
+UNPARSED_TIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# 删除旧的 time 列时会一起删除的索引: 索引名 -> (升级后的定义, 降级后恢复的原定义)
+TIME_INDEXES = {
+    'ix_defaultcard_category_time_number': (
+        'ON defaultcard (category, time DESC, number DESC)',
+        'ON defaultcard (category, time, number)',
+    ),
+    'ix_defaultcard_id_time_number': (
+        'ON defaultcard (id, time, number)',
+        'ON defaultcard (id, time, number)',
+    ),
+    'ix_addreplycard_number_time': (
+        'ON addreplycard (number, time, number_primary)',
+        'ON addreplycard (number, time, number_primary)',
+    ),
+    'ix_addreplycard_id_time': (
+        'ON addreplycard (id, time, number, number_primary)',
+        'ON addreplycard (id, time, number, number_primary)',
+    ),
+}
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def _backfill(table, key):
+    """按主键分批读取旧的字符串时间，解析后写入 time_at"""
+    bind = op.get_bind()
+    zone = ZoneInfo(settings.CARD_TIME_ZONE)
+    last = None
+    unparsed = 0
+    while True:
+        if last is None:
+            rows = bind.execute(
+                sa.text(f'SELECT {key}, time FROM {table} ORDER BY {key} LIMIT :size'),
+                {'size': BATCH_SIZE},
+            ).all()
+        else:
+            rows = bind.execute(
+                sa.text(f'SELECT {key}, time FROM {table} WHERE {key} > :last ORDER BY {key} LIMIT :size'),
+                {'last': last, 'size': BATCH_SIZE},
+            ).all()
+        if not rows:
+            break
+        params = []
+        for row_key, raw in rows:
+            parsed = parse_card_time(raw)
+            if parsed is None:
+                unparsed += 1
+                parsed = UNPARSED_TIME
+            elif parsed.tzinfo is None:
+                # 旧数据是客户端本地时间
+                parsed = parsed.replace(tzinfo=zone)
+            params.append({'b_key': row_key, 'b_time': parsed})
+        bind.execute(sa.text(f'UPDATE {table} SET time_at = :b_time WHERE {key} = :b_key'), params)
+        last = rows[-1][0]
+    if unparsed:
+        logger.warning(
+            '%s: %d rows had an unparseable time, set to %s', table, unparsed, UNPARSED_TIME.isoformat()
+        )
+
+
+def upgrade():
+    for table, key in TABLES:
+        op.execute(f'ALTER TABLE {table} ADD COLUMN time_at timestamptz')
+        _backfill(table, key)
+        # 删除旧列时依赖它的索引会一起删除，下面重建
+        op.execute(f'ALTER TABLE {table} DROP COLUMN time')
+        op.execute(f'ALTER TABLE {table} RENAME COLUMN time_at TO time')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN time SET DEFAULT now()')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN time SET NOT NULL')
+
+    for name, (definition, _) in TIME_INDEXES.items():
+        op.execute(f'CREATE INDEX {name} {definition}')
+
+
+def downgrade():
+    for name in TIME_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    for table, _ in TABLES:
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN time DROP DEFAULT')
+        op.execute(
+            f'ALTER TABLE {table} ALTER COLUMN time TYPE varchar '
+            f"USING to_char(time AT TIME ZONE '{settings.CARD_TIME_ZONE}', 'YYYY-MM-DD HH24:MI:SS')"
+        )
+    op.execute('ALTER TABLE defaultcard ALTER COLUMN time DROP NOT NULL')
+    # 恢复升级时删除的全部索引，定义和 4acb2a9ba26b、b6e81d0c3a47 建立时一致
+    for name, (_, definition) in TIME_INDEXES.items():
+        op.execute(f'CREATE INDEX {name} {definition}')
@@ -0,0 +1,153 @@
+"""Partition card tables by month
+
+Rewrites some existing data before the copy, each change is logged with a row count:
+- card and reply times later than now() are set to now()
+- replies earlier than their card are moved to the card's time
+The addreplycard.number -> defaultcard.number foreign key is dropped, see downgrade().
+
+Revision ID: a41c7e9d2f58
+Revises: 8e2b61f4d0a5
+Create Date: 2026-10-18 19:24:51.630417
+
+"""
+import logging
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e9d2f58'
+down_revision = '8e2b61f4d0a5'
+branch_labels = None
+depends_on = None
+
+
+# (表名, 原主键)
+TABLES = (('defaultcard', 'number'), ('addreplycard', 'number_primary'))
+# 无法解析时间的旧数据被放在 1970-01-01，不为它们建月份分区
+UNPARSED_TIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# 最多为这么多个月的历史数据建月份分区，更早的数据都放进 archive 分区
+MAX_HISTORY_MONTHS = 36
+
+INDEXES = {
+    'defaultcard': (
+        'CREATE INDEX ix_defaultcard_number ON defaultcard (number)',
+        'CREATE INDEX ix_defaultcard_category_time_number ON defaultcard (category, time DESC, number DESC)',
+        'CREATE INDEX ix_defaultcard_id_time_number ON defaultcard (id, time, number)',
+        'CREATE INDEX ix_defaultcard_content_trgm ON defaultcard USING gin (content gin_trgm_ops)',
+    ),
+    'addreplycard': (
+        'CREATE INDEX ix_addreplycard_number_time ON addreplycard (number, time, number_primary)',
+        'CREATE INDEX ix_addreplycard_id_time ON addreplycard (id, time, number, number_primary)',
+        'CREATE INDEX ix_addreplycard_content_trgm ON addreplycard USING gin (content gin_trgm_ops)',
+    ),
+}
+
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def _month_start(value):
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_partitions(table, first, last):
+    """archive 分区放 first 之前的所有数据，[first, last] 每个月一个分区"""
+    op.execute(
+        f"CREATE TABLE {table}_archive PARTITION OF {table} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{first.isoformat()}')"
+    )
+    month = first
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE {table}_y{month:%Y}m{month:%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+
+
+def upgrade():
+    bind = op.get_bind()
+    # 旧数据的时间来自客户端，时钟错误或格式误读时可能晚于现在；分区只建到
+    # CARD_PARTITION_MONTHS_AHEAD 个月之后且没有 DEFAULT 分区，超出范围的行会让迁移失败，
+    # 和无法解析的时间一样统一修正：改成迁移时间
+    for table, _ in TABLES:
+        future = bind.execute(sa.text(f'UPDATE {table} SET time = now() WHERE time > now()')).rowcount
+        if future:
+            logger.warning('%s: %d rows had a time in the future, set to now()', table, future)
+    # 查询回复时用 time >= 卡片发布时间裁剪分区；旧数据的时间来自客户端，
+    # 早于所属卡片的回复统一改成卡片的发布时间
+    moved = bind.execute(
+        sa.text(
+            'UPDATE addreplycard AS r SET time = c.time FROM defaultcard AS c '
+            'WHERE r.number = c.number AND r.time < c.time'
+        )
+    ).rowcount
+    if moved:
+        logger.warning("addreplycard: %d replies were earlier than their card, set to the card's time", moved)
+    current = _month_start(datetime.now(timezone.utc))
+    last = _add_months(current, settings.CARD_PARTITION_MONTHS_AHEAD)
+    for table, _ in TABLES:
+        oldest = bind.execute(
+            sa.text(f'SELECT min(time) FROM {table} WHERE time > :epoch'), {'epoch': UNPARSED_TIME}
+        ).scalar()
+        first = current if oldest is None else min(_month_start(oldest), current)
+        first = max(first, _add_months(current, -MAX_HISTORY_MONTHS))
+
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_unpartitioned')
+        op.execute(
+            f'CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (time)'
+        )
+        _create_partitions(table, first, last)
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_unpartitioned')
+
+    # 卡片编号的序列跟随新表，删除旧表时不能被一起删掉
+    op.execute('ALTER SEQUENCE defaultcard_number_seq OWNED BY defaultcard.number')
+    # 旧的 addreplycard.number -> defaultcard.number 外键随旧表删除：
+    # 分区表上的唯一约束必须包含分区键，number 单独不能再被外键引用
+    op.execute('DROP TABLE addreplycard_unpartitioned')
+    op.execute('DROP TABLE defaultcard_unpartitioned')
+
+    # 数据导入后再建主键和索引，在父表上建会自动建到每个分区
+    op.execute('ALTER TABLE defaultcard ADD PRIMARY KEY (number, time)')
+    op.execute('ALTER TABLE addreplycard ADD PRIMARY KEY (number_primary, time)')
+    for table, _ in TABLES:
+        for statement in INDEXES[table]:
+            op.execute(statement)
+        op.execute(f'ANALYZE {table}')
+
+
+def downgrade():
+    # 升级时改写的时间（晚于迁移时间的行、早于所属卡片的回复）没有保留原值，降级不会恢复
+    for table, _ in TABLES:
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_partitioned')
+        op.execute(f'CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {table}_partitioned')
+
+    op.execute('ALTER SEQUENCE defaultcard_number_seq OWNED BY defaultcard.number')
+    op.execute('DROP TABLE addreplycard_partitioned')
+    op.execute('DROP TABLE defaultcard_partitioned')
+
+    for table, key in TABLES:
+        op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY ({key})')
+        for statement in INDEXES[table]:
+            op.execute(statement)
+    # 升级时删除了 addreplycard.number -> defaultcard.number 外键，分区期间删除卡片不会检查回复，
+    # 可能已有指向不存在卡片的回复：这里以 NOT VALID 重建，只约束之后的写入，旧数据需要清理后再
+    # ALTER TABLE addreplycard VALIDATE CONSTRAINT addreplycard_number_fkey
+    op.execute(
+        'ALTER TABLE addreplycard ADD CONSTRAINT addreplycard_number_fkey '
+        'FOREIGN KEY (number) REFERENCES defaultcard (number) NOT VALID'
+    )
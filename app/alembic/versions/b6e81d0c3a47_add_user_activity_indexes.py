@@ -0,0 +1,34 @@
+"""Add user activity indexes
+
+Revision ID: b6e81d0c3a47
+Revises: f402f278fad2
+Create Date: 2026-10-18 13:52:07.418263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e81d0c3a47'
+down_revision = 'f402f278fad2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 个人主页的 UNION ALL 时间线：两个分支都按发布者 id 倒序扫描
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_defaultcard_id_time_number '
+        'ON defaultcard (id, time, number)'
+    )
+    op.execute(
+        'CREATE INDEX IF NOT EXISTS ix_addreplycard_id_time '
+        'ON addreplycard (id, time, number, number_primary)'
+    )
+
+
+def downgrade():
+    op.execute('DROP INDEX IF EXISTS ix_addreplycard_id_time')
+    op.execute('DROP INDEX IF EXISTS ix_defaultcard_id_time_number')
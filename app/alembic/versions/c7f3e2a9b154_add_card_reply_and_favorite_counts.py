@@ -0,0 +1,38 @@
+"""Add reply_count and favorite_count to defaultcard
+
+Revision ID: c7f3e2a9b154
+Revises: a41c7e9d2f58
+Create Date: 2026-10-18 20:11:08.452716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f3e2a9b154'
+down_revision = 'a41c7e9d2f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 常量默认值加列不需要重写表
+    op.add_column('defaultcard', sa.Column('reply_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('defaultcard', sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        'UPDATE defaultcard AS c SET reply_count = r.total '
+        'FROM (SELECT number, count(*) AS total FROM addreplycard GROUP BY number) AS r '
+        'WHERE r.number = c.number'
+    )
+    op.execute(
+        'UPDATE defaultcard AS c SET favorite_count = f.total '
+        'FROM (SELECT card_number, count(*) AS total FROM cardfavorite GROUP BY card_number) AS f '
+        'WHERE f.card_number = c.number'
+    )
+
+
+def downgrade():
+    op.drop_column('defaultcard', 'favorite_count')
+    op.drop_column('defaultcard', 'reply_count')
@@ -0,0 +1,37 @@
+"""Add content trigram indexes
+
+Revision ID: d3a7f5e21c90
+Revises: 5c9d27e4b813
+Create Date: 2026-10-18 15:06:12.552981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a7f5e21c90'
+down_revision = '5c9d27e4b813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # 大表上建索引不能锁表，CONCURRENTLY 不能在事务里执行
+    with op.get_context().autocommit_block():
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_defaultcard_content_trgm '
+            'ON defaultcard USING gin (content gin_trgm_ops)'
+        )
+        op.execute(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_addreplycard_content_trgm '
+            'ON addreplycard USING gin (content gin_trgm_ops)'
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_addreplycard_content_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_defaultcard_content_trgm')
@@ -0,0 +1,42 @@
+"""Add cardfavorite.created_at and per-user favorite key
+
+Revision ID: f402f278fad2
+Revises: 7d3f1c52ab90
+Create Date: 2026-10-18 13:20:55.104327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'f402f278fad2'
+down_revision = '7d3f1c52ab90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 和卡片时间一样用 timestamptz，数据库默认值和应用写入的 UTC 时间含义一致
+    op.add_column(
+        'cardfavorite',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    # 原主键只有 card_number，同一张卡片只能被一个用户收藏
+    op.drop_constraint('cardfavorite_pkey', 'cardfavorite', type_='primary')
+    op.create_primary_key('cardfavorite_pkey', 'cardfavorite', ['card_number', 'user_id'])
+    op.create_index(
+        'ix_cardfavorite_user_id_created_at', 'cardfavorite', ['user_id', 'created_at']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_cardfavorite_user_id_created_at', table_name='cardfavorite')
+    op.drop_constraint('cardfavorite_pkey', 'cardfavorite', type_='primary')
+    op.execute(
+        'DELETE FROM cardfavorite a USING cardfavorite b '
+        'WHERE a.card_number = b.card_number AND a.created_at > b.created_at'
+    )
+    op.create_primary_key('cardfavorite_pkey', 'cardfavorite', ['card_number'])
+    op.drop_column('cardfavorite', 'created_at')
@@ -1,17 +1,18 @@
 from collections.abc import Generator
-from typing import Annotated, AsyncGenerator
+from typing import Annotated, Any, AsyncGenerator
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from loguru import logger
+from redis.exceptions import RedisError
 from pydantic import ValidationError
 from sqlmodel import Session
 from sqlmodel.ext.asyncio.session import AsyncSession # For SQLModel
 # from sqlalchemy.ext.asyncio import AsyncSession # For pure SQLAlchemy
-from app.core import security
+from app.core import security, user_cache
 from app.core.config import settings
-from app.core.db import engine # Assuming this 'engine' is now an AsyncEngine
+from app.core.db import engine, replica_engine # Assuming this 'engine' is now an AsyncEngine
 from app.models import TokenPayload, User
 from smtplib import SMTP
 from email.mime.text import MIMEText
@@ -24,6 +25,10 @@ import redis.asyncio as aioredis # For asynchronous Redis operations
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
+# 公开接口的可选 token：没有登录时为 None，不报错
+optional_oauth2 = OAuth2PasswordBearer(
+    tokenUrl=f"{settings.API_V1_STR}/login/access-token", auto_error=False
+)
 
 # 依赖项函数：获取数据库会话
 # 使用 'yield' 确保会话在使用后被正确关闭
@@ -81,6 +86,14 @@ async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
 
 AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 
+# --- Begin Redis Dependency ---
+# 每个 worker 共用 lifespan 中创建的 Redis 客户端（见 app.main 和 app.core.redis_pool），不再每个请求新建连接
+def get_redis(request: Request) -> aioredis.Redis:
+    return request.app.state.redis
+# Type annotation for Redis dependency
+RedisClient = Annotated[aioredis.Redis, Depends(get_redis)]
+# --- End Redis Dependency ---
+
 
 # 类型注解：用于 FastAPI 依赖注入的 Token 字符串
 # Annotated[str, Depends(reusable_oauth2)] 表示参数类型是 str，
@@ -88,13 +101,15 @@ AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
 # 依赖项函数：获取当前已认证的用户
-async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
+async def get_current_user(session: AsyncSessionDep, token: TokenDep, redis: RedisClient) -> User:
     """
-    解析并验证 token，然后从数据库中获取对应的用户。
+    解析并验证 token，然后获取对应的用户。
+    先按 token 摘要查用户缓存（进程内 + Redis），未命中时才验证 token 并查询数据库。
 
     Args:
         session: 异步数据库会话，通过 AsyncSessionDep 注入。
         token: 从请求头中提取的 Bearer Token 字符串，通过 TokenDep 注入。
+        redis: Redis 客户端，用于二级用户缓存。
 
     Raises:
         HTTPException(403): 如果 token 无效或格式错误。
@@ -102,8 +117,21 @@ async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
         HTTPException(400): 如果用户已被禁用 (is_active=False)。
 
     Returns:
-        从数据库中获取的 User 对象。
+        由用户快照构造的 User 对象（不在会话中，没有密码哈希）。
+        需要修改当前用户时请使用 CurrentDbUser。
     """
+    digest = user_cache.token_digest(token)
+    snapshot = await user_cache.get(redis, digest)
+    if snapshot is None:
+        snapshot = await _load_user_snapshot(session, token, redis, digest)
+    if not snapshot["is_active"]:
+        # 如果用户已被禁用，抛出 400 错误
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效用户")
+    return user_cache.to_user(snapshot)
+
+
+async def _load_user_snapshot(session: AsyncSession, token: str, redis: aioredis.Redis, digest: str) -> dict[str, Any]:
+    """缓存未命中：验证 token，从数据库读取用户并写入缓存"""
     try:
         # 使用密钥和算法解码 JWT token
         payload = jwt.decode(
@@ -122,17 +150,22 @@ async def get_current_user(session: AsyncSessionDep, token: TokenDep) -> User:
     if not user:
         # 如果数据库中找不到该用户，抛出 404 错误
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户未找到")
-    if not user.is_active:
-        # 如果用户已被禁用，抛出 400 错误
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效用户")
-    # 返回有效的用户对象
-    return user
+    return await user_cache.put(redis, digest, user, payload.get("exp"))
 
 # 类型注解：用于 FastAPI 依赖注入的当前用户对象
 # Annotated[User, Depends(get_current_user)] 表示参数类型是 User，
 # 并且它的值应该通过调用 get_current_user() 函数来获取
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
+# 依赖项函数：从数据库读取当前用户，用于需要修改用户或读取密码哈希的接口
+async def get_current_db_user(session: AsyncSessionDep, current_user: CurrentUser) -> User:
+    user = await session.get(User, current_user.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="用户未找到")
+    return user
+
+CurrentDbUser = Annotated[User, Depends(get_current_db_user)]
+
 # 依赖项函数：获取当前已认证且具有超级用户权限的用户
 async def get_current_active_superuser(current_user: CurrentUser) -> User:
     """
@@ -158,16 +191,54 @@ async def get_current_active_superuser(current_user: CurrentUser) -> User:
     # 返回具有超级用户权限的用户对象
     return current_user
 
-# --- Begin Redis Dependency ---
-REDIS_URL = "redis://localhost:6379/0"
-async def get_redis() -> AsyncGenerator[aioredis.Redis, None]:
-    redis_client = None
+# --- Begin Read Replica Dependency ---
+# 用户最近写入过的标记，存在期间该用户的读请求走主库，响应也不允许被缓存
+RECENT_WRITE_KEY = "recent-write:{user_id}"
+
+
+async def mark_recent_write(redis: aioredis.Redis, user_id: Any) -> None:
+    """
+    写接口成功后调用，READ_YOUR_WRITES_SECONDS 秒内该用户的读请求不走副本，也不使用 HTTP 缓存
+    """
     try:
-        redis_client = aioredis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
-        yield redis_client
-    finally:
-        if redis_client:
-            await redis_client.close()
-# Type annotation for Redis dependency
-RedisClient = Annotated[aioredis.Redis, Depends(get_redis)]
-# --- End Redis Dependency ---
+        await redis.set(RECENT_WRITE_KEY.format(user_id=user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+    except RedisError as e:
+        logger.warning(f"写入读己之写标记失败: {e}")
+
+
+async def recently_wrote(redis: aioredis.Redis, token: str) -> bool:
+    """token 对应的用户是否刚写入过；token 无效时当作匿名用户"""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[security.ALGORITHM])
+    except InvalidTokenError:
+        return False
+    user_id = payload.get("sub")
+    if not user_id:
+        return False
+    try:
+        return bool(await redis.exists(RECENT_WRITE_KEY.format(user_id=user_id)))
+    except RedisError as e:
+        # 拿不到标记时保守地走主库
+        logger.warning(f"读取读己之写标记失败: {e}")
+        return True
+
+
+async def get_read_db(
+    redis: RedisClient, token: Annotated[str | None, Depends(optional_oauth2)]
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    只读接口的数据库会话：默认走只读副本，刚写入过的用户仍走主库
+    会话只能用来查询，写操作请使用 AsyncSessionDep
+    """
+    read_engine = replica_engine
+    if replica_engine is not engine and token and await recently_wrote(redis, token):
+        read_engine = engine
+    async with AsyncSession(read_engine) as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_db)]
+# --- End Read Replica Dependency ---
@@ -1,31 +1,311 @@
+import asyncio
 import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Depends,HTTPException,Request, Query, File, UploadFile, Form, status
-from sqlalchemy import or_
+from sqlalchemy import Integer, String, Uuid, cast, delete, func, literal, null, or_, tuple_, union_all, update
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from pydantic import BaseModel, Field, HttpUrl
+from fastapi.responses import Response, StreamingResponse
 from loguru import logger
-from typing import Optional, Any, List
+from typing import Annotated, Optional, Any, List
 import hashlib
 import os
+import redis.asyncio as aioredis
 
 from app import crud
-from app.api.deps import AsyncSessionDep, CurrentUser, SessionDep, RedisClient
+from app.api.deps import AsyncSessionDep, CurrentUser, ReadSessionDep, SessionDep, RedisClient, mark_recent_write, \
+    optional_oauth2, recently_wrote
+from app.core import broadcast, counters, partitions, timeline, trending
+from app.core.config import settings
+from app.core.db import replica_engine
 from app.models import AddReplyCard, AddReplyCard_Client, DefaultCard, DefaultCardResponse, Message, CardRequest, \
     AddCard, ReplyCardRequest, AddReplyCardResponse, CardRequest_New, LikeRequest, ReplyLike, ImageUploadResponse, \
-    ImageData, ImageDataLinks, ImagePathInfo, UserFindCardRequest, UserFindCardResponse, FavoriteRequest, CardFavorite, \
-    CardFavoriteRequest
+    ImageData, ImageDataLinks, ImagePathInfo, ReplyPreview, UserFindCardRequest, UserFindCardResponse, UserActivityItem, FavoriteRequest, CardFavorite, \
+    CardFavoriteRequest, ViewerStateRequest, ViewerStateResponse, CardSearchRequest, CardSearchResponse, \
+    CardSinceRequest, CardSinceResponse, ReplySinceRequest, ReplySinceResponse
+from app.utils import decode_cursor, encode_cursor, localize_card_time, parse_cursor_time
 
 ##################该页面定义了获取聊天卡片信息的接口以及实现
 
 router = APIRouter(prefix="/cards", tags=["cards"])
 TOTAL_API_CALLS_KEY = "total_api_calls"
 
+
+def _json_response(model: type[SQLModel], headers: dict[str, str] | None = None, **fields: Any) -> Response:
+    """
+    卡片列表直接来自数据库，不需要响应模型再校验一遍：
+    用 model_construct 跳过校验，由 pydantic-core 直接序列化成 bytes
+    """
+    content = model.__pydantic_serializer__.to_json(model.model_construct(**fields))
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def _weak_etag(*versions: Any) -> str:
+    """由一组版本信息生成弱 ETag"""
+    digest = hashlib.sha1("|".join(str(v) for v in versions).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """
+    If-None-Match 是否命中（弱比较，忽略 W/ 前缀）
+    304 只能用于 GET/HEAD（RFC 9110 13.1.2），旧的 POST 接口始终返回完整响应
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def _cache_headers(result: Any, response: Response, cache_control: str) -> Any:
+    """
+    给 GET 读接口加上缓存头；接口直接返回 Response（包括 304）时写在它上面，否则写在注入的 response 上
+    """
+    target = result if isinstance(result, Response) else response
+    target.headers["Cache-Control"] = cache_control
+    # 带 token 和不带 token 的请求缓存策略不同，代理不能混用
+    target.headers["Vary"] = "Accept-Encoding, Authorization"
+    return result
+
+
+async def _feed_cache_control(redis: aioredis.Redis, token: str | None) -> str:
+    """
+    公开列表的缓存策略：匿名请求可以被代理缓存；带 token 的请求只让浏览器缓存，
+    刚写入过的用户不缓存，否则会读到代理或浏览器里发帖之前的页面（读己之写见 deps.get_read_db）
+    """
+    if not token:
+        return f"public, max-age={settings.CARD_PUBLIC_CACHE_SECONDS}"
+    if await recently_wrote(redis, token):
+        return "private, no-store"
+    return f"private, max-age={settings.CARD_PUBLIC_CACHE_SECONDS}"
+
+
+def _replies_after(cards: Any) -> datetime:
+    """
+    回复不会早于所属卡片发布，查询一批卡片的回复时用最早的卡片时间作为 time 下限，
+    回复表只需要扫这之后的分区
+    """
+    return min(card.time for card in cards)
+
+
+def _page_size(limit: int) -> int:
+    """客户端请求的每页数量，不超过服务端上限"""
+    return min(limit, settings.CARD_PAGE_SIZE_MAX)
+
+
+def _parse_cursor(cursor: str, size: int) -> list[Any]:
+    values = decode_cursor(cursor, size)
+    if values is None:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return values
+
+
+def _card_keyset(statement: Any, position: list[Any] | None) -> Any:
+    """
+    话题卡片按 (time, number) 倒序翻页，position 为上一页最后一张卡片的排序键
+    """
+    if position:
+        try:
+            if not isinstance(position, list) or len(position) != 2:
+                raise ValueError(position)
+            last_time, last_number = parse_cursor_time(position[0]), int(position[1])
+        except (TypeError, ValueError, IndexError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        # 单独的 time 条件让规划器能裁剪掉更新的分区（行比较不参与分区裁剪）
+        statement = statement.where(
+            DefaultCard.time <= last_time,
+            tuple_(DefaultCard.time, DefaultCard.number) < (last_time, last_number),
+        )
+    return statement.order_by(DefaultCard.time.desc(), DefaultCard.number.desc())
+
+
+def _card_next_cursor(cards: Any, limit: int) -> str | None:
+    if len(cards) < limit:
+        return None
+    return encode_cursor(cards[-1].time, cards[-1].number)
+
+
+def _reply_keyset(statement: Any, position: list[Any] | None) -> Any:
+    """
+    回复卡片按 (time, number_primary) 正序翻页
+    """
+    if position:
+        try:
+            if not isinstance(position, list) or len(position) != 2:
+                raise ValueError(position)
+            last_time, last_uuid = parse_cursor_time(position[0]), uuid.UUID(str(position[1]))
+        except (TypeError, ValueError, IndexError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        statement = statement.where(
+            AddReplyCard.time >= last_time,
+            tuple_(AddReplyCard.time, AddReplyCard.number_primary) > (last_time, last_uuid),
+        )
+    return statement.order_by(AddReplyCard.time, AddReplyCard.number_primary)
+
+
+def _user_activity_query(user_id: str, position: list[Any] | None, size: int) -> Any:
+    """
+    用户发布的话题和回复用 UNION ALL 合并成一条时间线，按 (time, kind, number, number_primary) 倒序
+    两个分支各自按 id 索引倒序取前 size 条，外层再合并排序，只需一次查询
+    position 为上一页最后一项的排序键 [time, kind, number, number_primary]
+    """
+    card_statement = select(
+        literal("card").label("kind"),
+        DefaultCard.number,
+        cast(null(), Uuid).label("number_primary"),
+        DefaultCard.id,
+        DefaultCard.content,
+        DefaultCard.time,
+        DefaultCard.category,
+        cast(null(), String).label("reply"),
+        DefaultCard.thumbs,
+        DefaultCard.imageUrls,
+        DefaultCard.reply_count,
+        DefaultCard.favorite_count,
+    ).where(DefaultCard.id == user_id)
+    reply_statement = select(
+        literal("reply").label("kind"),
+        AddReplyCard.number,
+        AddReplyCard.number_primary,
+        AddReplyCard.id,
+        AddReplyCard.content,
+        AddReplyCard.time,
+        cast(null(), String).label("category"),
+        AddReplyCard.reply,
+        AddReplyCard.thumbs,
+        AddReplyCard.imageUrls,
+        cast(null(), Integer).label("reply_count"),
+        cast(null(), Integer).label("favorite_count"),
+    ).where(AddReplyCard.id == user_id)
+
+    if position:
+        try:
+            if not isinstance(position, list) or len(position) != 4 or position[1] not in ("card", "reply"):
+                raise ValueError(position)
+            last_time, last_kind, last_number = parse_cursor_time(position[0]), position[1], int(position[2])
+            last_uuid = uuid.UUID(str(position[3])) if last_kind == "reply" else None
+        except (TypeError, ValueError, IndexError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        # 同一时间内 "reply" 排在 "card" 前面
+        if last_kind == "card":
+            card_statement = card_statement.where(
+                tuple_(DefaultCard.time, DefaultCard.number) < (last_time, last_number)
+            )
+            reply_statement = reply_statement.where(AddReplyCard.time < last_time)
+        else:
+            card_statement = card_statement.where(DefaultCard.time <= last_time)
+            reply_statement = reply_statement.where(
+                tuple_(AddReplyCard.time, AddReplyCard.number, AddReplyCard.number_primary)
+                < (last_time, last_number, last_uuid)
+            )
+
+    card_branch = (
+        card_statement.order_by(DefaultCard.time.desc(), DefaultCard.number.desc())
+        .limit(size)
+        .subquery()
+    )
+    reply_branch = (
+        reply_statement.order_by(
+            AddReplyCard.time.desc(), AddReplyCard.number.desc(), AddReplyCard.number_primary.desc()
+        )
+        .limit(size)
+        .subquery()
+    )
+    activity = union_all(select(*card_branch.c), select(*reply_branch.c)).subquery("activity")
+    return select(*activity.c).order_by(
+        activity.c.time.desc(),
+        activity.c.kind.desc(),
+        activity.c.number.desc(),
+        activity.c.number_primary.desc(),
+    )
+
+
+def _since_number_queries(category: str, since_number: int) -> tuple[Any, Any]:
+    """
+    返回 (比 since_number 更新的卡片, 需要补发的卡片) 两条查询
+    编号由序列在插入时分配，提交前不可见：编号较小的卡片可能在客户端拿到更大的编号之后才提交，
+    所以再补发 since_number 那张卡片之前 SINCE_SYNC_OVERLAP_SECONDS 内发布的卡片
+    """
+    statement = select(DefaultCard).where(DefaultCard.category == category)
+    newer = statement.where(DefaultCard.number > since_number).order_by(DefaultCard.number)
+    mark_time = select(func.max(DefaultCard.time)).where(DefaultCard.number == since_number).scalar_subquery()
+    late = statement.where(
+        DefaultCard.number < since_number,
+        DefaultCard.time >= mark_time - timedelta(seconds=settings.SINCE_SYNC_OVERLAP_SECONDS),
+    ).order_by(DefaultCard.number)
+    return newer, late
+
+
+async def _reply_previews(
+    session: AsyncSession, cards: Any, size: int, order: str
+) -> dict[int, ReplyPreview]:
+    """
+    一次窗口函数查询取出这一页每张卡片的回复数和前 size 条回复
+    order 为 "thumbs" 时按点赞数倒序，"latest" 时按时间倒序
+    """
+    previews = {card.number: ReplyPreview() for card in cards}
+    if not previews:
+        return previews
+    if order == "thumbs":
+        rank_order = (AddReplyCard.thumbs.desc(), AddReplyCard.time.desc(), AddReplyCard.number_primary)
+    else:
+        rank_order = (AddReplyCard.time.desc(), AddReplyCard.number_primary)
+    ranked = (
+        select(
+            AddReplyCard,
+            func.row_number().over(partition_by=AddReplyCard.number, order_by=rank_order).label("rank"),
+            func.count().over(partition_by=AddReplyCard.number).label("reply_count"),
+        )
+        .where(AddReplyCard.number.in_(list(previews)), AddReplyCard.time >= _replies_after(cards))
+        .subquery()
+    )
+    reply = aliased(AddReplyCard, ranked)
+    # 至少取每张卡片的第一条，size 为 0 时也能拿到回复数
+    statement = (
+        select(reply, ranked.c.rank, ranked.c.reply_count)
+        .where(ranked.c.rank <= max(size, 1))
+        .order_by(ranked.c.number, ranked.c.rank)
+    )
+    result = await session.exec(statement)
+    for row_reply, rank, reply_count in result.all():
+        preview = previews[row_reply.number]
+        preview.reply_count = reply_count
+        if rank <= size:
+            preview.replies.append(row_reply)
+    return previews
+
+
+async def _ndjson_cards(redis: aioredis.Redis, statement: Any) -> AsyncIterator[bytes]:
+    """
+    通过服务端游标逐批读取卡片，每批合并尚未写回的点赞增量后每张卡片输出一行 JSON，thumbs 与 JSON 列表一致
+    响应开始发送后请求的依赖已经结束，所以这里单独开一个会话
+    """
+    async with AsyncSession(replica_engine) as session:
+        result = await session.stream_scalars(
+            statement.execution_options(yield_per=settings.CARD_STREAM_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            await counters.merge_pending(redis, cards=batch)
+            yield b"".join(card.model_dump_json().encode("utf-8") + b"\n" for card in batch)
+
+
 # --- Stress Test Endpoint ---
 @router.get("/stress-test-cards", response_model=DefaultCardResponse)
 async def get_stress_test_cards(
-    session: AsyncSessionDep, 
+    session: ReadSessionDep, 
+    redis: RedisClient,
+    stream: bool = Query(False, description="为 true 时以 NDJSON 流式返回，每行一张卡片"),
 ):
     """
     压力测试的地方
@@ -34,64 +314,308 @@ async def get_stress_test_cards(
     # 从数据库获取cards
     statement = select(DefaultCard).where(DefaultCard.category=="time").offset(0)
     statement = statement.order_by(DefaultCard.time.desc())
+    if stream:
+        return StreamingResponse(_ndjson_cards(redis, statement), media_type="application/x-ndjson")
     # 确保异步执行数据库查询
     result = await session.exec(statement) # <--- 使用 await
     cards = result.all()                   # <--- 获取结果
-    return DefaultCardResponse(data=cards)
+    await counters.merge_pending(redis, cards=cards)
+    return _json_response(DefaultCardResponse, data=cards)
 # --- End Stress Test Endpoint ---
 
 # 请求话题卡片的接口
-@router.post("/getcard", response_model=DefaultCardResponse)
-async def get_card(session: AsyncSessionDep, request_data: CardRequest, ):
+@router.get("/getcard", response_model=DefaultCardResponse)
+async def get_card_query(
+    session: ReadSessionDep,
+    redis: RedisClient,
+    request_data: Annotated[CardRequest, Query()],
+    request: Request,
+    response: Response,
+    token: Annotated[str | None, Depends(optional_oauth2)],
+):
+    """话题列表的 GET 版本，参数同 POST 请求体，可被代理和浏览器短暂缓存"""
+    result = await get_card(session, redis, request_data, request)
+    return _cache_headers(result, response, await _feed_cache_control(redis, token))
+
+# POST 版本保留给旧客户端，新客户端使用 GET
+@router.post("/getcard", response_model=DefaultCardResponse, deprecated=True)
+async def get_card(session: ReadSessionDep, redis: RedisClient, request_data: CardRequest, request: Request, ):
     
-    statement = select(DefaultCard).where(DefaultCard.category==request_data.category).offset(request_data.skip).limit(5)
-    statement = statement.order_by(DefaultCard.time.desc())
-    result = await session.exec(statement)
-    cards = result.all()
-    return DefaultCardResponse(data = cards)
+    limit = _page_size(request_data.limit)
+    if not request_data.cursor:
+        # 按页码翻页时优先读 Redis 时间线
+        cards = await timeline.read_page(redis, session, request_data.category, request_data.skip, limit)
+    else:
+        cards = None
+    if cards is None:
+        statement = select(DefaultCard).where(DefaultCard.category==request_data.category)
+        if request_data.cursor:
+            statement = _card_keyset(statement, _parse_cursor(request_data.cursor, 2))
+        else:
+            statement = _card_keyset(statement, None).offset(request_data.skip)
+        result = await session.exec(statement.limit(limit))
+        cards = result.all()
+
+    previews = None
+    preview_replies: list[AddReplyCard] = []
+    if request_data.expand:
+        # 首页一次请求拿到卡片和回复预览，不用再逐张调用 getreplycard
+        preview_size = min(request_data.preview_size, settings.REPLY_PREVIEW_SIZE_MAX)
+        previews = await _reply_previews(session, cards, preview_size, request_data.preview_order)
+        preview_replies = [reply for preview in previews.values() for reply in preview.replies]
+    await counters.merge_pending(redis, cards=cards, replies=preview_replies)
+
+    # 页面的 ETag 由响应的形状和这一页每张卡片的版本（编号、点赞数、回复数、收藏数）组成，未变化时不再序列化
+    next_cursor = _card_next_cursor(cards, limit)
+    etag = _weak_etag(
+        request_data.expand,
+        request_data.preview_size,
+        request_data.preview_order,
+        next_cursor,
+        *(f"{card.number}:{card.thumbs}:{card.reply_count}:{card.favorite_count}" for card in cards),
+        *(f"{reply.number_primary}:{reply.thumbs}" for reply in preview_replies),
+    )
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return _json_response(
+        DefaultCardResponse, headers={"ETag": etag}, data=cards, next_cursor=next_cursor, previews=previews
+    )
 
 @router.get("/getonecard/{number}", response_model=DefaultCardResponse)
-async def get_onecard(number:int, session:AsyncSessionDep, ):
-    
-    result = await session.exec(select(DefaultCard).where(DefaultCard.number == number))
+async def get_onecard(number:int, session:ReadSessionDep, redis: RedisClient, request: Request, ):
+    """
+    单张卡片，带弱 ETag：卡片内容不会修改，版本只由点赞数、回复数和收藏数决定
+    先只查版本，If-None-Match 命中时直接 304，不加载整行
+    """
+    versions = await partitions.hot_first(
+        session,
+        select(DefaultCard.time, DefaultCard.thumbs, DefaultCard.reply_count, DefaultCard.favorite_count)
+        .where(DefaultCard.number == number),
+        DefaultCard.time,
+    )
+    if not versions:
+        raise HTTPException(status_code=404, detail="卡片不存在")
+    card_time, thumbs, replies, favorites = versions[0]
+    (delta,) = await counters.pending_deltas(redis, [("card", number)])
+    etag = f'W/"card-{number}-{max((thumbs or 0) + delta, 0)}-{replies}-{favorites}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    # 已经知道发布时间，整行只需查一个分区
+    result = await session.exec(
+        select(DefaultCard).where(DefaultCard.number == number, DefaultCard.time == card_time)
+    )
     thecard = result.first()
     if not thecard:
         raise HTTPException(status_code=404, detail="卡片不存在")
-    return DefaultCardResponse(data=[thecard])
+    await counters.merge_pending(redis, cards=[thecard])
+    return _json_response(DefaultCardResponse, headers={"ETag": etag}, data=[thecard])
+
+@router.get("/trending", response_model=DefaultCardResponse)
+async def get_trending(
+    session: ReadSessionDep,
+    redis: RedisClient,
+    category: str = Query(..., description="卡片分类"),
+    limit: int = Query(10, ge=1),
+):
+    """
+    热门卡片：直接读取预先计算好的热度榜前 N 名
+    """
+    limit = _page_size(limit)
+    numbers = await trending.top_numbers(redis, session, category, limit)
+    if numbers is None:
+        # 热度榜正在重建或 Redis 不可用，先按点赞数返回最新卡片中的前几名
+        statement = (
+            select(DefaultCard)
+            .where(DefaultCard.category == category)
+            .order_by(DefaultCard.time.desc(), DefaultCard.number.desc())
+            .limit(settings.TRENDING_MAX_LENGTH)
+            .subquery()
+        )
+        recent = aliased(DefaultCard, statement)
+        result = await session.exec(select(recent).order_by(recent.thumbs.desc(), recent.number.desc()).limit(limit))
+        cards = result.all()
+    else:
+        cards = await timeline.get_cards(redis, session, numbers)
+    await counters.merge_pending(redis, cards=cards)
+    return _json_response(DefaultCardResponse, data=cards)
+
+async def _card_events(request: Request, category: str, last_number: int | None) -> AsyncIterator[str]:
+    """
+    SSE 事件流：先补发断线期间错过的卡片，之后转发订阅收到的新卡片，空闲时发送心跳
+    """
+    async with broadcast.listen(category) as queue:
+        sent: set[int] = set()
+        if last_number is not None:
+            # 先注册队列再查数据库，查询期间发布的卡片不会漏掉，重复的按编号跳过
+            newer, late = _since_number_queries(category, last_number)
+            async with AsyncSession(replica_engine) as session:
+                missed = [
+                    *(await session.exec(late.limit(settings.CARD_PAGE_SIZE_MAX))).all(),
+                    *(await session.exec(newer.limit(settings.CARD_PAGE_SIZE_MAX))).all(),
+                ]
+            for card in missed:
+                sent.add(card.number)
+                if card.number < last_number:
+                    # 补发的晚提交卡片不带 id，浏览器的 Last-Event-ID 不会倒退
+                    yield f"event: card\ndata: {card.model_dump_json()}\n\n"
+                    continue
+                last_number = card.number
+                yield f"id: {card.number}\nevent: card\ndata: {card.model_dump_json()}\n\n"
+        while not await request.is_disconnected():
+            try:
+                number, payload = await asyncio.wait_for(
+                    queue.get(), timeout=settings.CARD_STREAM_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if number in sent:
+                continue
+            if last_number is not None and number < last_number:
+                # 晚提交的卡片编号比已推送的小，同样不带 id
+                yield f"event: card\ndata: {payload}\n\n"
+                continue
+            last_number = number
+            yield f"id: {number}\nevent: card\ndata: {payload}\n\n"
+
+
+@router.get("/stream")
+async def stream_new_cards(
+    request: Request,
+    category: str = Query(..., description="卡片分类"),
+):
+    """
+    以 Server-Sent Events 推送某个分类的新卡片，代替轮询 getnewcard
+    断线重连时浏览器会带上 Last-Event-ID（卡片编号），服务端补发之后的卡片
+    """
+    last_event_id = request.headers.get("last-event-id")
+    last_number = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        _card_events(request, category, last_number),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # 请求最新的一个卡片，通过category去查询
-@router.post("/getnewcard",response_model=DefaultCardResponse)
-async def get_new_card(session:AsyncSessionDep,request_data:CardRequest_New, ):
+@router.get("/getnewcard", response_model=DefaultCardResponse)
+async def get_new_card_query(
+    session: ReadSessionDep,
+    redis: RedisClient,
+    request_data: Annotated[CardRequest_New, Query()],
+    response: Response,
+    token: Annotated[str | None, Depends(optional_oauth2)],
+):
+    result = await get_new_card(session, redis, request_data)
+    return _cache_headers(result, response, await _feed_cache_control(redis, token))
+
+@router.post("/getnewcard",response_model=DefaultCardResponse, deprecated=True)
+async def get_new_card(session:ReadSessionDep,redis: RedisClient,request_data:CardRequest_New, ):
     
     statement = select(DefaultCard).where(DefaultCard.category==request_data.category).order_by(DefaultCard.time.desc()).limit(1)
     result = await session.exec(statement)
     card = result.first()
-    return DefaultCardResponse(data = card)
+    if card:
+        await counters.merge_pending(redis, cards=[card])
+    return _json_response(DefaultCardResponse, data=[card] if card else [])
 
 # 请求回复卡片的内容
-@router.post("/getreplycard",response_model=AddReplyCardResponse)
-async def get_reply_card(session:AsyncSessionDep,request_data:ReplyCardRequest, ):
+@router.get("/getreplycard", response_model=AddReplyCardResponse)
+async def get_reply_card_query(
+    session: ReadSessionDep,
+    redis: RedisClient,
+    request_data: Annotated[ReplyCardRequest, Query()],
+    request: Request,
+    response: Response,
+    token: Annotated[str | None, Depends(optional_oauth2)],
+):
+    result = await get_reply_card(session, redis, request_data, request)
+    return _cache_headers(result, response, await _feed_cache_control(redis, token))
+
+@router.post("/getreplycard",response_model=AddReplyCardResponse, deprecated=True)
+async def get_reply_card(session:ReadSessionDep,redis: RedisClient,request_data:ReplyCardRequest, request: Request, ):
     
-    statement = select(AddReplyCard).where(AddReplyCard.number==request_data.number).offset(request_data.skip).limit(5)
-    result = await session.exec(statement)
+    limit = _page_size(request_data.limit)
+    # 回复不早于卡片发布时间，执行时按卡片时间裁剪掉更早的回复分区
+    card_time = select(DefaultCard.time).where(DefaultCard.number == request_data.number).scalar_subquery()
+    statement = select(AddReplyCard).where(AddReplyCard.number==request_data.number, AddReplyCard.time >= card_time)
+    if request_data.cursor:
+        statement = _reply_keyset(statement, _parse_cursor(request_data.cursor, 2))
+    else:
+        statement = _reply_keyset(statement, None).offset(request_data.skip)
+    result = await session.exec(statement.limit(limit))
+    cards = result.all()
+    await counters.merge_pending(redis, replies=cards)
+    next_cursor = None
+    if len(cards) == limit:
+        next_cursor = encode_cursor(cards[-1].time, cards[-1].number_primary)
+    etag = _weak_etag(next_cursor, *(f"{card.number_primary}:{card.thumbs}" for card in cards))
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return _json_response(AddReplyCardResponse, headers={"ETag": etag}, data=cards, next_cursor=next_cursor)
+
+@router.post("/getcard-since", response_model=CardSinceResponse)
+async def get_card_since(session: ReadSessionDep, redis: RedisClient, request_data: CardSinceRequest, ):
+    """
+    下拉刷新的增量同步：返回分类中比客户端已有卡片更新的卡片（从旧到新），一次范围查询
+    晚提交的卡片可能落在客户端位置之前，开头另外补发位置之前不久发布的卡片，客户端按编号去重
+    """
+    limit = min(request_data.limit, settings.SINCE_SYNC_LIMIT_MAX)
+    if request_data.since_number is not None:
+        # 卡片编号由序列生成，越新越大，走主键范围扫描
+        newer, late = _since_number_queries(request_data.category, request_data.since_number)
+    elif request_data.since_time is not None:
+        since_time = localize_card_time(request_data.since_time)
+        statement = select(DefaultCard).where(DefaultCard.category == request_data.category)
+        newer = statement.where(DefaultCard.time > since_time).order_by(DefaultCard.time, DefaultCard.number)
+        late = statement.where(
+            DefaultCard.time <= since_time,
+            DefaultCard.time > since_time - timedelta(seconds=settings.SINCE_SYNC_OVERLAP_SECONDS),
+        ).order_by(DefaultCard.time, DefaultCard.number)
+    else:
+        raise HTTPException(status_code=400, detail="需要提供 since_number 或 since_time")
+    # 多取一条判断是否还有更多；has_more 只看更新的卡片，补发的卡片不影响客户端的下一次位置
+    result = await session.exec(newer.limit(limit + 1))
     cards = result.all()
-    return AddReplyCardResponse(data = cards)
+    has_more = len(cards) > limit
+    result = await session.exec(late.limit(settings.CARD_PAGE_SIZE_MAX))
+    cards = [*result.all(), *cards[:limit]]
+    await counters.merge_pending(redis, cards=cards)
+    return _json_response(CardSinceResponse, data=cards, has_more=has_more)
+
+@router.post("/getreplycard-since", response_model=ReplySinceResponse)
+async def get_reply_card_since(session: ReadSessionDep, redis: RedisClient, request_data: ReplySinceRequest, ):
+    """
+    某张卡片的新回复增量同步，按 (time, number_primary) 从旧到新，走 (number, time) 索引
+    """
+    limit = min(request_data.limit, settings.SINCE_SYNC_LIMIT_MAX)
+    statement = select(AddReplyCard).where(AddReplyCard.number == request_data.number)
+    if request_data.since_cursor:
+        statement = _reply_keyset(statement, _parse_cursor(request_data.since_cursor, 2))
+    elif request_data.since_time is not None:
+        statement = _reply_keyset(
+            statement.where(AddReplyCard.time > localize_card_time(request_data.since_time)), None
+        )
+    else:
+        raise HTTPException(status_code=400, detail="需要提供 since_cursor 或 since_time")
+    result = await session.exec(statement.limit(limit + 1))
+    cards = result.all()
+    has_more = len(cards) > limit
+    cards = cards[:limit]
+    await counters.merge_pending(redis, replies=cards)
+    # 没有新回复时原样返回客户端的位置，下次继续从这里同步
+    next_since = request_data.since_cursor
+    if cards:
+        next_since = encode_cursor(cards[-1].time, cards[-1].number_primary)
+    return _json_response(ReplySinceResponse, data=cards, has_more=has_more, next_since=next_since)
 
 @router.post("/addcard",response_model=Message)
-async def add_card(session:AsyncSessionDep,current_user: CurrentUser,request_data:AddCard, ):
+async def add_card(session:AsyncSessionDep,current_user: CurrentUser,redis: RedisClient,request_data:AddCard, ):
     
     logger.info(f"话题更新了一条信息: {request_data}")
     # request_data.imageUrls is Optional[List[ImagePathInfo]]
     logger.info(f"收到的图片信息对象列表: {request_data.imageUrls}")
 
-    result = await session.exec(select(DefaultCard).order_by(DefaultCard.number.desc()))
-    last_card = result.first()
-    if last_card:
-        new_number = last_card.number + 1
-    else:
-        new_number = 1
-    logger.info(f"Calculated new card number: {new_number}")
-
     # 从 List[ImagePathInfo] 提取 List[str] (只包含 relativePath)
     image_relative_paths: Optional[List[str]] = None # Default to None (or [] if empty list is preferred over NULL in DB)
     if request_data.imageUrls: # Check if the list exists and is not empty
@@ -107,29 +631,33 @@ async def add_card(session:AsyncSessionDep,current_user: CurrentUser,request_dat
 
     try:
         new_card = DefaultCard(
-            number=new_number,
             id=request_data.id,
             content=request_data.content,
-            time=request_data.time,
             category=request_data.category,
             thumbs=0,  # Initialize thumbs, assuming 0 is the default for a new card
             imageUrls=image_relative_paths # Assign the extracted list of relative paths
         )
         logger.info(f"Created DefaultCard instance for DB: {new_card}")
         await crud.create_card(session=session, card_in=new_card)
-        logger.info("Successfully called crud.create_card")
+        logger.info(f"Successfully called crud.create_card, new card number: {new_card.number}")
+        await mark_recent_write(redis, current_user.id)
+        await timeline.add_card(redis, new_card)
+        await trending.record(redis, new_card.category, new_card.number, settings.TRENDING_NEW_CARD_SCORE)
+        await broadcast.publish_card(redis, new_card)
         return Message(message="发送成功")
     except Exception as e:
         logger.exception("Error occurred during card creation or saving:")
         raise
 
 @router.post("/addreplycard",response_model=Message)
-async def add_reply_card(session:AsyncSessionDep,current_user: CurrentUser,request_data:AddReplyCard_Client, ):
+async def add_reply_card(session:AsyncSessionDep,current_user: CurrentUser,redis: RedisClient,request_data:AddReplyCard_Client, ):
     
     logger.info(f"Adding reply card. Request data: {request_data}")
 
-    result = await session.exec(select(DefaultCard).where(DefaultCard.number==request_data.number))
-    card = result.first()
+    found = await partitions.hot_first(
+        session, select(DefaultCard).where(DefaultCard.number==request_data.number), DefaultCard.time
+    )
+    card = found[0] if found else None
     if not card: # Check if the parent card exists
         logger.warning(f"Parent card with number {request_data.number} not found.")
         # Consider returning a more specific error message or status code
@@ -155,101 +683,85 @@ async def add_reply_card(session:AsyncSessionDep,current_user: CurrentUser,reque
         number=request_data.number, # This is the foreign key to DefaultCard.number
         id=request_data.id,
         content=request_data.content,
-        time=request_data.time,
         reply=request_data.reply,
         thumbs=0, # Initialize thumbs
         imageUrls=image_relative_paths # Assign the processed list of relative paths
     )
     
     logger.info(f"Creating AddReplyCard instance for DB: {new_reply_card}")
-    await crud.create_reply_card(session=session,reply_card_in=new_reply_card)
+    await crud.create_reply_card(session=session,reply_card_in=new_reply_card, card_time=card.time)
+    await mark_recent_write(redis, current_user.id)
+    await timeline.invalidate_cards(redis, [card.number])
+    await trending.record(redis, card.category, card.number, settings.TRENDING_REPLY_WEIGHT)
     # Original log, slightly updated to reflect potential images
-    logger.info(f"User {request_data.id} added reply card (Parent Card Number: {request_data.number}), content: {request_data.content}, reply: {request_data.reply}, time: {request_data.time}, images: {image_relative_paths is not None}")
+    logger.info(f"User {request_data.id} added reply card (Parent Card Number: {request_data.number}), content: {request_data.content}, reply: {request_data.reply}, time: {new_reply_card.time}, images: {image_relative_paths is not None}")
     return Message(message="回复卡片添加成功")
 
 
 @router.post("/like")
-async def toggle_like(data: LikeRequest, session: AsyncSessionDep, current_user: CurrentUser, request: Request, ):
+async def toggle_like(data: LikeRequest, session: AsyncSessionDep, current_user: CurrentUser, redis: RedisClient, ):
     
     user_id = current_user.id
-    print("收到请求体：", await request.json())
-    try:
-        reply_uuid = uuid.UUID(str(data.reply_id))
-    except ValueError:
-        reply_uuid = None
+    target_id = str(data.reply_id)
+    # UUID 是回复卡片的主键，整数是话题卡片的编号，只需按主键确认目标存在
+    kind: counters.LikeTarget
     try:
-        reply_int = int(data.reply_id)
+        target_key: Any = uuid.UUID(target_id)
+        kind = "reply"
+        exists = select(AddReplyCard.number_primary).where(AddReplyCard.number_primary == target_key)
+        time_column = AddReplyCard.time
     except ValueError:
-        reply_int = None
-    reply_card = None
-    default_card = None
-    if reply_uuid:
-        result = await session.exec(
-            select(AddReplyCard).where(AddReplyCard.number_primary == reply_uuid)
-        )
-        reply_card = result.first()
-    if reply_int is not None:
-        result = await session.exec(
-            select(DefaultCard).where(DefaultCard.number == reply_int)
-        )
-        default_card = result.first()
-
-    if not reply_card and not default_card:
+        try:
+            target_key = int(target_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="未找到对应的回复或卡片")
+        kind = "card"
+        exists = select(DefaultCard.number, DefaultCard.category).where(DefaultCard.number == target_key)
+        time_column = DefaultCard.time
+    # 点赞的大多是最近的卡片，先只查热数据分区
+    found = await partitions.hot_first(session, exists, time_column)
+    if not found:
         raise HTTPException(status_code=404, detail="未找到对应的回复或卡片")
-    target_id = str(data.reply_id)
+    # 只有话题卡片的点赞计入热度
+    category = found[0][1] if kind == "card" else None
+
+    # 点赞记录本身用于去重：插入/删除成功才计数，thumbs 由后台任务批量写回
     if data.action == "like":
-        result = await session.exec(
-            select(ReplyLike).where(
-                ReplyLike.reply_id == target_id,
-                ReplyLike.user_id == user_id
-            )
+        statement = (
+            pg_insert(ReplyLike)
+            .values(reply_id=target_id, user_id=user_id, created_at=datetime.utcnow())
+            .on_conflict_do_nothing()
+            .returning(ReplyLike.reply_id)
         )
-        existing = result.first()
-        if existing:
-            raise HTTPException(status_code=400, detail="不能重复点赞")
-        
-        new_like = ReplyLike(reply_id=target_id, user_id=user_id)
-        session.add(new_like)
-
-        if reply_card:
-            reply_card.thumbs = (reply_card.thumbs or 0) + 1
-            session.add(reply_card)
-        elif default_card:
-            default_card.thumbs = (default_card.thumbs or 0) + 1
-            session.add(default_card)
-        
+        inserted = (await session.execute(statement)).first()
         await session.commit()
+        if inserted is None:
+            raise HTTPException(status_code=400, detail="不能重复点赞")
+        await mark_recent_write(redis, user_id)
+        await counters.record_like(redis, session, kind, target_key, 1)
+        await trending.record(redis, category, target_key, settings.TRENDING_LIKE_WEIGHT)
         return {"message": "点赞成功"}
 
     elif data.action == "unlike":
-        result = await session.exec(
-            select(ReplyLike).where(
-                ReplyLike.reply_id == target_id,
-                ReplyLike.user_id == user_id
-            )
+        statement = (
+            delete(ReplyLike)
+            .where(ReplyLike.reply_id == target_id, ReplyLike.user_id == user_id)
+            .returning(ReplyLike.reply_id)
         )
-        like_to_delete = result.first()
-
-        if not like_to_delete:
-            raise HTTPException(status_code=400, detail="未点赞，无法取消")
-        
-        await session.delete(like_to_delete)
-
-        if reply_card:
-            reply_card.thumbs = max((reply_card.thumbs or 0) - 1, 0)
-            session.add(reply_card)
-        elif default_card:
-            default_card.thumbs = max((default_card.thumbs or 0) - 1, 0)
-            session.add(default_card)
-        
+        deleted = (await session.execute(statement)).first()
         await session.commit()
+        if deleted is None:
+            raise HTTPException(status_code=400, detail="未点赞，无法取消")
+        await mark_recent_write(redis, user_id)
+        await counters.record_like(redis, session, kind, target_key, -1)
+        await trending.record(redis, category, target_key, -settings.TRENDING_LIKE_WEIGHT)
         return {"message": "取消点赞成功"}
 
     else:
         raise HTTPException(status_code=400, detail="无效操作类型")
 
 @router.get("/like-status")
-async def get_like_status(reply_id: str, session: AsyncSessionDep, current_user: CurrentUser, ):
+async def get_like_status(reply_id: str, session: ReadSessionDep, current_user: CurrentUser, ):
     
     user_id = current_user.id
     result = await session.exec(
@@ -262,68 +774,141 @@ async def get_like_status(reply_id: str, session: AsyncSessionDep, current_user:
 
     return {"liked": bool(existing)}
 
-@router.post("/get-user-cards")
-async def get_user_cards(session: AsyncSessionDep, request: UserFindCardRequest, ):
-    user_id = request.Cookie
-    # 从默认的话题卡片种获取用户发布的卡片
-    result_default = await session.exec(
-        select(DefaultCard).where(DefaultCard.id == user_id).offset(request.skip).limit(5)
+@router.post("/viewer-state", response_model=ViewerStateResponse)
+async def get_viewer_state(data: ViewerStateRequest, session: ReadSessionDep, current_user: CurrentUser, ):
+    """
+    一次返回当前用户对一页卡片和回复的点赞、收藏状态，每张表只查一次
+    """
+    user_id = current_user.id
+    liked_ids: set[str] = set()
+    if data.reply_ids:
+        result = await session.exec(
+            select(ReplyLike.reply_id).where(
+                ReplyLike.user_id == user_id,
+                ReplyLike.reply_id.in_(data.reply_ids)
+            )
+        )
+        liked_ids = set(result.all())
+    favorited_numbers: set[int] = set()
+    if data.card_numbers:
+        result = await session.exec(
+            select(CardFavorite.card_number).where(
+                CardFavorite.user_id == user_id,
+                CardFavorite.card_number.in_(data.card_numbers)
+            )
+        )
+        favorited_numbers = set(result.all())
+    return ViewerStateResponse(
+        liked={reply_id: reply_id in liked_ids for reply_id in data.reply_ids},
+        favorited={number: number in favorited_numbers for number in data.card_numbers},
     )
-    # 从回复卡片种获取用户发布的卡片
-    result_reply = await session.exec(
-        select(AddReplyCard).where(AddReplyCard.id == user_id).offset(request.skip).limit(5)
+
+@router.get("/get-user-cards", response_model=UserFindCardResponse)
+async def get_user_cards_query(
+    session: ReadSessionDep,
+    redis: RedisClient,
+    request: Annotated[UserFindCardRequest, Query()],
+    response: Response,
+):
+    # 个人主页只允许浏览器缓存，不在代理上共享
+    result = await get_user_cards(session, redis, request)
+    return _cache_headers(result, response, f"private, max-age={settings.CARD_PUBLIC_CACHE_SECONDS}")
+
+@router.post("/get-user-cards", response_model=UserFindCardResponse, deprecated=True)
+async def get_user_cards(session: ReadSessionDep, redis: RedisClient, request: UserFindCardRequest, ):
+    """
+    获取用户发布的话题和回复，两者合并为一条按时间倒序的时间线
+    DefaultCard / AddReplyCard 保持原有字段，timeline 给出合并后的顺序
+    """
+    user_id = request.Cookie
+    limit = _page_size(request.limit)
+    position = _parse_cursor(request.cursor, 1)[0] if request.cursor else None
+    skip = 0 if request.cursor else request.skip
+    statement = _user_activity_query(user_id, position, skip + limit).offset(skip).limit(limit)
+    rows = (await session.exec(statement)).all()
+
+    cards_default: list[DefaultCard] = []
+    cards_reply: list[AddReplyCard] = []
+    activity: list[UserActivityItem] = []
+    for row in rows:
+        if row.kind == "card":
+            cards_default.append(DefaultCard(
+                number=row.number, id=row.id, content=row.content, time=row.time,
+                category=row.category, thumbs=row.thumbs, imageUrls=row.imageUrls,
+                reply_count=row.reply_count, favorite_count=row.favorite_count,
+            ))
+        else:
+            cards_reply.append(AddReplyCard(
+                number_primary=row.number_primary, number=row.number, id=row.id, content=row.content,
+                time=row.time, reply=row.reply, thumbs=row.thumbs, imageUrls=row.imageUrls,
+            ))
+        activity.append(UserActivityItem(kind=row.kind, number=row.number, number_primary=row.number_primary))
+    await counters.merge_pending(redis, cards=cards_default, replies=cards_reply)
+
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor([last.time, last.kind, last.number, last.number_primary])
+    return _json_response(
+        UserFindCardResponse,
+        DefaultCard=cards_default, AddReplyCard=cards_reply, timeline=activity, next_cursor=next_cursor,
     )
-    cards_default = result_default.all()
-    cards_reply = result_reply.all()
-    return UserFindCardResponse(DefaultCard=cards_default, AddReplyCard=cards_reply)
 
 @router.post("/favorite")
-async def toggle_like(data: FavoriteRequest, session: AsyncSessionDep, current_user: CurrentUser, request: Request, ):
+async def toggle_like(data: FavoriteRequest, session: AsyncSessionDep, current_user: CurrentUser, redis: RedisClient, request: Request, ):
     user_id = current_user.id
     try:
         card_number=data.card_number
     except ValueError:
         card_number = None
-    result = await session.exec(
-        select(DefaultCard).where(DefaultCard.number == card_number)
+    found = await partitions.hot_first(
+        session, select(DefaultCard).where(DefaultCard.number == card_number), DefaultCard.time
     )
-    default_card = result.first()
+    default_card = found[0] if found else None
     if not default_card:
         raise HTTPException(status_code=404,detail="未寻找到已收藏卡片")
     aim_cardnumber=data.card_number
+    # 收藏记录和卡片的 favorite_count 在同一事务中修改，插入/删除成功才计数
+    counter = update(DefaultCard).where(
+        DefaultCard.number == aim_cardnumber, DefaultCard.time == default_card.time
+    )
     if data.action == "favorite":
-        result = await session.exec(
-            select(CardFavorite).where(
-                CardFavorite.card_number == aim_cardnumber,
-                CardFavorite.user_id == user_id
-            )
+        statement = (
+            pg_insert(CardFavorite)
+            .values(card_number=aim_cardnumber, user_id=user_id, created_at=datetime.now(timezone.utc))
+            .on_conflict_do_nothing()
+            .returning(CardFavorite.card_number)
         )
-        existing = result.first()
-        if existing:
+        if (await session.execute(statement)).first() is None:
+            await session.rollback()
             raise HTTPException(status_code=400, detail="不能重复收藏")
-        new_favorite = CardFavorite(card_number=aim_cardnumber, user_id=user_id)
-        session.add(new_favorite)
+        await session.execute(counter.values(favorite_count=DefaultCard.favorite_count + 1))
         await session.commit()
+        await mark_recent_write(redis, user_id)
+        await timeline.invalidate_cards(redis, [aim_cardnumber])
         return {"message": "收藏成功"}
     elif data.action == "unfavorite":
-        result = await session.exec(
-            select(CardFavorite).where(
-                CardFavorite.card_number == aim_cardnumber,
-                CardFavorite.user_id == user_id
-            )
+        statement = (
+            delete(CardFavorite)
+            .where(CardFavorite.card_number == aim_cardnumber, CardFavorite.user_id == user_id)
+            .returning(CardFavorite.card_number)
         )
-        delete_favorite = result.first()
-        if not delete_favorite:
+        if (await session.execute(statement)).first() is None:
+            await session.rollback()
             raise HTTPException(status_code=400,detail="还未收藏")
-        await session.delete(delete_favorite)
+        await session.execute(
+            counter.values(favorite_count=func.greatest(DefaultCard.favorite_count - 1, 0))
+        )
         await session.commit()
+        await mark_recent_write(redis, user_id)
+        await timeline.invalidate_cards(redis, [aim_cardnumber])
         return {"message": "取消点赞成功"}
     else:
         raise HTTPException(status_code=400,detail="无效操作类型")
 
 
 @router.get("/favorite-status")
-async def get_favorite_status(card_number: int, session: AsyncSessionDep, current_user: CurrentUser, ):
+async def get_favorite_status(card_number: int, session: ReadSessionDep, current_user: CurrentUser, ):
     user_id = current_user.id
     result = await session.exec(
         select(CardFavorite).where(
@@ -335,15 +920,85 @@ async def get_favorite_status(card_number: int, session: AsyncSessionDep, curren
 
     return {"favorite": bool(existing)}
 @router.post("/getfavoritecard", response_model=DefaultCardResponse)
-async def get_favorite_card(current_user: CurrentUser,session: AsyncSessionDep,request_data: CardFavoriteRequest):
-    user_favorite=await session.execute(
-        select(CardFavorite.card_number).where(CardFavorite.user_id==current_user.id).offset(request_data.skip).limit(5)
+async def get_favorite_card(current_user: CurrentUser,session: ReadSessionDep,redis: RedisClient,request_data: CardFavoriteRequest):
+    limit = _page_size(request_data.limit)
+    # 一次 JOIN 取出收藏的卡片，按收藏时间倒序，走 (user_id, created_at) 索引
+    favoritecard = (
+        select(DefaultCard, CardFavorite.created_at)
+        .join(CardFavorite, CardFavorite.card_number == DefaultCard.number)
+        .where(CardFavorite.user_id == current_user.id)
     )
-    cardnumbers=[row[0] for row in user_favorite.all()]
-    if cardnumbers:
-        favoritecard = select(DefaultCard).where(DefaultCard.number.in_(cardnumbers))
-        result=await session.exec(favoritecard)
+    if request_data.cursor:
+        last_created_at, last_number = _parse_cursor(request_data.cursor, 2)
+        try:
+            created_at = datetime.fromisoformat(str(last_created_at))
+            last_number = int(last_number)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        if created_at.tzinfo is None:
+            # 旧游标里是不带时区的 UTC 时间
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        favoritecard = favoritecard.where(
+            tuple_(CardFavorite.created_at, CardFavorite.card_number) < (created_at, last_number)
+        )
     else:
-        return []
-    cards=result.all()
-    return DefaultCardResponse(data = cards)
\ No newline at end of file
+        favoritecard = favoritecard.offset(request_data.skip)
+    favoritecard = favoritecard.order_by(CardFavorite.created_at.desc(), CardFavorite.card_number.desc())
+    result=await session.exec(favoritecard.limit(limit))
+    rows=result.all()
+    cards=[card for card, _ in rows]
+    await counters.merge_pending(redis, cards=cards)
+    next_cursor = None
+    if len(rows) == limit:
+        last_card, last_created_at = rows[-1]
+        next_cursor = encode_cursor(last_created_at.isoformat(), last_card.number)
+    return _json_response(DefaultCardResponse, data=cards, next_cursor=next_cursor)
+
+@router.post("/search", response_model=CardSearchResponse)
+async def search_cards(session: ReadSessionDep, redis: RedisClient, request_data: CardSearchRequest, ):
+    """
+    按内容搜索话题或回复，ILIKE 子串匹配走 pg_trgm GIN 索引
+    relevance 按 word_similarity 排序，time 按发布时间倒序，都用游标翻页
+    """
+    keyword = request_data.q.strip()
+    if len(keyword) < settings.SEARCH_QUERY_MIN_LENGTH:
+        raise HTTPException(
+            status_code=400, detail=f"搜索内容至少需要 {settings.SEARCH_QUERY_MIN_LENGTH} 个字"
+        )
+    limit = _page_size(request_data.limit)
+    # 关键词中的通配符按普通字符匹配
+    pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    model: Any = DefaultCard if request_data.scope == "card" else AddReplyCard
+    key = DefaultCard.number if request_data.scope == "card" else AddReplyCard.number_primary
+    rank = func.word_similarity(keyword, model.content) if request_data.order == "relevance" else model.time
+    statement = select(model, rank).where(model.content.ilike(pattern, escape="\\"))
+    if request_data.category:
+        if request_data.scope == "reply":
+            statement = statement.join(DefaultCard, DefaultCard.number == AddReplyCard.number)
+        statement = statement.where(DefaultCard.category == request_data.category)
+
+    if request_data.cursor:
+        last_rank, last_key = _parse_cursor(request_data.cursor, 2)
+        try:
+            if request_data.order == "relevance":
+                last_rank = float(last_rank)
+            else:
+                last_rank = parse_cursor_time(last_rank)
+            last_key = int(last_key) if request_data.scope == "card" else uuid.UUID(str(last_key))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        statement = statement.where(tuple_(rank, key) < (last_rank, last_key))
+    result = await session.exec(statement.order_by(rank.desc(), key.desc()).limit(limit))
+    rows = result.all()
+    items = [item for item, _ in rows]
+
+    next_cursor = None
+    if len(rows) == limit:
+        last_item, last_rank = rows[-1]
+        next_cursor = encode_cursor(last_rank, getattr(last_item, key.key))
+    if request_data.scope == "card":
+        await counters.merge_pending(redis, cards=items)
+        return _json_response(CardSearchResponse, cards=items, replies=[], next_cursor=next_cursor)
+    await counters.merge_pending(redis, replies=items)
+    return _json_response(CardSearchResponse, cards=[], replies=items, next_cursor=next_cursor)
@@ -6,10 +6,10 @@ from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from app import crud
 # 导入依赖项，包括数据库会话、当前用户和超级用户检查
-from app.api.deps import CurrentUser, AsyncSessionDep, get_current_active_superuser
-from app.core import security
+from app.api.deps import CurrentDbUser, CurrentUser, AsyncSessionDep, RedisClient, get_current_active_superuser
+from app.core import security, user_cache
 from app.core.config import settings
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 # 导入数据模型
 from app.models import Message, NewPassword, Token, UserPublic
 # 导入工具函数，用于生成 token、邮件内容和发送邮件
@@ -62,7 +62,7 @@ async def login_access_token(
 
 
 @router.post("/login/test-token", response_model=UserPublic)
-async def test_token(current_user: CurrentUser, ) -> Any:
+async def test_token(current_user: CurrentDbUser, ) -> Any:
     """
     测试 access token 是否有效。
     需要请求头中带有有效的 Bearer token。
@@ -106,7 +106,7 @@ async def recover_password(email: str, session: AsyncSessionDep, ) -> Message: #
 
 
 @router.post("/reset-password/")
-async def reset_password(session: AsyncSessionDep, body: NewPassword, ) -> Message: # Changed SessionDep
+async def reset_password(session: AsyncSessionDep, redis: RedisClient, body: NewPassword, ) -> Message: # Changed SessionDep
     """
     重置密码接口。
     使用有效的 token 和新密码来更新用户密码。
@@ -129,13 +129,15 @@ async def reset_password(session: AsyncSessionDep, body: NewPassword, ) -> Messa
         # 如果用户被禁用，抛出 400 错误
         raise HTTPException(status_code=400, detail="无效用户")
     # 对新密码进行哈希处理
-    hashed_password = get_password_hash(password=body.new_password)
+    hashed_password = await get_password_hash_async(body.new_password)
     # 更新用户的哈希密码
     user.hashed_password = hashed_password
     # 将更改添加到数据库会话
     session.add(user)
     # 提交事务，保存更改
     await session.commit() # await commit
+    # 删除该用户已缓存的认证信息
+    await user_cache.invalidate_user(redis, user.id)
     # 返回成功消息
     return Message(message="密码更新成功")
 
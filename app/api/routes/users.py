@@ -8,14 +8,16 @@ from sqlmodel import col, delete, func, select
 
 from app import crud
 from app.api.deps import (
+    CurrentDbUser,
     CurrentUser,
     AsyncSessionDep,
     get_current_active_superuser,
     RedisClient,
     get_redis,
 )
+from app.core import user_cache
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import PasswordHasherBusy, get_password_hash_async, verify_password_async
 from app.models import (
     Item,
     Message,
@@ -90,7 +92,7 @@ async def create_user(*, session: AsyncSessionDep, user_in: UserCreate, ) -> Any
 #更新用户信息
 @router.patch("/me", response_model=UserPublic)
 async def update_user_me(
-    *, session: AsyncSessionDep, user_in: UserUpdateMe, current_user: CurrentUser, 
+    *, session: AsyncSessionDep, redis: RedisClient, user_in: UserUpdateMe, current_user: CurrentDbUser, 
 ) -> Any:
     
     """
@@ -108,32 +110,34 @@ async def update_user_me(
     session.add(current_user)
     await session.commit()
     await session.refresh(current_user)
+    await user_cache.invalidate_user(redis, current_user.id)
     return current_user
 
 #更新密码
 @router.patch("/me/password", response_model=Message)
 async def update_password_me(
-    *, session: AsyncSessionDep, body: UpdatePassword, current_user: CurrentUser,
+    *, session: AsyncSessionDep, redis: RedisClient, body: UpdatePassword, current_user: CurrentDbUser,
 ) -> Any:
     
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not await verify_password_async(body.current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
+    hashed_password = await get_password_hash_async(body.new_password)
     current_user.hashed_password = hashed_password
     session.add(current_user)
     await session.commit()
+    await user_cache.invalidate_user(redis, current_user.id)
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-async def read_user_me(current_user: CurrentUser, ) -> Any:
+async def read_user_me(current_user: CurrentDbUser, ) -> Any:
     
     """
     Get current user.
@@ -142,7 +146,7 @@ async def read_user_me(current_user: CurrentUser, ) -> Any:
 
 #删除用户
 @router.delete("/me", response_model=Message)
-async def delete_user_me(session: AsyncSessionDep, current_user: CurrentUser, ) -> Any:
+async def delete_user_me(session: AsyncSessionDep, redis: RedisClient, current_user: CurrentDbUser, ) -> Any:
     
     """
     Delete own user.
@@ -153,6 +157,7 @@ async def delete_user_me(session: AsyncSessionDep, current_user: CurrentUser, )
         )
     await session.delete(current_user)
     await session.commit()
+    await user_cache.invalidate_user(redis, current_user.id)
     return Message(message="User deleted successfully")
 
 #注册用户的接口以及实现
@@ -171,8 +176,6 @@ redis: Annotated[redis.Redis, Depends(get_redis)]
             raise HTTPException(status_code=400, detail="验证码不存在")
         if verify_code != user_in.verify_code:  # 不需要 decode，因为已经设置了 decode_responses=True
             raise HTTPException(status_code=400, detail="验证码错误")
-        # 删除验证码
-        await redis.delete(f"verify_code:{user_in.email}")
 
     except Exception as e:
         logger.error(f"获取验证码失败: {e}")
@@ -187,6 +190,10 @@ redis: Annotated[redis.Redis, Depends(get_redis)]
             )
         user_create = UserCreate.model_validate(user_in)
         user_created = await crud.create_user(session=session, user_create=user_create)
+        # 创建成功后再删除验证码，服务繁忙返回 503 时客户端可以用同一个验证码重试
+        await redis.delete(f"verify_code:{user_in.email}")
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         logger.error(f"创建用户失败: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -203,7 +210,7 @@ async def read_user_by_id(
     Get a specific user by id.
     """
     user = await session.get(User, user_id)
-    if user == current_user:
+    if user and user.id == current_user.id:
         return user
     if not current_user.is_superuser:
         raise HTTPException(
@@ -223,6 +230,7 @@ async def read_user_by_id(
 async def update_user(
     *,
     session: AsyncSessionDep,
+    redis: RedisClient,
     user_id: uuid.UUID,
     user_in: UserUpdate,
     
@@ -246,12 +254,13 @@ async def update_user(
             )
 
     db_user = await crud.update_user(session=session, db_user=db_user, user_in=user_in)
+    await user_cache.invalidate_user(redis, user_id)
     return db_user
 
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
 async def delete_user(
-    session: AsyncSessionDep, current_user: CurrentUser, user_id: uuid.UUID, 
+    session: AsyncSessionDep, redis: RedisClient, current_user: CurrentUser, user_id: uuid.UUID, 
 ) -> Message:
     
     """
@@ -260,7 +269,7 @@ async def delete_user(
     user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if user == current_user:
+    if user.id == current_user.id:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
@@ -268,6 +277,7 @@ async def delete_user(
     await session.exec(statement)  # type: ignore
     await session.delete(user)
     await session.commit()
+    await user_cache.invalidate_user(redis, user_id)
     return Message(message="User deleted successfully")
 
 #重设密码
@@ -285,8 +295,6 @@ redis: Annotated[redis.Redis, Depends(get_redis)]
             raise HTTPException(status_code=400, detail="验证码不存在")
         if verify_code != user_in.verify_code:
             raise HTTPException(status_code=400, detail="验证码错误")
-        # 删除验证码
-        await redis.delete(f"reset_password_verify_code:{user_in.email}")
         
         # 获取用户并更新密码
         user = await crud.get_user_by_email(session=session, email=user_in.email)
@@ -294,11 +302,16 @@ redis: Annotated[redis.Redis, Depends(get_redis)]
             raise HTTPException(status_code=404, detail="用户不存在")
             
         # 使用 hashed_password 而不是 password
-        user.hashed_password = get_password_hash(user_in.password)
+        user.hashed_password = await get_password_hash_async(user_in.password)
+        # 哈希完成后再删除验证码，服务繁忙返回 503 时客户端可以用同一个验证码重试
+        await redis.delete(f"reset_password_verify_code:{user_in.email}")
         session.add(user)
         await session.commit()
+        await user_cache.invalidate_user(redis, user.id)
         return Message(message="密码重设成功")
         
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         logger.error(f"重置密码失败: {e}")
         raise HTTPException(status_code=400, detail=str(e))
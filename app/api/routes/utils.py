@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends
+from typing import Any
+
+from fastapi import APIRouter, Depends, Request
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
+from app.core import redis_pool, security
 from app.models import Message
 from app.utils import generate_test_email, send_email
 
@@ -28,3 +31,14 @@ def test_email(email_to: EmailStr) -> Message:
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/metrics/", dependencies=[Depends(get_current_active_superuser)])
+async def metrics(request: Request) -> dict[str, Any]:
+    """
+    当前 worker 的运行指标
+    """
+    return {
+        "password_hasher": security.password_hasher_metrics(),
+        "redis_pool": redis_pool.pool_metrics(request.app.state.redis),
+    }
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import re
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import asyncpg  # type: ignore
+
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+##################用 COPY 批量导出 / 导入卡片相关的表，用于在环境之间搬运数据或初始化测试库
+# 导出: python -m app.bulk_copy export ./dump
+# 导入: python -m app.bulk_copy import ./dump --truncate
+
+# 按外键依赖排序：导入时按这个顺序，父表在前
+ALL_TABLES = ("user", "cookie", "defaultcard", "addreplycard", "replylike", "cardfavorite")
+# 默认不导出 user 表（包含密码哈希），cookie 依赖 user，导入时目标库需要已有对应用户
+DEFAULT_TABLES = ("cookie", "defaultcard", "addreplycard", "replylike", "cardfavorite")
+# 分区表的主键包含 time，这些编号在数据库中不再唯一，导入时需要自己检查
+UNIQUE_KEYS = {"defaultcard": "number", "addreplycard": "number_primary"}
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 1024 * 1024
+_NEXTVAL = re.compile(r"nextval\('([^']+)'")
+
+
+def _dsn() -> str:
+    # asyncpg 只认 postgresql:// 开头的连接串
+    return str(settings.SQLALCHEMY_DATABASE_URI).replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _copied_rows(status: str) -> int:
+    # COPY 的返回状态形如 "COPY 123"
+    return int(status.split()[-1])
+
+
+async def _columns(conn: asyncpg.Connection, table: str) -> list[str]:
+    rows = await conn.fetch(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = $1 ORDER BY ordinal_position",
+        table,
+    )
+    return [row["column_name"] for row in rows]
+
+
+async def _is_partitioned(conn: asyncpg.Connection, table: str) -> bool:
+    relkind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = $1::regclass", _quote(table))
+    return relkind == "p"
+
+
+async def _check_unique(conn: asyncpg.Connection, table: str) -> None:
+    """导入到已有数据的表之后检查编号是否重复，重复时抛出异常让整个导入回滚"""
+    key = UNIQUE_KEYS.get(table)
+    if key is None:
+        return
+    rows = await conn.fetch(
+        f"SELECT {_quote(key)} FROM {_quote(table)} GROUP BY 1 HAVING count(*) > 1 LIMIT 10"
+    )
+    if rows:
+        duplicates = ", ".join(str(row[0]) for row in rows)
+        raise RuntimeError(f"{table} 导入后 {key} 有重复（{duplicates}），请使用 --truncate 或先清理冲突的数据")
+
+
+async def export_tables(directory: Path, tables: list[str], compress_level: int) -> None:
+    """
+    在同一个可重复读快照里把每张表 COPY 成二进制格式并 gzip 压缩，保证表之间的外键一致
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest: dict[str, dict[str, object]] = {}
+    conn = await asyncpg.connect(_dsn())
+    try:
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            for table in tables:
+                started = time.monotonic()
+                columns = await _columns(conn, table)
+                path = directory / f"{table}.copy.gz"
+                with gzip.open(path, "wb", compresslevel=compress_level) as output:
+
+                    async def write(chunk: bytes) -> None:
+                        output.write(chunk)
+
+                    if await _is_partitioned(conn, table):
+                        # 分区表不能直接 COPY TO，改为导出查询结果
+                        query = f"SELECT {', '.join(_quote(c) for c in columns)} FROM {_quote(table)}"
+                        status = await conn.copy_from_query(query, output=write, format="binary")
+                    else:
+                        status = await conn.copy_from_table(
+                            table, columns=columns, output=write, format="binary"
+                        )
+                rows = _copied_rows(status)
+                manifest[table] = {"columns": columns, "rows": rows, "file": path.name}
+                logger.info(f"导出 {table}: {rows} 行, {time.monotonic() - started:.1f}s")
+    finally:
+        await conn.close()
+    (directory / MANIFEST_NAME).write_text(json.dumps({"tables": manifest}, indent=2), encoding="utf-8")
+
+
+async def _read_chunks(path: Path) -> AsyncIterator[bytes]:
+    with gzip.open(path, "rb") as source:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def _reset_sequences(conn: asyncpg.Connection, table: str) -> None:
+    """导入的行带着原来的编号，把表上的序列推进到当前最大值之后"""
+    rows = await conn.fetch(
+        "SELECT column_name, column_default FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = $1 AND column_default LIKE 'nextval(%'",
+        table,
+    )
+    for row in rows:
+        match = _NEXTVAL.search(row["column_default"])
+        if not match:
+            continue
+        column = _quote(row["column_name"])
+        await conn.execute(
+            f"SELECT setval($1::regclass, COALESCE((SELECT MAX({column}) FROM {_quote(table)}), 0) + 1, false)",
+            match.group(1),
+        )
+        logger.info(f"序列 {match.group(1)} 已对齐到 {table}.{row['column_name']} 的最大值")
+
+
+async def import_tables(directory: Path, tables: list[str], truncate: bool) -> None:
+    """
+    按外键顺序把导出的文件 COPY 回数据库，全部在一个事务里，失败时整体回滚
+    """
+    manifest = json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))["tables"]
+    missing = [table for table in tables if table not in manifest]
+    if missing:
+        raise SystemExit(f"导出目录中没有这些表: {', '.join(missing)}")
+    conn = await asyncpg.connect(_dsn())
+    try:
+        async with conn.transaction():
+            if truncate:
+                await conn.execute(f"TRUNCATE {', '.join(_quote(t) for t in tables)}")
+            for table in tables:
+                started = time.monotonic()
+                entry = manifest[table]
+                status = await conn.copy_to_table(
+                    table,
+                    source=_read_chunks(directory / entry["file"]),
+                    columns=entry["columns"],
+                    format="binary",
+                )
+                rows = _copied_rows(status)
+                if rows != entry["rows"]:
+                    raise RuntimeError(f"{table} 导入 {rows} 行，与导出时的 {entry['rows']} 行不一致")
+                if not truncate:
+                    await _check_unique(conn, table)
+                await _reset_sequences(conn, table)
+                logger.info(f"导入 {table}: {rows} 行, {time.monotonic() - started:.1f}s")
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="用 COPY 批量导出 / 导入卡片数据")
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("directory", type=Path, help="导出文件所在的目录")
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        choices=ALL_TABLES,
+        default=list(DEFAULT_TABLES),
+        help="要处理的表，默认不包含 user",
+    )
+    parser.add_argument("--truncate", action="store_true", help="导入前清空这些表")
+    parser.add_argument("--compress-level", type=int, default=3, choices=range(1, 10))
+    args = parser.parse_args()
+
+    tables = [table for table in ALL_TABLES if table in args.tables]
+    if args.action == "export":
+        asyncio.run(export_tables(args.directory, tables, args.compress_level))
+    else:
+        asyncio.run(import_tables(args.directory, tables, args.truncate))
+
+
+if __name__ == "__main__":
+    main()
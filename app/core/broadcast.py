@@ -0,0 +1,73 @@
+import asyncio
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import redis.asyncio as aioredis
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.models import DefaultCard
+
+##################新卡片推送：add_card 发布到 Redis 频道，每个 worker 只保持一个订阅
+# 订阅收到的消息分发到本 worker 上每个 SSE 连接自己的队列
+
+CARD_CHANNEL = "cards:new:{category}"
+CARD_CHANNEL_PATTERN = "cards:new:*"
+
+# 分类 -> 该分类下所有连接的队列
+_listeners: dict[str, set[asyncio.Queue[tuple[int, str]]]] = defaultdict(set)
+
+
+async def publish_card(redis: aioredis.Redis, card: DefaultCard) -> None:
+    """新卡片发布到所在分类的频道，消息为 "编号\\n卡片 JSON"，发布失败不影响发帖"""
+    try:
+        await redis.publish(
+            CARD_CHANNEL.format(category=card.category), f"{card.number}\n{card.model_dump_json()}"
+        )
+    except RedisError as e:
+        logger.warning(f"发布新卡片失败: {e}")
+
+
+@asynccontextmanager
+async def listen(category: str) -> AsyncIterator[asyncio.Queue[tuple[int, str]]]:
+    """注册一个连接，返回接收 (卡片编号, 卡片 JSON) 的队列，退出时注销"""
+    queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue(maxsize=settings.CARD_STREAM_QUEUE_SIZE)
+    _listeners[category].add(queue)
+    try:
+        yield queue
+    finally:
+        _listeners[category].discard(queue)
+        if not _listeners[category]:
+            del _listeners[category]
+
+
+def _dispatch(category: str, number: int, payload: str) -> None:
+    for queue in _listeners.get(category, ()):
+        if queue.full():
+            # 客户端读得太慢，丢掉最旧的一条，不阻塞其他连接
+            queue.get_nowait()
+        queue.put_nowait((number, payload))
+
+
+async def run_subscriber(redis: aioredis.Redis) -> None:
+    """后台任务：按模式订阅所有分类的频道，断线后自动重连"""
+    prefix = CARD_CHANNEL.format(category="")
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.psubscribe(CARD_CHANNEL_PATTERN)
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                category = message["channel"][len(prefix):]
+                number, _, payload = message["data"].partition("\n")
+                _dispatch(category, int(number), payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"新卡片订阅中断，稍后重连: {e}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.close()
@@ -77,6 +77,20 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # 只读副本：配置后公开的读接口走副本，未配置时所有查询都走主库
+    POSTGRES_REPLICA_SERVER: str | None = None
+    POSTGRES_REPLICA_PORT: int | None = None
+    # 用户写入后这么多秒内，他的读请求仍然走主库，避免副本延迟导致看不到自己刚发的内容
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # 已认证用户的缓存：进程内 LRU 无法跨 worker 失效，有效期要短；Redis 中的按用户失效
+    AUTH_CACHE_LOCAL_SIZE: int = 10000
+    AUTH_CACHE_LOCAL_TTL_SECONDS: int = 10
+    AUTH_CACHE_TTL_SECONDS: int = 300
+
+    # bcrypt 在专用线程池中计算；正在执行和排队的任务超过上限时直接返回 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
 
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
@@ -86,7 +100,68 @@ class Settings(BaseSettings):
     MAIL_SSL_TLS: bool
     MAIL_FROM: str
     MAIL_DEBUG: int
-    
+
+    # Redis：每个 worker 一个连接池，连接数达到上限时最多等待 REDIS_POOL_TIMEOUT_SECONDS 秒
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    # 空闲超过这么多秒的连接在使用前先 PING 检查
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+
+    # 卡片时间在数据库中是 timestamptz，输出给客户端时转换成这个时区的本地时间
+    CARD_TIME_ZONE: str = "Asia/Shanghai"
+
+    # 卡片列表分页：客户端可以指定每页数量，但不能超过服务端上限
+    CARD_PAGE_SIZE_MAX: int = 50
+    # 话题列表 expand 模式下每张卡片最多附带的回复预览数
+    REPLY_PREVIEW_SIZE_MAX: int = 10
+    # pg_trgm 需要至少 3 个字才能从索引中取出三元组，更短的关键词会退化成全表扫描
+    SEARCH_QUERY_MIN_LENGTH: int = 3
+
+    # 公开的卡片列表 GET 接口允许浏览器和 OpenResty 缓存的秒数（微缓存）
+    CARD_PUBLIC_CACHE_SECONDS: int = 2
+
+    # 下拉刷新增量同步一次最多返回的条数，超出时 has_more 为 true
+    SINCE_SYNC_LIMIT_MAX: int = 200
+    # 卡片的编号和时间在插入时分配、提交后才可见，先分配的卡片可能晚提交；
+    # 增量同步和 SSE 补发时额外返回客户端位置之前这么多秒内发布的卡片，由客户端按编号去重
+    SINCE_SYNC_OVERLAP_SECONDS: int = 10
+
+    # Redis 中每个分类的时间线（ZSET）最多保留的卡片数，超出部分回源数据库
+    TIMELINE_MAX_LENGTH: int = 1000
+    # 时间线定期从数据库重建，避免 Redis 写入失败后长期缺卡片
+    TIMELINE_TTL_SECONDS: int = 60 * 60
+    CARD_CACHE_TTL_SECONDS: int = 300
+    # 流式返回卡片列表时，服务端游标每批从数据库读取的行数
+    CARD_STREAM_BATCH_SIZE: int = 500
+
+    # 新卡片 SSE 推送：每个连接最多缓存的消息数，以及空闲时发送心跳的间隔
+    CARD_STREAM_QUEUE_SIZE: int = 100
+    CARD_STREAM_KEEPALIVE_SECONDS: float = 15.0
+
+    # 点赞计数先记在 Redis，后台任务按这个间隔批量写回数据库
+    LIKE_FLUSH_INTERVAL_SECONDS: float = 2.0
+    LIKE_FLUSH_BATCH_SIZE: int = 500
+    # 卡片的回复数和收藏数定期按明细表重新统计（只校正热数据窗口内的卡片）
+    CARD_COUNT_RECONCILE_INTERVAL_SECONDS: int = 60 * 60
+
+    # 热度榜：点赞、回复、发帖各自累加的分数，分数按半衰期定期衰减
+    TRENDING_LIKE_WEIGHT: float = 1.0
+    TRENDING_REPLY_WEIGHT: float = 3.0
+    TRENDING_NEW_CARD_SCORE: float = 1.0
+    TRENDING_HALF_LIFE_SECONDS: int = 6 * 60 * 60
+    TRENDING_DECAY_INTERVAL_SECONDS: int = 300
+    # 衰减到这个分数以下的卡片移出热度榜
+    TRENDING_MIN_SCORE: float = 0.01
+    TRENDING_MAX_LENGTH: int = 500
+
+    # 卡片和回复表按月分区：后台任务提前建好接下来几个月的分区
+    CARD_PARTITION_MONTHS_AHEAD: int = 3
+    CARD_PARTITION_CHECK_INTERVAL_SECONDS: int = 6 * 60 * 60
+    # 按编号查卡片时先只查最近这么多天的分区（热数据），查不到再扫全部分区
+    CARD_HOT_WINDOW_DAYS: int = 45
+
     @computed_field  # type: ignore[prop-decorator]
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> PostgresDsn:
@@ -99,6 +174,20 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_DATABASE_URI(self) -> PostgresDsn | None:
+        if not self.POSTGRES_REPLICA_SERVER:
+            return None
+        return MultiHostUrl.build(
+            scheme="postgresql+asyncpg",
+            username=self.POSTGRES_USER,
+            password=self.POSTGRES_PASSWORD,
+            host=self.POSTGRES_REPLICA_SERVER,
+            port=self.POSTGRES_REPLICA_PORT or self.POSTGRES_PORT,
+            path=self.POSTGRES_DB,
+        )
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -0,0 +1,319 @@
+import asyncio
+import time
+import uuid
+from collections.abc import Iterable
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, Literal
+
+import redis.asyncio as aioredis
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, func, or_, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import partitions, timeline
+from app.core.config import settings
+from app.core.db import engine
+from app.models import AddReplyCard, CardFavorite, DefaultCard
+
+##################点赞数先累加在 Redis 中，由后台任务批量写回数据库
+# 读取卡片时把还没写回的增量合并进 thumbs，客户端看到的始终是最新值
+
+LikeTarget = Literal["card", "reply"]
+
+LIKE_DELTA_KEY = "likes:delta:{kind}:{key}"
+# 有未写回增量的目标集合，成员格式为 "card:12" / "reply:<uuid>"
+LIKE_DIRTY_KEY = "likes:dirty"
+# 正在写回的批次（HASH: 成员 -> 增量，另有 _taken_at 和数据库事务号 _xid），以及所有未完成批次的集合
+LIKE_BATCH_KEY = "likes:inflight:{batch}"
+LIKE_BATCHES_KEY = "likes:inflight"
+# 同一时间只有一个 worker 写回和恢复批次
+LIKE_FLUSH_LOCK_KEY = "likes:flush:lock"
+LIKE_FLUSH_LOCK_SECONDS = 60
+# 超过这个时间仍未完成的批次视为写回进程已退出，由下一轮恢复
+LIKE_BATCH_STALE_SECONDS = LIKE_FLUSH_LOCK_SECONDS
+# 多个 worker 同时运行校正任务，同一个周期只允许一个执行
+CARD_COUNT_RECONCILE_LOCK_KEY = "card-counts:reconcile:lock"
+
+_card_table = DefaultCard.__table__  # type: ignore[attr-defined]
+_reply_table = AddReplyCard.__table__  # type: ignore[attr-defined]
+_favorite_table = CardFavorite.__table__  # type: ignore[attr-defined]
+
+# executemany 批量更新：thumbs = thumbs + delta，不小于 0
+_update_card_thumbs = (
+    update(_card_table)
+    .where(_card_table.c.number == bindparam("b_key"))
+    .values(thumbs=func.greatest(func.coalesce(_card_table.c.thumbs, 0) + bindparam("b_delta"), 0))
+)
+_update_reply_thumbs = (
+    update(_reply_table)
+    .where(_reply_table.c.number_primary == bindparam("b_key"))
+    .values(thumbs=func.greatest(func.coalesce(_reply_table.c.thumbs, 0) + bindparam("b_delta"), 0))
+)
+
+# 把一批目标的增量原子地移进批次，移出脏集合；之后的点赞重新累加在增量里，等下一轮
+# KEYS: 脏集合, 批次 key, 批次集合, 各目标的增量 key；ARGV: 当前时间, 各目标的脏集合成员
+# 返回 [成员, 增量, 成员, 增量, ...]，只包含增量不为 0 的目标
+_TAKE_SCRIPT = """
+local taken = {}
+for i = 2, #ARGV do
+    local delta_key = KEYS[i + 2]
+    local delta = redis.call('GET', delta_key)
+    redis.call('DEL', delta_key)
+    redis.call('SREM', KEYS[1], ARGV[i])
+    if delta and tonumber(delta) ~= 0 then
+        redis.call('HSET', KEYS[2], ARGV[i], delta)
+        table.insert(taken, ARGV[i])
+        table.insert(taken, delta)
+    end
+end
+if #taken > 0 then
+    redis.call('HSET', KEYS[2], '_taken_at', ARGV[1])
+    redis.call('SADD', KEYS[3], KEYS[2])
+end
+return taken
+"""
+
+
+async def record_like(
+    redis: aioredis.Redis, session: AsyncSession, kind: LikeTarget, key: Any, amount: int
+) -> None:
+    """
+    记录一次点赞 (+1) 或取消点赞 (-1)
+    Redis 不可用时直接对数据库做原子更新，保证计数不丢
+    """
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.incrby(LIKE_DELTA_KEY.format(kind=kind, key=key), amount)
+            pipe.sadd(LIKE_DIRTY_KEY, f"{kind}:{key}")
+            await pipe.execute()
+        return
+    except RedisError as e:
+        logger.warning(f"点赞计数写入 Redis 失败，直接更新数据库: {e}")
+    statement = _update_card_thumbs if kind == "card" else _update_reply_thumbs
+    await session.execute(statement, [{"b_key": key, "b_delta": amount}])
+    await session.commit()
+    if kind == "card":
+        await timeline.invalidate_cards(redis, [int(key)])
+
+
+async def pending_deltas(redis: aioredis.Redis, targets: list[tuple[LikeTarget, Any]]) -> list[int]:
+    """读取一批目标尚未写回的点赞增量，Redis 不可用时按 0 处理"""
+    if not targets:
+        return []
+    try:
+        deltas = await redis.mget([LIKE_DELTA_KEY.format(kind=kind, key=key) for kind, key in targets])
+    except RedisError as e:
+        logger.warning(f"读取点赞增量失败: {e}")
+        return [0] * len(targets)
+    return [int(delta) if delta else 0 for delta in deltas]
+
+
+async def merge_pending(
+    redis: aioredis.Redis,
+    cards: Iterable[DefaultCard] = (),
+    replies: Iterable[AddReplyCard] = (),
+) -> None:
+    """把 Redis 中尚未写回的点赞增量合并到卡片的 thumbs 上（只修改返回给客户端的对象）"""
+    items: list[Any] = [*cards, *replies]
+    targets: list[tuple[LikeTarget, Any]] = [
+        ("card", item.number) if isinstance(item, DefaultCard) else ("reply", item.number_primary)
+        for item in items
+    ]
+    deltas = await pending_deltas(redis, targets)
+    for item, delta in zip(items, deltas, strict=True):
+        if delta:
+            item.thumbs = max((item.thumbs or 0) + delta, 0)
+
+
+async def flush(redis: aioredis.Redis) -> int:
+    """
+    先恢复中断的批次，再取一批有增量的目标写回数据库，返回处理的目标数
+    其他 worker 正在写回时直接返回 0
+    """
+    if not await redis.set(LIKE_FLUSH_LOCK_KEY, 1, nx=True, ex=LIKE_FLUSH_LOCK_SECONDS):
+        return 0
+    try:
+        await _recover_batches(redis)
+        members = await redis.srandmember(LIKE_DIRTY_KEY, settings.LIKE_FLUSH_BATCH_SIZE)
+        if not members:
+            return 0
+        await _flush_batch(redis, members)
+        return len(members)
+    finally:
+        await redis.delete(LIKE_FLUSH_LOCK_KEY)
+
+
+async def _flush_batch(redis: aioredis.Redis, members: list[str]) -> None:
+    """
+    增量先移进批次再写回：读取时只合并增量，批次里的点赞要么还没写进数据库，要么已经写进去了，不会算两次
+    （写回的几毫秒内这一批暂时看不到，宁可少算一会儿也不多算）
+    提交后删除批次；进程在这之间退出时由 _recover_batches 按数据库事务状态决定重放还是丢弃
+    """
+    batch_key = LIKE_BATCH_KEY.format(batch=uuid.uuid4().hex)
+    delta_keys = [LIKE_DELTA_KEY.format(kind=kind, key=key) for kind, key in _split_members(members)]
+    taken = await redis.eval(
+        _TAKE_SCRIPT, len(delta_keys) + 3, LIKE_DIRTY_KEY, batch_key, LIKE_BATCHES_KEY, *delta_keys,
+        time.time(), *members,
+    )
+    if not taken:
+        return
+    batch = dict(zip(taken[::2], map(int, taken[1::2]), strict=True))
+    try:
+        card_numbers = await _write_batch(redis, batch_key, batch)
+    except Exception:
+        # 写回失败时马上按事务状态处理这一批，不等它过期；数据库仍不可用时留给下一轮恢复
+        with suppress(Exception):
+            await _resolve_batch(redis, batch_key)
+        raise
+    await _drop_batch(redis, batch_key)
+    await timeline.invalidate_cards(redis, card_numbers)
+
+
+def _split_members(members: Iterable[str]) -> list[list[str]]:
+    return [member.split(":", 1) for member in members]
+
+
+async def _write_batch(redis: aioredis.Redis, batch_key: str, batch: dict[str, int]) -> list[int]:
+    """
+    用两条 executemany UPDATE 把批次写回数据库，返回涉及的卡片编号
+    执行 UPDATE 之前先把这次事务的事务号记到批次里，恢复时据此判断是否已经提交
+    """
+    card_rows: list[dict[str, Any]] = []
+    reply_rows: list[dict[str, Any]] = []
+    for (kind, key), delta in zip(_split_members(batch), batch.values(), strict=True):
+        if kind == "card":
+            card_rows.append({"b_key": int(key), "b_delta": delta})
+        else:
+            reply_rows.append({"b_key": uuid.UUID(key), "b_delta": delta})
+    async with AsyncSession(engine) as session:
+        xid = (await session.execute(select(func.txid_current()))).scalar_one()
+        await redis.hset(batch_key, "_xid", xid)
+        if card_rows:
+            await session.execute(_update_card_thumbs, card_rows)
+        if reply_rows:
+            await session.execute(_update_reply_thumbs, reply_rows)
+        await session.commit()
+    return [row["b_key"] for row in card_rows]
+
+
+async def _drop_batch(redis: aioredis.Redis, batch_key: str) -> None:
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(batch_key)
+        pipe.srem(LIKE_BATCHES_KEY, batch_key)
+        await pipe.execute()
+
+
+async def _restore_batch(redis: aioredis.Redis, batch_key: str, batch: dict[str, int]) -> None:
+    """批次没有写进数据库：增量加回去，等下一轮重新写回"""
+    async with redis.pipeline(transaction=True) as pipe:
+        for (kind, key), delta in zip(_split_members(batch), batch.values(), strict=True):
+            pipe.incrby(LIKE_DELTA_KEY.format(kind=kind, key=key), delta)
+            pipe.sadd(LIKE_DIRTY_KEY, f"{kind}:{key}")
+        pipe.delete(batch_key)
+        pipe.srem(LIKE_BATCHES_KEY, batch_key)
+        await pipe.execute()
+
+
+async def _recover_batches(redis: aioredis.Redis) -> None:
+    """处理写回进程中途退出留下的批次"""
+    now = time.time()
+    for batch_key in await redis.smembers(LIKE_BATCHES_KEY):
+        taken_at = await redis.hget(batch_key, "_taken_at")
+        if taken_at is not None and now - float(taken_at) < LIKE_BATCH_STALE_SECONDS:
+            continue
+        await _resolve_batch(redis, batch_key)
+
+
+async def _resolve_batch(redis: aioredis.Redis, batch_key: str) -> None:
+    """
+    按批次记录的事务号决定怎么处理：没有事务号或事务已回滚的加回增量，
+    已提交的直接丢弃（不重放，避免多算），仍在执行的留到下一轮
+    """
+    fields = await redis.hgetall(batch_key)
+    xid = fields.pop("_xid", None)
+    fields.pop("_taken_at", None)
+    batch = {member: int(delta) for member, delta in fields.items()}
+    if not batch:
+        await _drop_batch(redis, batch_key)
+        return
+    status = None
+    if xid is not None:
+        async with AsyncSession(engine) as session:
+            status = (await session.execute(select(func.txid_status(int(xid))))).scalar_one()
+    if xid is None or status == "aborted":
+        logger.warning(f"点赞批次 {batch_key} 未写入数据库，重新写回 {len(batch)} 个目标")
+        await _restore_batch(redis, batch_key, batch)
+    elif status == "committed":
+        await _drop_batch(redis, batch_key)
+        await timeline.invalidate_cards(redis, [int(key) for kind, key in _split_members(batch) if kind == "card"])
+    elif status is None:
+        # 事务号已超出数据库保留的提交记录，无法确认；丢弃，宁可少算也不多算
+        logger.error(f"无法确认点赞批次 {batch_key} 是否已写入数据库，丢弃 {len(batch)} 个目标的增量")
+        await _drop_batch(redis, batch_key)
+
+
+async def run_flusher(redis: aioredis.Redis) -> None:
+    """后台循环：每隔 LIKE_FLUSH_INTERVAL_SECONDS 写回一次，积压较多时连续写回"""
+    while True:
+        try:
+            while await flush(redis) >= settings.LIKE_FLUSH_BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"点赞计数写回失败: {e}")
+        await asyncio.sleep(settings.LIKE_FLUSH_INTERVAL_SECONDS)
+
+
+##################卡片的 reply_count / favorite_count 随写入原子加减，
+# 这里定期按 addreplycard 和 cardfavorite 重新统计，修正异常中断等原因造成的偏差
+
+async def reconcile_card_counts(session: AsyncSession, since: datetime | None = None) -> list[int]:
+    """
+    重新统计卡片的回复数和收藏数，只改写不一致的行，返回被修正的卡片编号
+    since 不为空时只校正这之后发布的卡片（只扫对应的分区）
+    与写入并发时个别卡片可能仍有偏差，下一轮会再修正
+    """
+    replies = (
+        select(func.count())
+        .where(_reply_table.c.number == _card_table.c.number, _reply_table.c.time >= _card_table.c.time)
+        .scalar_subquery()
+    )
+    favorites = (
+        select(func.count())
+        .where(_favorite_table.c.card_number == _card_table.c.number)
+        .scalar_subquery()
+    )
+    statement = (
+        update(_card_table)
+        .where(or_(_card_table.c.reply_count != replies, _card_table.c.favorite_count != favorites))
+        .values(reply_count=replies, favorite_count=favorites)
+        .returning(_card_table.c.number)
+    )
+    if since is not None:
+        statement = statement.where(_card_table.c.time >= since)
+    result = await session.execute(statement)
+    numbers = list(result.scalars())
+    await session.commit()
+    return numbers
+
+
+async def run_reconciler(redis: aioredis.Redis) -> None:
+    """后台循环：每隔 CARD_COUNT_RECONCILE_INTERVAL_SECONDS 校正一次热数据窗口内的卡片"""
+    interval = settings.CARD_COUNT_RECONCILE_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await redis.set(CARD_COUNT_RECONCILE_LOCK_KEY, 1, nx=True, ex=max(interval - 1, 1)):
+                continue
+            async with AsyncSession(engine) as session:
+                numbers = await reconcile_card_counts(session, partitions.hot_cutoff())
+            if numbers:
+                logger.info(f"已校正 {len(numbers)} 张卡片的回复数和收藏数")
+                await timeline.invalidate_cards(redis, numbers)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"校正卡片计数失败: {e}")
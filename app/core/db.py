@@ -13,6 +13,16 @@ engine = create_async_engine(
     max_overflow=200
 )
 
+# 只读副本的引擎；没有配置副本时就是主库引擎，读接口照常工作
+if settings.SQLALCHEMY_REPLICA_DATABASE_URI:
+    replica_engine = create_async_engine(
+        str(settings.SQLALCHEMY_REPLICA_DATABASE_URI),
+        pool_size=200,
+        max_overflow=200
+    )
+else:
+    replica_engine = engine
+
 # If your previous engine had other parameters like echo=True, 
 # you should add them here as well, for example:
 # engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI), echo=True)
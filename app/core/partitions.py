@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import redis.asyncio as aioredis
+from loguru import logger
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+
+##################卡片表和回复表按 time 按月分区（RANGE 分区，UTC 月初为边界）
+# 分区名为 <表名>_yYYYYmMM，迁移之前的历史数据在 <表名>_archive 中
+# 后台任务提前建好接下来几个月的分区；旧的月份分区可以单独 DETACH 归档或 VACUUM
+
+PARTITIONED_TABLES = ("defaultcard", "addreplycard")
+# 多个 worker 同时运行维护任务，同一时间只允许一个建分区
+PARTITION_LOCK_KEY = "partitions:lock"
+
+
+def month_start(value: datetime) -> datetime:
+    """value 所在月份的第一天 0 点（UTC）"""
+    value = value.astimezone(timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """month 为月初，返回 count 个月之后的月初"""
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def create_partition_sql(table: str, month: datetime) -> str:
+    """建一个月份分区的 DDL，范围为 [month, 下个月)"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def create_archive_sql(table: str, before: datetime) -> str:
+    """archive 分区存放 before 之前的所有数据（迁移前的历史数据、导入的旧数据）"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_archive PARTITION OF {table} "
+        f"FOR VALUES FROM (MINVALUE) TO ('{before.isoformat()}')"
+    )
+
+
+def upcoming_months(now: datetime | None = None) -> list[datetime]:
+    """需要存在的月份：当月以及接下来 CARD_PARTITION_MONTHS_AHEAD 个月"""
+    current = month_start(now or datetime.now(timezone.utc))
+    return [add_months(current, i) for i in range(settings.CARD_PARTITION_MONTHS_AHEAD + 1)]
+
+
+def hot_cutoff() -> datetime:
+    """热数据窗口的起点，早于它的分区视为冷数据"""
+    return datetime.now(timezone.utc) - timedelta(days=settings.CARD_HOT_WINDOW_DAYS)
+
+
+async def hot_first(session: AsyncSession, statement: Any, time_column: Any, expected: int = 1) -> list[Any]:
+    """
+    按编号等非分区键查询时，先加上热数据窗口的 time 条件，只扫最近几个月的分区；
+    找到的行数少于 expected（目标是冷数据或不存在）时再不带条件扫全部分区
+    """
+    result = await session.exec(statement.where(time_column >= hot_cutoff()))
+    rows = result.all()
+    if len(rows) < expected:
+        result = await session.exec(statement)
+        rows = result.all()
+    return list(rows)
+
+
+async def ensure_partitions(now: datetime | None = None) -> list[str]:
+    """补建缺少的月份分区，返回新建的分区名"""
+    months = upcoming_months(now)
+    created: list[str] = []
+    async with engine.begin() as conn:
+        # 建分区需要父表上的锁，拿不到就等下一轮，不让业务查询排队
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        for table in PARTITIONED_TABLES:
+            result = await conn.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE i.inhparent = CAST(:table AS regclass)"
+                ),
+                {"table": table},
+            )
+            existing = set(result.scalars())
+            for month in months:
+                name = partition_name(table, month)
+                if name in existing:
+                    continue
+                await conn.execute(text(create_partition_sql(table, month)))
+                created.append(name)
+    if created:
+        logger.info(f"已创建分区: {', '.join(created)}")
+    return created
+
+
+async def run_maintenance(redis: aioredis.Redis) -> None:
+    """后台循环：启动时先检查一次，之后每隔 CARD_PARTITION_CHECK_INTERVAL_SECONDS 检查一次"""
+    while True:
+        try:
+            if await redis.set(PARTITION_LOCK_KEY, 1, nx=True, ex=60):
+                try:
+                    await ensure_partitions()
+                finally:
+                    await redis.delete(PARTITION_LOCK_KEY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 分区提前几个月建好，错过一轮没有影响
+            logger.error(f"分区维护失败: {e}")
+        await asyncio.sleep(settings.CARD_PARTITION_CHECK_INTERVAL_SECONDS)
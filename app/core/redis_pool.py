@@ -0,0 +1,52 @@
+from typing import Any
+
+import redis.asyncio as aioredis
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+##################每个 worker 一个 Redis 连接池，在 lifespan 中创建，所有依赖和后台任务共用
+# 连接池满时最多等待 REDIS_POOL_TIMEOUT_SECONDS 秒，空闲超过 REDIS_HEALTH_CHECK_INTERVAL 秒的连接在使用前先 PING
+
+
+def create_client() -> aioredis.Redis:
+    pool = aioredis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        encoding="utf-8",
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def check(redis: aioredis.Redis) -> bool:
+    """启动时检查 Redis 是否可用，不可用时只记录日志，依赖 Redis 的功能各自降级"""
+    try:
+        await redis.ping()
+        return True
+    except RedisError as e:
+        logger.error(f"Redis 连接失败: {e}")
+        return False
+
+
+async def close(redis: aioredis.Redis) -> None:
+    await redis.close()
+    await redis.connection_pool.disconnect()
+
+
+def pool_metrics(redis: aioredis.Redis) -> dict[str, Any]:
+    """连接池的运行指标：已建立、正在使用和空闲的连接数"""
+    pool = redis.connection_pool
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    available = len(getattr(pool, "_available_connections", ()))
+    return {
+        "max_connections": pool.max_connections,
+        "created": in_use + available,
+        "in_use": in_use,
+        "available": available,
+    }
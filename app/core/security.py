@@ -1,5 +1,10 @@
+import asyncio
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
@@ -25,3 +30,78 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 #使用与存储密码时相同的哈希算法（例如 bcrypt）对用户输入的明文密码进行哈希计算
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+##################bcrypt 每次要算 100~300ms，在 async 路由里直接调用会阻塞整个事件循环
+# 异步版本放到专用的线程池中执行（bcrypt 计算时会释放 GIL），排队的请求数有上限，
+# 超出时抛出 PasswordHasherBusy，由全局异常处理返回 503，登录高峰不会拖慢其他接口
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """密码哈希线程池排队已满"""
+
+
+@dataclass
+class PasswordHasherStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    pending: int = 0 #正在执行和排队中的任务数
+    wait_seconds: float = 0.0 #累计排队时间
+    run_seconds: float = 0.0 #累计执行时间
+
+
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_hash_stats = PasswordHasherStats()
+
+
+def _timed(func: Callable[..., T], *args: Any) -> tuple[T, float, float]:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, started, time.perf_counter()
+
+
+async def _run_hasher(func: Callable[..., T], *args: Any) -> T:
+    if _hash_stats.pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        _hash_stats.rejected += 1
+        raise PasswordHasherBusy()
+    _hash_stats.submitted += 1
+    _hash_stats.pending += 1
+    queued = time.perf_counter()
+    try:
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(
+            _hash_executor, _timed, func, *args
+        )
+    except Exception:
+        _hash_stats.failed += 1
+        raise
+    finally:
+        _hash_stats.pending -= 1
+    _hash_stats.completed += 1
+    _hash_stats.wait_seconds += started - queued
+    _hash_stats.run_seconds += finished - started
+    return result
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hasher(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hasher(pwd_context.hash, password)
+
+
+def password_hasher_metrics() -> dict[str, Any]:
+    """密码哈希线程池的运行指标"""
+    metrics: dict[str, Any] = asdict(_hash_stats)
+    metrics["workers"] = settings.PASSWORD_HASH_WORKERS
+    metrics["max_pending"] = settings.PASSWORD_HASH_MAX_PENDING
+    done = _hash_stats.completed or 1
+    metrics["avg_wait_ms"] = _hash_stats.wait_seconds / done * 1000
+    metrics["avg_run_ms"] = _hash_stats.run_seconds / done * 1000
+    return metrics
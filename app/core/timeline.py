@@ -0,0 +1,179 @@
+import json
+from datetime import datetime, timezone
+
+import redis.asyncio as aioredis
+from loguru import logger
+from pydantic import ValidationError
+from redis.exceptions import RedisError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import partitions
+from app.core.config import settings
+from app.core.db import engine
+from app.models import DefaultCard
+
+##################每个分类在 Redis 中维护一条时间线（ZSET: 卡片编号 -> 发布时间）
+# 话题列表先从时间线取编号，再按主键批量取卡片内容，尽量不走数据库
+
+# v2：成员改为定长编号，旧格式的时间线不再读取，过期后自然删除
+TIMELINE_KEY = "timeline:v2:{category}"
+# 时间线已从数据库完整构建的标记，过期后下次读取会重建
+TIMELINE_READY_KEY = "timeline:v2:ready:{category}"
+TIMELINE_LOCK_KEY = "timeline:lock:{category}"
+CARD_BODY_KEY = "card:body:{number}"
+# bigint 的最大值是 19 位
+MEMBER_WIDTH = 19
+
+
+def card_score(card: DefaultCard) -> float:
+    """卡片在时间线中的分数：发布时间的时间戳"""
+    return (card.time or datetime.now(timezone.utc)).timestamp()
+
+
+def card_member(number: int) -> str:
+    """
+    卡片在时间线中的成员：补零到定长的编号
+    分数相同时 ZREVRANGE 按成员字典序倒序返回，定长后与数据库的 (time DESC, number DESC) 一致，
+    否则 "9" 会排在 "10" 前面，第一页（Redis）和游标翻页（数据库）在边界处重复或遗漏
+    """
+    return f"{number:0{MEMBER_WIDTH}d}"
+
+
+def dump_card(card: DefaultCard) -> str:
+    """缓存中的卡片保留完整的 ISO 时间，读回后生成的游标才是精确的"""
+    return card.model_dump_json(context={"raw_time": True})
+
+
+async def add_card(redis: aioredis.Redis, card: DefaultCard) -> None:
+    """
+    新卡片写入时间线和内容缓存，时间线只保留最新的 TIMELINE_MAX_LENGTH 张
+    """
+    key = TIMELINE_KEY.format(category=card.category)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {card_member(card.number): card_score(card)})
+            pipe.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+            pipe.set(
+                CARD_BODY_KEY.format(number=card.number),
+                dump_card(card),
+                ex=settings.CARD_CACHE_TTL_SECONDS,
+            )
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"写入时间线失败，等待下次重建: {e}")
+        try:
+            await redis.delete(TIMELINE_READY_KEY.format(category=card.category))
+        except RedisError:
+            pass
+
+
+async def invalidate_cards(redis: aioredis.Redis, numbers: list[int]) -> None:
+    """卡片内容（如点赞数）变化后删除内容缓存"""
+    if not numbers:
+        return
+    try:
+        await redis.delete(*[CARD_BODY_KEY.format(number=n) for n in numbers])
+    except RedisError as e:
+        logger.warning(f"删除卡片缓存失败: {e}")
+
+
+async def rebuild(redis: aioredis.Redis, session: AsyncSession, category: str) -> bool:
+    """
+    从数据库重建某个分类的时间线，返回是否重建成功
+    同一时间只允许一个请求重建，其余请求直接回源数据库
+    """
+    lock_key = TIMELINE_LOCK_KEY.format(category=category)
+    if not await redis.set(lock_key, 1, nx=True, ex=30):
+        return False
+    try:
+        statement = (
+            select(DefaultCard.number, DefaultCard.time)
+            .where(DefaultCard.category == category)
+            .order_by(DefaultCard.time.desc(), DefaultCard.number.desc())
+            .limit(settings.TIMELINE_MAX_LENGTH)
+        )
+        result = await session.exec(statement)
+        members = {card_member(number): time.timestamp() for number, time in result.all()}
+        key = TIMELINE_KEY.format(category=category)
+        # 不先清空：重建期间 add_card 写入的新卡片不能丢，已删除的卡片在 get_cards 里会被跳过
+        async with redis.pipeline(transaction=True) as pipe:
+            if members:
+                pipe.zadd(key, members)
+                pipe.zremrangebyrank(key, 0, -settings.TIMELINE_MAX_LENGTH - 1)
+            pipe.set(
+                TIMELINE_READY_KEY.format(category=category),
+                1,
+                ex=settings.TIMELINE_TTL_SECONDS,
+            )
+            await pipe.execute()
+        logger.info(f"分类 {category} 的时间线已重建，共 {len(members)} 张卡片")
+        return True
+    finally:
+        await redis.delete(lock_key)
+
+
+async def get_cards(
+    redis: aioredis.Redis, session: AsyncSession, numbers: list[int]
+) -> list[DefaultCard]:
+    """
+    按编号批量获取卡片：先 MGET 内容缓存，未命中的按主键一次查询并回填缓存
+    返回顺序与 numbers 一致，已删除的卡片会被跳过
+    只回填从主库读到的卡片：只读副本可能落后于主库，invalidate_cards 之后从副本读到的旧内容
+    会在缓存里再留 CARD_CACHE_TTL_SECONDS
+    """
+    if not numbers:
+        return []
+    cards: dict[int, DefaultCard] = {}
+    cached = await redis.mget([CARD_BODY_KEY.format(number=n) for n in numbers])
+    for number, raw in zip(numbers, cached, strict=True):
+        if raw:
+            try:
+                cards[number] = DefaultCard.model_validate(json.loads(raw))
+            except ValidationError:
+                # 旧格式的缓存当作未命中，下面会重新回填
+                continue
+
+    missing = [n for n in numbers if n not in cards]
+    if missing:
+        # 列表里基本都是最近的卡片，先只查热数据分区
+        loaded = await partitions.hot_first(
+            session, select(DefaultCard).where(DefaultCard.number.in_(missing)), DefaultCard.time, len(missing)
+        )
+        for card in loaded:
+            cards[card.number] = card
+        # 没有配置副本时 replica_engine 就是主库引擎，照常回填
+        if loaded and session.bind is engine:
+            async with redis.pipeline(transaction=False) as pipe:
+                for card in loaded:
+                    pipe.set(
+                        CARD_BODY_KEY.format(number=card.number),
+                        dump_card(card),
+                        ex=settings.CARD_CACHE_TTL_SECONDS,
+                    )
+                await pipe.execute()
+    return [cards[n] for n in numbers if n in cards]
+
+
+async def read_page(
+    redis: aioredis.Redis, session: AsyncSession, category: str, skip: int, limit: int
+) -> list[DefaultCard] | None:
+    """
+    从时间线读取一页卡片；返回 None 表示时间线不可用或页码超出缓存范围，需要回源数据库
+    """
+    key = TIMELINE_KEY.format(category=category)
+    try:
+        if not await redis.exists(TIMELINE_READY_KEY.format(category=category)):
+            if not await rebuild(redis, session, category):
+                return None
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(key)
+            pipe.zrevrange(key, skip, skip + limit - 1)
+            size, members = await pipe.execute()
+        # 时间线被截断过，超出部分只能从数据库取
+        if size >= settings.TIMELINE_MAX_LENGTH and skip + limit > size:
+            return None
+        return await get_cards(redis, session, [int(m) for m in members])
+    except RedisError as e:
+        logger.warning(f"读取时间线失败，回源数据库: {e}")
+        return None
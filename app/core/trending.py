@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timezone
+
+import redis.asyncio as aioredis
+from loguru import logger
+from redis.exceptions import RedisError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import DefaultCard
+
+##################每个分类的热度榜（ZSET: 卡片编号 -> 热度分）
+# 点赞、回复、发帖时增量累加分数，后台任务定期按半衰期整体衰减，热门接口直接取前 N 名
+
+TRENDING_KEY = "trending:{category}"
+# 有热度榜的分类集合，衰减任务按它遍历
+TRENDING_CATEGORIES_KEY = "trending:categories"
+# 热度榜已从数据库初始化的标记，Redis 数据丢失后会随之消失并触发重建
+TRENDING_READY_KEY = "trending:ready:{category}"
+TRENDING_LOCK_KEY = "trending:lock:{category}"
+# 多个 worker 同时运行衰减任务，同一个周期只允许一个执行
+TRENDING_DECAY_LOCK_KEY = "trending:decay:lock"
+
+
+def decay_factor(seconds: float) -> float:
+    """经过 seconds 秒后分数保留的比例"""
+    return 0.5 ** (seconds / settings.TRENDING_HALF_LIFE_SECONDS)
+
+
+async def record(redis: aioredis.Redis, category: str | None, number: int, weight: float) -> None:
+    """卡片被点赞 / 回复 / 发布时累加热度，Redis 不可用时只记录日志，等下次重建修正"""
+    if category is None:
+        return
+    key = TRENDING_KEY.format(category=category)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zincrby(key, weight, str(number))
+            pipe.sadd(TRENDING_CATEGORIES_KEY, category)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"更新热度失败: {e}")
+
+
+async def rebuild(redis: aioredis.Redis, session: AsyncSession, category: str) -> bool:
+    """
+    从数据库初始化某个分类的热度榜：只看最新的 TRENDING_MAX_LENGTH 张卡片，
+    按点赞数、回复数和发布时间算出当前的衰减后分数
+    """
+    lock_key = TRENDING_LOCK_KEY.format(category=category)
+    if not await redis.set(lock_key, 1, nx=True, ex=30):
+        return False
+    try:
+        statement = (
+            select(DefaultCard.number, DefaultCard.time, DefaultCard.thumbs, DefaultCard.reply_count)
+            .where(DefaultCard.category == category)
+            .order_by(DefaultCard.time.desc(), DefaultCard.number.desc())
+            .limit(settings.TRENDING_MAX_LENGTH)
+        )
+        result = await session.exec(statement)
+        now = datetime.now(timezone.utc)
+        scores: dict[str, float] = {}
+        for number, time, thumbs, reply_count in result.all():
+            score = (
+                settings.TRENDING_NEW_CARD_SCORE
+                + (thumbs or 0) * settings.TRENDING_LIKE_WEIGHT
+                + (reply_count or 0) * settings.TRENDING_REPLY_WEIGHT
+            )
+            age = (now - time).total_seconds()
+            scores[str(number)] = score * decay_factor(max(age, 0))
+        key = TRENDING_KEY.format(category=category)
+        async with redis.pipeline(transaction=True) as pipe:
+            if scores:
+                pipe.zadd(key, scores)
+            pipe.sadd(TRENDING_CATEGORIES_KEY, category)
+            pipe.set(TRENDING_READY_KEY.format(category=category), 1)
+            await pipe.execute()
+        logger.info(f"分类 {category} 的热度榜已重建，共 {len(scores)} 张卡片")
+        return True
+    finally:
+        await redis.delete(lock_key)
+
+
+async def top_numbers(
+    redis: aioredis.Redis, session: AsyncSession, category: str, limit: int
+) -> list[int] | None:
+    """热度最高的 limit 张卡片编号；返回 None 表示热度榜暂不可用"""
+    key = TRENDING_KEY.format(category=category)
+    try:
+        if not await redis.exists(TRENDING_READY_KEY.format(category=category)):
+            if not await rebuild(redis, session, category):
+                return None
+        members = await redis.zrevrange(key, 0, limit - 1)
+        return [int(m) for m in members]
+    except RedisError as e:
+        logger.warning(f"读取热度榜失败: {e}")
+        return None
+
+
+async def decay(redis: aioredis.Redis) -> None:
+    """
+    所有分类的分数按经过的时间整体衰减（ZUNIONSTORE 带权重原地改写），
+    并去掉过低的分数和超出长度上限的卡片
+    """
+    interval = settings.TRENDING_DECAY_INTERVAL_SECONDS
+    if not await redis.set(TRENDING_DECAY_LOCK_KEY, 1, nx=True, ex=max(int(interval) - 1, 1)):
+        return
+    factor = decay_factor(interval)
+    for category in await redis.smembers(TRENDING_CATEGORIES_KEY):
+        key = TRENDING_KEY.format(category=category)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.zunionstore(key, {key: factor})
+            pipe.zremrangebyscore(key, "-inf", settings.TRENDING_MIN_SCORE)
+            pipe.zremrangebyrank(key, 0, -settings.TRENDING_MAX_LENGTH - 1)
+            await pipe.execute()
+
+
+async def run_decay(redis: aioredis.Redis) -> None:
+    """后台循环：每隔 TRENDING_DECAY_INTERVAL_SECONDS 衰减一次"""
+    while True:
+        await asyncio.sleep(settings.TRENDING_DECAY_INTERVAL_SECONDS)
+        try:
+            await decay(redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"热度衰减失败: {e}")
@@ -0,0 +1,44 @@
+from typing import Any
+
+from sqlalchemy import ARRAY, String
+from sqlalchemy.engine import Dialect
+from sqlalchemy.types import TypeDecorator
+
+##################自定义列类型
+
+
+def parse_pg_array(value: str) -> list[str]:
+    """
+    解析 Postgres 数组字面量，例如 '{a.png,b.png}' -> ['a.png', 'b.png']
+    图片路径里不会出现逗号和引号，这里只处理最简单的格式
+    """
+    stripped = value.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        stripped = stripped[1:-1]
+    return [item.strip().strip('"') for item in stripped.split(",") if item.strip()]
+
+
+class StringArray(TypeDecorator):
+    """
+    字符串数组列（varchar[]）
+
+    旧数据里有的值是以字符串形式存储或返回的（'{a,b}'），ARRAY 的结果处理会把它按字符拆开，
+    得到 ['{', 'a', ',', 'b', '}']。这里在驱动层统一解码成正确的列表，响应模型不再需要逐行修复
+    """
+
+    impl = ARRAY(String)
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> list[str] | None:
+        if isinstance(value, str):
+            return parse_pg_array(value)
+        return value
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> list[str] | None:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return parse_pg_array(value)
+        if len(value) > 1 and value[0] == "{" and value[-1] == "}":
+            return parse_pg_array("".join(value))
+        return value if isinstance(value, list) else list(value)
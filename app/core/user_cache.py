@@ -0,0 +1,125 @@
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any
+
+import redis.asyncio as aioredis
+from loguru import logger
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.models import User
+
+##################已认证用户的两级缓存：token 摘要 -> 用户快照
+# 第一级是进程内的 TTL LRU，第二级是 Redis；命中时认证不需要查数据库
+# 用户信息修改、删除或改密码时按用户失效；进程内缓存无法跨 worker 失效，所以有效期很短
+
+AUTH_TOKEN_KEY = "auth:token:{digest}"
+# 每个用户已缓存的 token 摘要集合，按用户失效时使用
+AUTH_USER_TOKENS_KEY = "auth:user:{user_id}"
+# 快照只保留路由需要的字段，不包含密码哈希
+SNAPSHOT_FIELDS = ("email", "is_active", "is_superuser", "full_name")
+
+
+class _LocalCache:
+    """进程内的 TTL LRU，超出容量时淘汰最久未使用的条目"""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._items: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    def get(self, digest: str) -> dict[str, Any] | None:
+        item = self._items.get(digest)
+        if item is None:
+            return None
+        expires, snapshot = item
+        if expires <= time.monotonic():
+            del self._items[digest]
+            return None
+        self._items.move_to_end(digest)
+        return snapshot
+
+    def set(self, digest: str, snapshot: dict[str, Any]) -> None:
+        self._items[digest] = (time.monotonic() + settings.AUTH_CACHE_LOCAL_TTL_SECONDS, snapshot)
+        self._items.move_to_end(digest)
+        while len(self._items) > self._size:
+            self._items.popitem(last=False)
+
+    def discard_user(self, user_id: str) -> None:
+        for digest in [d for d, (_, s) in self._items.items() if s["id"] == user_id]:
+            del self._items[digest]
+
+
+_local = _LocalCache(settings.AUTH_CACHE_LOCAL_SIZE)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def to_user(snapshot: dict[str, Any]) -> User:
+    """由快照构造 User（不在任何会话中，也没有密码哈希），需要修改用户时请重新从数据库读取"""
+    return User(id=uuid.UUID(snapshot["id"]), **{field: snapshot[field] for field in SNAPSHOT_FIELDS})
+
+
+async def get(redis: aioredis.Redis, digest: str) -> dict[str, Any] | None:
+    """依次查进程内缓存和 Redis，token 已过期或未缓存时返回 None"""
+    snapshot = _local.get(digest)
+    if snapshot is None:
+        try:
+            raw = await redis.get(AUTH_TOKEN_KEY.format(digest=digest))
+        except RedisError as e:
+            logger.warning(f"读取用户缓存失败: {e}")
+            return None
+        if raw is None:
+            return None
+        snapshot = json.loads(raw)
+        _local.set(digest, snapshot)
+    if snapshot["exp"] <= time.time():
+        return None
+    return snapshot
+
+
+async def put(redis: aioredis.Redis, digest: str, user: User, expires_at: float | None) -> dict[str, Any]:
+    """
+    缓存数据库中读到的用户，返回快照
+    Redis 中的有效期不超过 AUTH_CACHE_TTL_SECONDS，也不超过 token 本身的过期时间
+    """
+    now = time.time()
+    exp = now + settings.AUTH_CACHE_TTL_SECONDS
+    if expires_at is not None:
+        exp = min(exp, float(expires_at))
+    snapshot = {"id": str(user.id), **{field: getattr(user, field) for field in SNAPSHOT_FIELDS}, "exp": exp}
+    ttl = int(exp - now)
+    if ttl <= 0:
+        return snapshot
+    user_key = AUTH_USER_TOKENS_KEY.format(user_id=snapshot["id"])
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(AUTH_TOKEN_KEY.format(digest=digest), json.dumps(snapshot), ex=ttl)
+            pipe.sadd(user_key, digest)
+            pipe.expire(user_key, settings.AUTH_CACHE_TTL_SECONDS)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"写入用户缓存失败: {e}")
+        return snapshot
+    _local.set(digest, snapshot)
+    return snapshot
+
+
+async def invalidate_user(redis: aioredis.Redis, user_id: Any) -> None:
+    """用户信息修改、删除或改密码后调用，删除该用户所有 token 的缓存"""
+    user_id = str(user_id)
+    _local.discard_user(user_id)
+    user_key = AUTH_USER_TOKENS_KEY.format(user_id=user_id)
+    try:
+        digests = await redis.smembers(user_key)
+        async with redis.pipeline(transaction=True) as pipe:
+            for digest in digests:
+                pipe.delete(AUTH_TOKEN_KEY.format(digest=digest))
+            pipe.delete(user_key)
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"删除用户缓存失败: {e}")
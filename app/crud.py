@@ -1,9 +1,11 @@
 import uuid
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import insert, update
 from sqlmodel import Session, select
 
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async
 from app.models import Item, ItemCreate, User, UserCreate, UserUpdate, DefaultCard, AddReplyCard, Cookie
 
 #向数据库中添加新卡片的函数实现
@@ -11,29 +13,52 @@ async def create_card(*, session: Session, card_in: DefaultCard) -> DefaultCard:
     """
     Adds a new card record to the database.
     Assumes card_in is a pre-validated DefaultCard instance.
+    The card number is taken from defaultcard_number_seq and read back with
+    INSERT ... RETURNING, so concurrent posts never compute the same number.
+    The post time is assigned by the database default and read back the same way.
     """
-    db_card = card_in
-    session.add(db_card)
+    statement = (
+        insert(DefaultCard)
+        .values(**card_in.model_dump(exclude={"number", "time"}))
+        .returning(DefaultCard.number, DefaultCard.time)
+    )
+    result = await session.execute(statement)
+    card_in.number, card_in.time = result.one()
     await session.commit()
-    await session.refresh(db_card)
-    return db_card
+    return card_in
 
 #向数据库中添加新回复卡片的函数实现
-async def create_reply_card(*, session: Session, reply_card_in: AddReplyCard) -> AddReplyCard:
+async def create_reply_card(
+    *, session: Session, reply_card_in: AddReplyCard, card_time: datetime | None = None
+) -> AddReplyCard:
     """
     这个函数是向数据库中添加新回复卡片的函数实现
+    发布时间由数据库默认值生成，通过 RETURNING 取回
+    同一事务中把所属卡片的 reply_count 加一；传入 card_time 时只更新卡片所在的分区
     """
-    db_reply_card = reply_card_in
-    session.add(db_reply_card)
+    statement = (
+        insert(AddReplyCard)
+        .values(**reply_card_in.model_dump(exclude={"time"}))
+        .returning(AddReplyCard.time)
+    )
+    result = await session.execute(statement)
+    reply_card_in.time = result.scalar_one()
+    counter = (
+        update(DefaultCard)
+        .where(DefaultCard.number == reply_card_in.number)
+        .values(reply_count=DefaultCard.reply_count + 1)
+    )
+    if card_time is not None:
+        counter = counter.where(DefaultCard.time == card_time)
+    await session.execute(counter)
     await session.commit()
-    await session.refresh(db_reply_card)
-    return db_reply_card
+    return reply_card_in
 
 
 #向数据库中添加新用户的函数实现
 async def create_user(*, session: Session, user_create: UserCreate) -> User:
     db_obj = User.model_validate(
-        user_create, update={"hashed_password": get_password_hash(user_create.password)}
+        user_create, update={"hashed_password": await get_password_hash_async(user_create.password)}
     )
     session.add(db_obj)
     await session.commit()
@@ -47,7 +72,7 @@ async def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -
     extra_data = {}
     if "password" in user_data:
         password = user_data["password"]
-        hashed_password = get_password_hash(password)
+        hashed_password = await get_password_hash_async(password)
         extra_data["hashed_password"] = hashed_password
     db_user.sqlmodel_update(user_data, update=extra_data)
     session.add(db_user)
@@ -74,7 +99,7 @@ async def authenticate(*, session: Session, email: str, password: str) -> User |
     db_user = await get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    if not await verify_password_async(password, db_user.hashed_password):
         return None
     return db_user
 
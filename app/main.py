@@ -1,10 +1,16 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 import sentry_sdk
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.routing import APIRoute
 from starlette.middleware.cors import CORSMiddleware
 from loguru import logger
 from app.api.main import api_router
+from app.core import broadcast, counters, partitions, redis_pool, trending
 from app.core.config import settings
+from app.core.security import PasswordHasherBusy
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,10 +20,45 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 每个 worker 一个 Redis 连接池，请求依赖和后台任务共用
+    redis = redis_pool.create_client()
+    await redis_pool.check(redis)
+    app.state.redis = redis
+    # 每个 worker 启动后台任务：点赞计数批量写回数据库
+    like_flusher = asyncio.create_task(counters.run_flusher(redis))
+    # 定期校正卡片的回复数和收藏数
+    count_reconciler = asyncio.create_task(counters.run_reconciler(redis))
+    # 热度榜定期衰减，多个 worker 之间通过 Redis 锁保证每个周期只执行一次
+    trending_decay = asyncio.create_task(trending.run_decay(redis))
+    # 每个 worker 一个新卡片订阅，分发给本 worker 上的 SSE 连接
+    card_subscriber = asyncio.create_task(broadcast.run_subscriber(redis))
+    # 提前建好卡片表和回复表接下来几个月的分区
+    partition_maintenance = asyncio.create_task(partitions.run_maintenance(redis))
+    try:
+        yield
+    finally:
+        for task in (like_flusher, count_reconciler, trending_decay, card_subscriber, partition_maintenance):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        # 退出前把剩余的增量写回
+        try:
+            await counters.flush(redis)
+        except Exception as e:
+            logger.error(f"退出时写回点赞计数失败: {e}")
+        await redis_pool.close(redis)
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    # 接口默认用 orjson 序列化，比标准库 json 快，中文内容也不需要转义
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -31,3 +72,11 @@ if settings.all_cors_origins:
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(_request: Request, _exc: PasswordHasherBusy) -> ORJSONResponse:
+    # 密码哈希排队已满，快速失败，让客户端稍后重试
+    return ORJSONResponse(
+        status_code=503, content={"detail": "服务繁忙，请稍后再试"}, headers={"Retry-After": "1"}
+    )
@@ -1,14 +1,15 @@
 from typing import Optional, List, Any
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Literal
 from loguru import logger
 
-from pydantic import EmailStr, BaseModel, validator, field_validator, model_validator
-from sqlalchemy import UniqueConstraint, Column, String, Integer, Text, DateTime, Boolean, ARRAY, func
+from pydantic import EmailStr, BaseModel, SerializationInfo, validator, field_validator, field_serializer
+from sqlalchemy import UniqueConstraint, PrimaryKeyConstraint, Index, Sequence, Column, Integer, Text, DateTime, Boolean, func, text
 from sqlmodel import Field, Relationship, SQLModel, select
 from sqlalchemy.dialects.postgresql import JSONB
-from app.utils import process_image_urls
+from app.core.types import StringArray
+from app.utils import format_card_time
 
 
 # 这个算是用户表的基类，其他的用户表继承这个基类
@@ -131,50 +132,114 @@ class ImagePathInfo(BaseModel):
     relativePath: str # 图片url，图床分配的
 
 
+def serialize_card_time(value: Optional[datetime], info: SerializationInfo) -> Optional[str]:
+    """
+    卡片时间输出为原来的字符串格式；context 带 raw_time 时输出完整的 ISO 时间（用于缓存，保证游标精确）
+    """
+    if value is None:
+        return None
+    if info.context and info.context.get("raw_time"):
+        return value.isoformat()
+    return format_card_time(value)
+
 #聊天内容的卡片
 class DefaultCardBase(SQLModel):
     id: Optional[str] = Field(default=None)
     content: Optional[str] = Field(default=None)
-    time: Optional[str] = Field(default=None)
+    #发布时间由数据库在插入时生成；表按 time 按月分区，主键为 (number, time)
+    time: Optional[datetime] = Field(
+        default=None,
+        primary_key=True,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
     category: Optional[str] = Field(default=None)
     thumbs: Optional[int] = Field(default=0)
 
+    @field_serializer("time", when_used="json")
+    def serialize_time(self, value: Optional[datetime], info: SerializationInfo) -> Optional[str]:
+        return serialize_card_time(value, info)
+
 class DefaultCard(DefaultCardBase, table=True):
     __tablename__ = "defaultcard" # type: ignore
-    number: int = Field(default=None, primary_key=True, index=True)
-    imageUrls: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    # 卡片编号由数据库序列生成，插入时通过 RETURNING 取回
+    number: int = Field(
+        default=None,
+        primary_key=True,
+        index=True,
+        sa_column_args=[Sequence("defaultcard_number_seq")],
+    )
+    imageUrls: Optional[List[str]] = Field(default=None, sa_column=Column(StringArray()))
+    # 回复数和收藏数在写入回复 / 收藏的同一事务中原子加减，后台任务定期校正
+    reply_count: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    favorite_count: int = Field(default=0, sa_column_kwargs={"server_default": text("0")})
+    __table_args__ = (
+        # time 定义在基类中排在 number 前面，显式指定主键列顺序，和迁移建的 (number, time) 一致
+        PrimaryKeyConstraint("number", "time"),
+        # 话题列表按 (time, number) 倒序游标分页，直接按索引顺序扫描，不需要排序
+        Index("ix_defaultcard_category_time_number", "category", text("time DESC"), text("number DESC")),
+        # 个人主页按发布者查询自己的话题
+        Index("ix_defaultcard_id_time_number", "id", "time", "number"),
+        # 内容搜索用 pg_trgm 的 GIN 索引，中文不需要分词也能做子串匹配
+        Index(
+            "ix_defaultcard_content_trgm", "content",
+            postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
     
 
 #响应的卡片
 class DefaultCardResponse(SQLModel):
     data: list[DefaultCard]
-
-    @model_validator(mode='after')
-    def process_image_urls_in_response(self) -> 'DefaultCardResponse':
-        if self.data:
-            for card_instance in self.data:
-                process_image_urls(card_instance)
-        return self
+    next_cursor: Optional[str] = None #下一页的游标，没有更多数据时为空
+    previews: Optional[dict[int, "ReplyPreview"]] = None #expand 时返回，键为卡片编号
 
 #请求话题的卡片
+#传入 cursor 时按游标翻页，忽略 skip；limit 会被限制在 CARD_PAGE_SIZE_MAX 以内
 class CardRequest(BaseModel):
     skip: int = 0
     category: str
+    cursor: Optional[str] = None
+    limit: int = Field(default=5, ge=1)
+    expand: bool = False #为 true 时同时返回每张卡片的回复数和回复预览
+    preview_size: int = Field(default=3, ge=0)
+    preview_order: Literal["thumbs", "latest"] = "thumbs" #回复预览按点赞数或按最新排序
 #请求最新的一个卡片
 class CardRequest_New(BaseModel):
     category: str
 
+#下拉刷新：请求某个分类中比客户端已有的最新卡片更新的卡片，按从旧到新返回
+#since_number 为客户端已有的最大卡片编号，也可以用 since_time（不带时区时按 CARD_TIME_ZONE）
+class CardSinceRequest(BaseModel):
+    category: str
+    since_number: Optional[int] = None
+    since_time: Optional[datetime] = None
+    limit: int = Field(default=50, ge=1)
+
+#增量同步的响应，has_more 为 true 时用最后一条继续请求
+#data 开头可能有客户端位置之前不久发布的卡片（补发晚提交的卡片），客户端按编号去重
+class CardSinceResponse(SQLModel):
+    data: list[DefaultCard]
+    has_more: bool = False
+
 #请求回复卡片的内容
 class ReplyCardRequest(BaseModel):
     number: int
     skip: int = 0
+    cursor: Optional[str] = None
+    limit: int = Field(default=5, ge=1)
+#收藏列表按收藏时间倒序，cursor 为 (created_at, card_number)
 class CardFavoriteRequest(BaseModel):
     skip: int = 0
+    cursor: Optional[str] = None
+    limit: int = Field(default=5, ge=1)
 #添加的卡片，客户端发送的卡片
 class AddCard(BaseModel):
     id: str
     content: str
-    time: str
+    time: Optional[str] = None #已不再使用，发布时间由服务端生成
     category: str
     imageUrls: Optional[List[ImagePathInfo]] = Field(default=None)
 
@@ -188,32 +253,67 @@ class AddReplyCard_Client(BaseModel):
     number: int
     id: str
     content: str
-    time: str
+    time: Optional[str] = None #已不再使用，发布时间由服务端生成
     reply: str|None=None #回复内容,可以为空
     imageUrls: Optional[List[ImagePathInfo]] = Field(default=None)
 
 #添加回复卡片,数据库存储
 class AddReplyCard(SQLModel,table=True):
     number_primary: uuid.UUID = Field(primary_key=True,default_factory=uuid.uuid4)#主键,默认生成一个uuid
-    number: int = Field(foreign_key="defaultcard.number", nullable=False)
-    #通过外键和DefaultCard关联
+    #对应 DefaultCard.number；分区表的外键必须包含分区键，这里不再建外键约束
+    number: int = Field(nullable=False)
     id: str
     content: str
-    time: str
+    #表按 time 按月分区，主键为 (number_primary, time)
+    time: Optional[datetime] = Field(
+        default=None,
+        primary_key=True,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
     reply: str|None=None #回复内容,可以为空
     thumbs: int
-    imageUrls: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    imageUrls: Optional[List[str]] = Field(default=None, sa_column=Column(StringArray()))
+
+    @field_serializer("time", when_used="json")
+    def serialize_time(self, value: Optional[datetime], info: SerializationInfo) -> Optional[str]:
+        return serialize_card_time(value, info)
+    __table_args__ = (
+        # 回复列表按 (time, number_primary) 游标分页
+        Index("ix_addreplycard_number_time", "number", "time", "number_primary"),
+        Index("ix_addreplycard_id_time", "id", "time", "number", "number_primary"),
+        Index(
+            "ix_addreplycard_content_trgm", "content",
+            postgresql_using="gin", postgresql_ops={"content": "gin_trgm_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
+
+#卡片的回复预览
+class ReplyPreview(SQLModel):
+    reply_count: int = 0
+    replies: list[AddReplyCard] = []
+
+DefaultCardResponse.model_rebuild()
 
 #添加回复卡片的响应
 class AddReplyCardResponse(SQLModel):
     data: list[AddReplyCard]
+    next_cursor: Optional[str] = None
 
-    @model_validator(mode='after')
-    def process_reply_card_image_urls_in_response(self) -> 'AddReplyCardResponse':
-        if self.data:
-            for card_instance in self.data:
-                process_image_urls(card_instance)
-        return self
+#下拉刷新：请求某张卡片在 since_time 之后的新回复
+#since_cursor 为上一次同步返回的 next_since，比 since_time 精确，优先使用
+class ReplySinceRequest(BaseModel):
+    number: int
+    since_time: Optional[datetime] = None
+    since_cursor: Optional[str] = None
+    limit: int = Field(default=50, ge=1)
+
+class ReplySinceResponse(SQLModel):
+    data: list[AddReplyCard]
+    has_more: bool = False
+    next_since: Optional[str] = None #下次同步时作为 since_cursor 传回
 
 class Cookie(SQLModel,table=True):
     name: str = Field(primary_key=True)
@@ -233,8 +333,9 @@ class CookieUse(SQLModel):
 class GetUserCookieNum(SQLModel):
     number: int
 class ReplyLike(SQLModel, table=True):
+    # 主键为 (reply_id, user_id)：同一条内容可以被多个用户点赞
     reply_id: str=Field(primary_key=True)
-    user_id: uuid.UUID
+    user_id: uuid.UUID = Field(primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     __table_args__ = (
         # 防止重复点赞
@@ -244,16 +345,49 @@ class LikeRequest(BaseModel):
     reply_id: str
     action: Literal["like", "unlike"]
 class CardFavorite(SQLModel, table=True):
+    # 主键为 (card_number, user_id)：同一张卡片可以被多个用户收藏
     card_number:int=Field(primary_key=True)
-    user_id: uuid.UUID
+    user_id: uuid.UUID = Field(primary_key=True)
+    # 带时区的 UTC 时间，收藏列表按它翻页
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
 
     __table_args__ = (
         # 防止重复收藏
         UniqueConstraint("card_number", "user_id"),
+        # 收藏列表按收藏时间倒序翻页
+        Index("ix_cardfavorite_user_id_created_at", "user_id", "created_at"),
     )
 class FavoriteRequest(BaseModel):
     card_number: int
     action: Literal["favorite", "unfavorite"]
+#批量查询当前用户对一页内容的点赞/收藏状态
+class ViewerStateRequest(BaseModel):
+    reply_ids: List[str] = Field(default=[], max_length=200) #回复的 number_primary 或话题卡片编号
+    card_numbers: List[int] = Field(default=[], max_length=200)
+class ViewerStateResponse(BaseModel):
+    liked: dict[str, bool]
+    favorited: dict[int, bool]
+
+#搜索卡片内容的请求
+#scope 为 card 时搜索话题，为 reply 时搜索回复；category 只搜索该分类下的话题（或其回复）
+#order 为 relevance 时按匹配程度排序，为 time 时按发布时间倒序
+class CardSearchRequest(BaseModel):
+    q: str = Field(max_length=100)
+    scope: Literal["card", "reply"] = "card"
+    category: Optional[str] = None
+    order: Literal["relevance", "time"] = "relevance"
+    cursor: Optional[str] = None
+    limit: int = Field(default=10, ge=1)
+
+#搜索结果，按 scope 只会填充其中一个列表
+class CardSearchResponse(SQLModel):
+    cards: list[DefaultCard] = []
+    replies: list[AddReplyCard] = []
+    next_cursor: Optional[str] = None
 # 上传图片的数据结构
 
 class ImageDataLinks(BaseModel):
@@ -306,20 +440,18 @@ class UserResetPassword(SQLModel):
 class UserFindCardRequest(BaseModel):
     Cookie:str #cookie ID
     skip:int=0
+    cursor: Optional[str] = None
+    limit: int = Field(default=5, ge=1)
+
+# 用户动态时间线中的一项，指向 DefaultCard 或 AddReplyCard 列表中的卡片
+class UserActivityItem(BaseModel):
+    kind: Literal["card", "reply"]
+    number: int #话题编号，回复为所回复的话题编号
+    number_primary: Optional[uuid.UUID] = None #回复的主键，话题为空
 
 # 用户寻找自己发布的回复卡片的响应
 class UserFindCardResponse(SQLModel):
     DefaultCard: List[DefaultCard]
     AddReplyCard: List[AddReplyCard]
-
-    @model_validator(mode='after')
-    def process_reply_card_image_urls_in_response(self) -> 'UserFindCardResponse':
-        # 处理 AddReplyCard
-        if self.AddReplyCard:
-            for card_instance in self.AddReplyCard:
-                process_image_urls(card_instance)
-        # 处理 DefaultCard
-        if self.DefaultCard:
-            for card_instance in self.DefaultCard:
-                process_image_urls(card_instance)
-        return self
+    timeline: List[UserActivityItem] = [] #话题和回复按时间倒序合并后的顺序
+    next_cursor: Optional[str] = None
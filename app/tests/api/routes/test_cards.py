@@ -0,0 +1,431 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.tests.utils.card import CardSeeder
+from app.tests.utils.utils import random_lower_string
+from app.utils import decode_cursor, encode_cursor, format_card_time, parse_cursor_time
+
+
+def test_cursor_round_trip() -> None:
+    cursor = encode_cursor("2024-05-01 12:00:00", 42)
+    assert decode_cursor(cursor, 2) == ["2024-05-01 12:00:00", 42]
+    assert decode_cursor(cursor, 3) is None
+    assert decode_cursor("not-a-cursor", 2) is None
+
+
+def test_get_card_returns_next_cursor(client: TestClient, seed: CardSeeder) -> None:
+    numbers = seed.cards([0, 1, 2, 3, 4])
+    url = f"{settings.API_V1_STR}/cards/getcard"
+    response = client.post(url, json={"category": seed.category, "limit": 3})
+    assert response.status_code == 200
+    first = response.json()
+    assert [card["number"] for card in first["data"]] == [numbers[4], numbers[3], numbers[2]]
+    assert first["next_cursor"] is not None
+
+    response = client.post(url, json={"category": seed.category, "limit": 3, "cursor": first["next_cursor"]})
+    assert response.status_code == 200
+    second = response.json()
+    # 第二页从上一页最后一张之后接着往下，不重复也不遗漏，最后一页没有游标
+    assert [card["number"] for card in second["data"]] == [numbers[1], numbers[0]]
+    assert second["next_cursor"] is None
+
+
+def test_get_card_cursor_pages_equal_times(client: TestClient, seed: CardSeeder) -> None:
+    # 比一页多的卡片，发布时间完全相同，只能靠编号区分先后
+    numbers = seed.cards([0] * (settings.CARD_PAGE_SIZE_MAX + 2))
+    seen: list[int] = []
+    body: dict = {"category": seed.category, "limit": settings.CARD_PAGE_SIZE_MAX}
+    for _ in range(len(numbers)):
+        response = client.post(f"{settings.API_V1_STR}/cards/getcard", json=body)
+        assert response.status_code == 200
+        content = response.json()
+        seen.extend(card["number"] for card in content["data"])
+        if content["next_cursor"] is None:
+            break
+        body["cursor"] = content["next_cursor"]
+    # 时间相同的卡片按编号倒序，翻页既不重复也不遗漏
+    assert seen == sorted(numbers, reverse=True)
+
+
+def test_get_card_timeline_page_then_cursor_equal_times(client: TestClient, seed: CardSeeder) -> None:
+    # 第一页来自 Redis 时间线，游标页来自数据库；编号跨过位数变化时两者的顺序也要一致
+    boundary = 10 ** random.randint(10, 17)
+    numbers = seed.cards([0] * 4, numbers=[boundary - 2, boundary - 1, boundary, boundary + 1])
+    url = f"{settings.API_V1_STR}/cards/getcard"
+    response = client.post(url, json={"category": seed.category, "limit": 2})
+    assert response.status_code == 200
+    first = response.json()
+    response = client.post(url, json={"category": seed.category, "limit": 2, "cursor": first["next_cursor"]})
+    assert response.status_code == 200
+    second = response.json()
+    seen = [card["number"] for card in first["data"] + second["data"]]
+    assert seen == sorted(numbers, reverse=True)
+
+
+def test_get_card_invalid_cursor(client: TestClient) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/cards/getcard",
+        json={"category": "time", "cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+
+
+def test_viewer_state(
+    client: TestClient, normal_user_token_headers: dict[str, str], seed: CardSeeder
+) -> None:
+    liked, favorited = seed.cards([0, 1])
+    (reply,) = seed.replies(liked, [2])
+    url = f"{settings.API_V1_STR}/cards/viewer-state"
+    body = {"reply_ids": [reply, str(liked)], "card_numbers": [liked, favorited]}
+
+    def viewer_state() -> tuple[dict, dict]:
+        response = client.post(url, headers=normal_user_token_headers, json=body)
+        assert response.status_code == 200
+        content = response.json()
+        return content["liked"], content["favorited"]
+
+    assert viewer_state() == (
+        {reply: False, str(liked): False},
+        {str(liked): False, str(favorited): False},
+    )
+
+    like_url = f"{settings.API_V1_STR}/cards/like"
+    favorite_url = f"{settings.API_V1_STR}/cards/favorite"
+    for reply_id in (reply, str(liked)):
+        response = client.post(like_url, headers=normal_user_token_headers, json={"reply_id": reply_id, "action": "like"})
+        assert response.status_code == 200
+    response = client.post(
+        favorite_url, headers=normal_user_token_headers, json={"card_number": favorited, "action": "favorite"}
+    )
+    assert response.status_code == 200
+    assert viewer_state() == (
+        {reply: True, str(liked): True},
+        {str(liked): False, str(favorited): True},
+    )
+
+    response = client.post(like_url, headers=normal_user_token_headers, json={"reply_id": reply, "action": "unlike"})
+    assert response.status_code == 200
+    response = client.post(
+        favorite_url, headers=normal_user_token_headers, json={"card_number": favorited, "action": "unfavorite"}
+    )
+    assert response.status_code == 200
+    assert viewer_state() == (
+        {reply: False, str(liked): True},
+        {str(liked): False, str(favorited): False},
+    )
+    client.post(like_url, headers=normal_user_token_headers, json={"reply_id": str(liked), "action": "unlike"})
+
+
+def test_get_favorite_cards_pages(
+    client: TestClient, normal_user_token_headers: dict[str, str], seed: CardSeeder
+) -> None:
+    numbers = seed.cards([0, 1, 2])
+    favorite_url = f"{settings.API_V1_STR}/cards/favorite"
+    for number in (numbers[0], numbers[2], numbers[1]):
+        response = client.post(
+            favorite_url, headers=normal_user_token_headers, json={"card_number": number, "action": "favorite"}
+        )
+        assert response.status_code == 200
+    try:
+        url = f"{settings.API_V1_STR}/cards/getfavoritecard"
+        response = client.post(url, headers=normal_user_token_headers, json={"limit": 2})
+        assert response.status_code == 200
+        first = response.json()
+        # 按收藏时间倒序
+        assert [card["number"] for card in first["data"]] == [numbers[1], numbers[2]]
+        created_at, _ = decode_cursor(first["next_cursor"], 2)
+        assert datetime.fromisoformat(created_at).utcoffset() == timedelta(0)
+
+        response = client.post(
+            url, headers=normal_user_token_headers, json={"limit": 2, "cursor": first["next_cursor"]}
+        )
+        assert response.status_code == 200
+        assert [card["number"] for card in response.json()["data"]] == [numbers[0]]
+    finally:
+        for number in numbers:
+            client.post(
+                favorite_url, headers=normal_user_token_headers, json={"card_number": number, "action": "unfavorite"}
+            )
+
+
+def test_get_user_cards_timeline(client: TestClient) -> None:
+    response = client.post(
+        f"{settings.API_V1_STR}/cards/get-user-cards",
+        json={"Cookie": "no-such-cookie", "limit": 5},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["timeline"] == []
+    assert content["DefaultCard"] == []
+    assert content["AddReplyCard"] == []
+    assert content["next_cursor"] is None
+
+
+def test_get_user_cards_timeline_pages(client: TestClient, seed: CardSeeder) -> None:
+    # 同一个用户的话题和回复交替发布
+    cookie = random_lower_string()
+    numbers = seed.cards([0, 2, 4], cookie=cookie)
+    replies = seed.replies(numbers[0], [1, 3, 5], cookie=cookie)
+    url = f"{settings.API_V1_STR}/cards/get-user-cards"
+    response = client.post(url, json={"Cookie": cookie, "limit": 4})
+    assert response.status_code == 200
+    first = response.json()
+    assert len(first["timeline"]) == 4
+    assert len(first["DefaultCard"]) + len(first["AddReplyCard"]) == 4
+    # 游标为 [time, kind, number, number_primary]，在页边界处接着往下翻
+    (position,) = decode_cursor(first["next_cursor"], 1)
+    assert len(position) == 4
+    assert position[1] == "card"
+
+    response = client.post(url, json={"Cookie": cookie, "limit": 4, "cursor": first["next_cursor"]})
+    assert response.status_code == 200
+    second = response.json()
+    assert second["next_cursor"] is None
+
+    timeline = [
+        (item["kind"], str(item["number_primary"] if item["kind"] == "reply" else item["number"]))
+        for item in first["timeline"] + second["timeline"]
+    ]
+    assert timeline == [
+        ("reply", replies[2]),
+        ("card", str(numbers[2])),
+        ("reply", replies[1]),
+        ("card", str(numbers[1])),
+        ("reply", replies[0]),
+        ("card", str(numbers[0])),
+    ]
+    # 个人主页的话题带上数据库中的回复数和收藏数
+    cards = {card["number"]: card for card in first["DefaultCard"] + second["DefaultCard"]}
+    assert all(card["favorite_count"] == 0 for card in cards.values())
+    assert [card["reply_count"] for _, card in sorted(cards.items())] == [3, 0, 0]
+
+
+def test_get_card_expand_previews(client: TestClient, seed: CardSeeder) -> None:
+    # 一张有三条回复的卡片和一张没有回复的卡片
+    busy, quiet = seed.cards([0, 10])
+    replies = seed.replies(busy, [1, 2, 3])
+    response = client.post(
+        f"{settings.API_V1_STR}/cards/getcard",
+        json={"category": seed.category, "expand": True, "preview_size": 2, "preview_order": "latest"},
+    )
+    assert response.status_code == 200
+    content = response.json()
+    assert [card["number"] for card in content["data"]] == [quiet, busy]
+    assert set(content["previews"]) == {str(busy), str(quiet)}
+
+    preview = content["previews"][str(busy)]
+    assert preview["reply_count"] == 3
+    # 只带最新的两条回复
+    assert [reply["number_primary"] for reply in preview["replies"]] == [replies[2], replies[1]]
+
+    preview = content["previews"][str(quiet)]
+    assert preview["reply_count"] == 0
+    assert preview["replies"] == []
+
+
+def test_search_cards(client: TestClient, seed: CardSeeder) -> None:
+    # 两张卡片和一条回复包含同一个关键词，另有一张卡片不包含
+    keyword = random_lower_string()[:10]
+    matched = seed.cards([0, 1], content=f"测试内容 {keyword} 结尾")
+    seed.cards([2])
+    replies = seed.replies(matched[0], [3], content=f"回复{keyword}")
+    url = f"{settings.API_V1_STR}/cards/search"
+    response = client.post(url, json={"q": keyword, "scope": "card", "order": "time"})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["replies"] == []
+    # 按发布时间倒序，只返回包含关键词的卡片
+    assert [card["number"] for card in content["cards"]] == [matched[1], matched[0]]
+
+    response = client.post(url, json={"q": keyword.upper(), "scope": "reply", "limit": 1})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["cards"] == []
+    assert [reply["number_primary"] for reply in content["replies"]] == replies
+
+
+def test_search_cards_query_too_short(client: TestClient) -> None:
+    response = client.post(f"{settings.API_V1_STR}/cards/search", json={"q": "测"})
+    assert response.status_code == 400
+
+
+def test_get_trending(
+    client: TestClient, normal_user_token_headers: dict[str, str], seed: CardSeeder
+) -> None:
+    oldest, liked, replied, newest = seed.cards([0, 1, 2, 3])
+    url = f"{settings.API_V1_STR}/cards/trending"
+    params = {"category": seed.category, "limit": 3}
+
+    def ranking() -> list[int]:
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        return [card["number"] for card in response.json()["data"]]
+
+    # 还没有点赞和回复：热度榜从数据库重建，分数只随发布时间衰减，越新越靠前
+    assert ranking() == [newest, replied, liked]
+
+    like_url = f"{settings.API_V1_STR}/cards/like"
+    response = client.post(like_url, headers=normal_user_token_headers, json={"reply_id": str(liked), "action": "like"})
+    assert response.status_code == 200
+    response = client.post(
+        f"{settings.API_V1_STR}/cards/addreplycard",
+        headers=normal_user_token_headers,
+        json={"number": replied, "id": "cookie", "content": random_lower_string()},
+    )
+    assert response.status_code == 200
+    # 回复的权重高于点赞，两者都高于新发布
+    assert ranking() == [replied, liked, newest]
+    client.post(like_url, headers=normal_user_token_headers, json={"reply_id": str(liked), "action": "unlike"})
+    # 只取前 3 名，最早发布的卡片不在榜上
+    assert ranking() == [replied, newest, liked]
+
+
+def test_stress_test_cards_stream_merges_pending_likes(client: TestClient, seed: CardSeeder) -> None:
+    (number,) = seed.cards([0], category="time")
+    seed.like(number, 2)
+    url = f"{settings.API_V1_STR}/cards/stress-test-cards"
+    response = client.get(url, params={"stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    streamed = {card["number"]: card for card in map(json.loads, response.text.splitlines())}
+    # 流式输出和 JSON 列表一样带上尚未写回的点赞
+    assert streamed[number]["thumbs"] == 2
+
+    response = client.get(url)
+    assert response.status_code == 200
+    listed = {card["number"]: card for card in response.json()["data"]}
+    assert listed[number] == streamed[number]
+
+
+def test_card_time_format() -> None:
+    value = datetime(2024, 5, 1, 4, 0, 0, 123456, tzinfo=timezone.utc)
+    assert format_card_time(value) == "2024-05-01 12:00:00"  # Asia/Shanghai
+    cursor = encode_cursor(value, 42)
+    time, number = decode_cursor(cursor, 2)
+    assert parse_cursor_time(time) == value
+    assert number == 42
+
+
+def test_get_card_since(client: TestClient, seed: CardSeeder) -> None:
+    # 三张相隔一秒发布的卡片，都在补发窗口之内
+    numbers = seed.cards([0, 1, 2])
+    category = seed.category
+    url = f"{settings.API_V1_STR}/cards/getcard-since"
+    response = client.post(url, json={"category": category, "since_number": numbers[0], "limit": 1})
+    assert response.status_code == 200
+    content = response.json()
+    assert [card["number"] for card in content["data"]] == [numbers[1]]
+    assert content["has_more"] is True
+
+    # 客户端已有最新的卡片：之前不久发布的卡片作为补发返回，由客户端按编号去重
+    response = client.post(url, json={"category": category, "since_number": numbers[2]})
+    assert response.status_code == 200
+    content = response.json()
+    assert [card["number"] for card in content["data"]] == numbers[:2]
+    assert content["has_more"] is False
+
+    since_time = seed.at(1).isoformat()
+    response = client.post(url, json={"category": category, "since_time": since_time})
+    assert response.status_code == 200
+    content = response.json()
+    assert [card["number"] for card in content["data"]] == numbers
+    assert content["has_more"] is False
+
+    response = client.post(url, json={"category": category})
+    assert response.status_code == 400
+
+
+def test_get_card_etag_not_modified(client: TestClient, seed: CardSeeder) -> None:
+    numbers = seed.cards([0, 1, 2, 3])
+    url = f"{settings.API_V1_STR}/cards/getcard"
+    params = {"category": seed.category, "limit": 3}
+    response = client.get(url, params=params)
+    assert response.status_code == 200
+    assert [card["number"] for card in response.json()["data"]] == numbers[:0:-1]
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    response = client.get(url, params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # 不同形状的响应（带回复预览）有不同的 ETag
+    response = client.get(url, params={**params, "expand": True}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_post_get_card_ignores_if_none_match(client: TestClient, seed: CardSeeder) -> None:
+    numbers = seed.cards([0, 1])
+    url = f"{settings.API_V1_STR}/cards/getcard"
+    body = {"category": seed.category, "limit": 3}
+    response = client.post(url, json=body)
+    assert response.status_code == 200
+    response = client.post(url, json=body, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 200
+    assert [card["number"] for card in response.json()["data"]] == numbers[::-1]
+
+
+def test_get_card_query_cache_headers(client: TestClient, seed: CardSeeder) -> None:
+    numbers = seed.cards([0, 1])
+    response = client.get(
+        f"{settings.API_V1_STR}/cards/getcard", params={"category": seed.category, "limit": 3}
+    )
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("public")
+    assert response.headers["vary"] == "Accept-Encoding, Authorization"
+    assert [card["number"] for card in response.json()["data"]] == numbers[::-1]
+
+
+def test_get_card_query_not_cached_after_write(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    seed: CardSeeder,
+) -> None:
+    numbers = seed.cards([0, 1])
+    url = f"{settings.API_V1_STR}/cards/getcard"
+    params = {"category": seed.category, "limit": 3}
+    response = client.get(url, params=params, headers=normal_user_token_headers)
+    assert response.status_code == 200
+    # 登录用户的页面不进代理缓存
+    assert response.headers["cache-control"].startswith("private")
+
+    favorite = {"card_number": numbers[0], "action": "favorite"}
+    response = client.post(f"{settings.API_V1_STR}/cards/favorite", headers=normal_user_token_headers, json=favorite)
+    assert response.status_code == 200
+    # 刚写入过的用户不能读到任何缓存的旧页面
+    response = client.get(url, params=params, headers=normal_user_token_headers)
+    assert response.headers["cache-control"] == "private, no-store"
+
+    favorite["action"] = "unfavorite"
+    client.post(f"{settings.API_V1_STR}/cards/favorite", headers=normal_user_token_headers, json=favorite)
+
+
+def test_get_card_includes_counts(
+    client: TestClient, normal_user_token_headers: dict[str, str], seed: CardSeeder
+) -> None:
+    quiet, busy = seed.cards([0, 1])
+    seed.replies(busy, [2, 3])
+    favorite_url = f"{settings.API_V1_STR}/cards/favorite"
+    response = client.post(
+        favorite_url, headers=normal_user_token_headers, json={"card_number": busy, "action": "favorite"}
+    )
+    assert response.status_code == 200
+
+    def counts(card: dict) -> tuple[int, int, int]:
+        return card["number"], card["reply_count"], card["favorite_count"]
+
+    response = client.get(f"{settings.API_V1_STR}/cards/getcard", params={"category": seed.category, "limit": 3})
+    assert response.status_code == 200
+    assert [counts(card) for card in response.json()["data"]] == [(busy, 2, 1), (quiet, 0, 0)]
+
+    for number, expected in ((busy, (busy, 2, 1)), (quiet, (quiet, 0, 0))):
+        response = client.get(f"{settings.API_V1_STR}/cards/getonecard/{number}")
+        assert response.status_code == 200
+        assert [counts(card) for card in response.json()["data"]] == [expected]
+
+    client.post(favorite_url, headers=normal_user_token_headers, json={"card_number": busy, "action": "unfavorite"})
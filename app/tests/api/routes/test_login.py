@@ -1,13 +1,17 @@
+import threading
+import time
 from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 
+from app.core import security, user_cache
 from app.core.config import settings
 from app.core.security import verify_password
 from app.crud import create_user
 from app.models import UserCreate
-from app.tests.utils.user import user_authentication_headers
+from app.tests.utils.user import create_user_through_api, user_authentication_headers
 from app.tests.utils.utils import random_email, random_lower_string
 from app.utils import generate_password_reset_token
 
@@ -116,3 +120,43 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_get_access_token_when_password_hasher_busy(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    workers = settings.PASSWORD_HASH_WORKERS
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", workers)
+    login_data = {
+        "username": settings.FIRST_SUPERUSER,
+        "password": settings.FIRST_SUPERUSER_PASSWORD,
+    }
+    release = threading.Event()
+    # 在应用的事件循环上占满密码哈希线程池
+    blocked = [client.portal.start_task_soon(security._run_hasher, release.wait) for _ in range(workers)]
+    try:
+        deadline = time.monotonic() + 5
+        while security.password_hasher_metrics()["pending"] < workers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert security.password_hasher_metrics()["pending"] == workers
+
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+        assert r.status_code == 503
+        assert r.headers["retry-after"] == "1"
+        assert r.json() == {"detail": "服务繁忙，请稍后再试"}
+    finally:
+        release.set()
+    assert [future.result(timeout=5) for future in blocked] == [True] * workers
+
+    r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+    assert r.status_code == 200
+
+
+def test_reset_password_invalidates_user_cache(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    user_id, email, _ = create_user_through_api(client=client, superuser_token_headers=superuser_token_headers)
+    data = {"new_password": random_lower_string(), "token": generate_password_reset_token(email=email)}
+    with patch.object(user_cache, "invalidate_user", wraps=user_cache.invalidate_user) as spy:
+        r = client.post(f"{settings.API_V1_STR}/reset-password/", json=data)
+        assert r.status_code == 200
+    spy.assert_awaited_once()
+    assert str(spy.await_args.args[1]) == user_id
@@ -1,13 +1,15 @@
 import uuid
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
 from app import crud
+from app.core import user_cache
 from app.core.config import settings
 from app.core.security import verify_password
 from app.models import User, UserCreate
+from app.tests.utils.user import create_user_through_api, user_authentication_headers
 from app.tests.utils.utils import random_email, random_lower_string
 
 
@@ -484,3 +486,70 @@ def test_delete_user_without_privileges(
     )
     assert r.status_code == 403
     assert r.json()["detail"] == "The user doesn't have enough privileges"
+
+
+def _assert_invalidated(spy: AsyncMock, user_id: str) -> None:
+    # 每次修改只删除被修改用户的缓存，且只删除一次
+    spy.assert_awaited_once()
+    assert str(spy.await_args.args[1]) == user_id
+    spy.reset_mock()
+
+
+def test_own_account_changes_invalidate_user_cache(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    user_id, email, password = create_user_through_api(
+        client=client, superuser_token_headers=superuser_token_headers
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    with patch.object(user_cache, "invalidate_user", wraps=user_cache.invalidate_user) as spy:
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me", headers=headers, json={"full_name": "Updated Name"}
+        )
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
+
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me/password",
+            headers=headers,
+            json={"current_password": password, "new_password": random_lower_string()},
+        )
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
+
+        r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
+
+
+def test_superuser_changes_invalidate_user_cache(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    user_id, _, _ = create_user_through_api(client=client, superuser_token_headers=superuser_token_headers)
+    with patch.object(user_cache, "invalidate_user", wraps=user_cache.invalidate_user) as spy:
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/{user_id}",
+            headers=superuser_token_headers,
+            json={"full_name": "Updated_full_name"},
+        )
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
+
+        r = client.delete(f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers)
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
+
+
+def test_reset_password_with_verify_code_invalidates_user_cache(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    user_id, email, _ = create_user_through_api(client=client, superuser_token_headers=superuser_token_headers)
+    redis = client.app.state.redis
+    client.portal.call(redis.set, f"reset_password_verify_code:{email}", "123456")
+    with patch.object(user_cache, "invalidate_user", wraps=user_cache.invalidate_user) as spy:
+        r = client.post(
+            f"{settings.API_V1_STR}/users/reset_password",
+            json={"email": email, "verify_code": "123456", "password": random_lower_string()},
+        )
+        assert r.status_code == 200
+        _assert_invalidated(spy, user_id)
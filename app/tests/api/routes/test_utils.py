@@ -0,0 +1,16 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_metrics_include_redis_pool(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(f"{settings.API_V1_STR}/utils/metrics/", headers=superuser_token_headers)
+    assert response.status_code == 200
+    pool = response.json()["redis_pool"]
+    assert pool["max_connections"] == settings.REDIS_MAX_CONNECTIONS
+    assert pool["created"] == pool["in_use"] + pool["available"]
+    assert pool["created"] <= pool["max_connections"]
+    # 认证用户时已经用过 Redis，至少建立过一个连接
+    assert pool["created"] >= 1
@@ -8,6 +8,7 @@ from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
 from app.models import Item, User
+from app.tests.utils.card import CardSeeder
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -40,3 +41,11 @@ def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]
     return authentication_token_from_email(
         client=client, email=settings.EMAIL_TEST_USER, db=db
     )
+
+
+@pytest.fixture
+def seed(client: TestClient) -> Generator[CardSeeder, None, None]:
+    # 每个测试在独立的分类下插入自己的卡片和回复，结束时删除
+    seeder = CardSeeder(client)
+    yield seeder
+    seeder.cleanup()
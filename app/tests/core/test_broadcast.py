@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+
+from app.core import broadcast
+from app.models import DefaultCard
+from app.tests.utils.card import random_category
+
+
+def _card(number: int, category: str) -> DefaultCard:
+    return DefaultCard(
+        number=number, id="cookie", content=f"card {number}", category=category, thumbs=0,
+        time=datetime.now(timezone.utc),
+    )
+
+
+async def _receive(redis: aioredis.Redis, card: DefaultCard, other: str) -> tuple[tuple[int, str], bool]:
+    """
+    通过应用的订阅任务接收发布的卡片，返回收到的消息以及另一个分类的连接是否也收到了
+    应用刚启动时订阅可能还没建立，收不到就重新发布
+    """
+    async with broadcast.listen(card.category) as queue, broadcast.listen(other) as other_queue:
+        for _ in range(50):
+            await broadcast.publish_card(redis, card)
+            try:
+                received = await asyncio.wait_for(queue.get(), timeout=0.1)
+            except asyncio.TimeoutError:
+                continue
+            return received, not other_queue.empty()
+    raise AssertionError("订阅任务没有转发发布的卡片")
+
+
+def test_listen_registers_queue_per_connection() -> None:
+    category = random_category()
+
+    async def run() -> None:
+        async with broadcast.listen(category) as first, broadcast.listen(category) as second:
+            assert broadcast._listeners[category] == {first, second}
+        # 最后一个连接退出后不再保留这个分类
+        assert category not in broadcast._listeners
+
+    asyncio.run(run())
+
+
+def test_dispatch_drops_oldest_when_queue_is_full(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(broadcast.settings, "CARD_STREAM_QUEUE_SIZE", 2)
+    category, other = random_category(), random_category()
+
+    async def run() -> None:
+        async with broadcast.listen(category) as queue, broadcast.listen(other) as other_queue:
+            for number in (1, 2, 3):
+                broadcast._dispatch(category, number, f"card {number}")
+            # 读得慢的连接丢掉最旧的一条，其他分类的连接不受影响
+            assert [queue.get_nowait() for _ in range(queue.qsize())] == [(2, "card 2"), (3, "card 3")]
+            assert other_queue.empty()
+
+    asyncio.run(run())
+
+
+def test_subscriber_forwards_published_cards(client: TestClient) -> None:
+    card = _card(42, random_category())
+    received, leaked = client.portal.call(_receive, client.app.state.redis, card, random_category())
+    assert received == (42, card.model_dump_json())
+    assert not leaked
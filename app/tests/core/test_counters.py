@@ -0,0 +1,168 @@
+import asyncio
+import uuid
+from collections.abc import Generator
+from datetime import datetime, timedelta
+
+import pytest
+import redis.asyncio as aioredis
+from sqlalchemy import func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import counters
+from app.core.db import engine
+from app.models import DefaultCard
+from app.tests.utils.card import CardSeeder
+
+
+async def _acquire_flush_lock(redis: aioredis.Redis) -> None:
+    while not await redis.set(counters.LIKE_FLUSH_LOCK_KEY, 1, nx=True, ex=counters.LIKE_FLUSH_LOCK_SECONDS):
+        await asyncio.sleep(0.05)
+
+
+async def _release_flush_lock(redis: aioredis.Redis) -> None:
+    await redis.delete(counters.LIKE_FLUSH_LOCK_KEY)
+
+
+@pytest.fixture
+def flush_lock(seed: CardSeeder) -> Generator[None, None, None]:
+    # 测试期间占住写回锁，应用的后台写回任务不会处理测试的增量
+    seed.redis_call(_acquire_flush_lock)
+    yield
+    seed.redis_call(_release_flush_lock)
+
+
+async def _thumbs(redis: aioredis.Redis, number: int) -> tuple[int, int]:
+    """(数据库中的 thumbs, Redis 中尚未写回的增量)"""
+    async with AsyncSession(engine) as session:
+        result = await session.execute(select(DefaultCard.thumbs).where(DefaultCard.number == number))
+        thumbs = result.scalar_one()
+    (pending,) = await counters.pending_deltas(redis, [("card", number)])
+    return thumbs, pending
+
+
+async def _take(redis: aioredis.Redis, member: str) -> str:
+    """像 _flush_batch 一样把增量移进批次，批次的时间记为 0，恢复时视为已过期"""
+    batch_key = counters.LIKE_BATCH_KEY.format(batch=uuid.uuid4().hex)
+    kind, key = member.split(":", 1)
+    delta_key = counters.LIKE_DELTA_KEY.format(kind=kind, key=key)
+    await redis.eval(
+        counters._TAKE_SCRIPT, 4, counters.LIKE_DIRTY_KEY, batch_key, counters.LIKE_BATCHES_KEY, delta_key, 0, member
+    )
+    return batch_key
+
+
+async def _crash_after_commit(redis: aioredis.Redis, member: str, amount: int) -> str:
+    batch_key = await _take(redis, member)
+    await counters._write_batch(redis, batch_key, {member: amount})
+    return batch_key
+
+
+async def _crash_after_rollback(redis: aioredis.Redis, member: str) -> str:
+    batch_key = await _take(redis, member)
+    async with AsyncSession(engine) as session:
+        xid = (await session.execute(select(func.txid_current()))).scalar_one()
+        await redis.hset(batch_key, "_xid", xid)
+        await session.rollback()
+    return batch_key
+
+
+async def _batch_exists(redis: aioredis.Redis, batch_key: str) -> bool:
+    return bool(await redis.exists(batch_key)) or bool(await redis.sismember(counters.LIKE_BATCHES_KEY, batch_key))
+
+
+async def _like_without_redis(number: int) -> None:
+    # 连不上的 Redis：record_like 直接更新数据库
+    redis = aioredis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=1)
+    try:
+        async with AsyncSession(engine) as session:
+            await counters.record_like(redis, session, "card", number, 1)
+    finally:
+        await redis.close()
+
+
+async def _corrupt_counts(number: int) -> None:
+    async with AsyncSession(engine) as session:
+        await session.execute(
+            update(DefaultCard).where(DefaultCard.number == number).values(reply_count=7, favorite_count=5)
+        )
+        await session.commit()
+
+
+async def _reconcile(since: datetime, number: int) -> tuple[bool, int, int]:
+    async with AsyncSession(engine) as session:
+        numbers = await counters.reconcile_card_counts(session, since)
+        result = await session.execute(
+            select(DefaultCard.reply_count, DefaultCard.favorite_count).where(DefaultCard.number == number)
+        )
+        reply_count, favorite_count = result.one()
+    return number in numbers, reply_count, favorite_count
+
+
+@pytest.mark.usefixtures("flush_lock")
+def test_record_like_accumulates_in_redis(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.like(number)
+    seed.like(number)
+    seed.like(number, -1)
+    assert seed.redis_call(_thumbs, number) == (0, 1)
+
+
+def test_record_like_falls_back_to_database(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.client.portal.call(_like_without_redis, number)
+    assert seed.redis_call(_thumbs, number) == (1, 0)
+
+
+@pytest.mark.usefixtures("flush_lock")
+def test_flush_batch_writes_back(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.like(number, 3)
+    seed.redis_call(counters._flush_batch, [f"card:{number}"])
+    assert seed.redis_call(_thumbs, number) == (3, 0)
+
+    # 写回之后的点赞重新累加
+    seed.like(number)
+    assert seed.redis_call(_thumbs, number) == (3, 1)
+
+
+@pytest.mark.usefixtures("flush_lock")
+def test_committed_batch_is_not_replayed(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.like(number, 2)
+    # 提交之后、删除批次之前退出：读到的仍然只算一次
+    batch_key = seed.redis_call(_crash_after_commit, f"card:{number}", 2)
+    assert seed.redis_call(_thumbs, number) == (2, 0)
+
+    seed.redis_call(counters._recover_batches)
+    assert not seed.redis_call(_batch_exists, batch_key)
+    assert seed.redis_call(_thumbs, number) == (2, 0)
+
+
+@pytest.mark.usefixtures("flush_lock")
+def test_uncommitted_batch_is_restored(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.like(number, 2)
+    lost = seed.redis_call(_take, f"card:{number}")
+    seed.like(number, 1)
+    rolled_back = seed.redis_call(_crash_after_rollback, f"card:{number}")
+    # 两个批次都没有写进数据库
+    assert seed.redis_call(_thumbs, number) == (0, 0)
+
+    seed.redis_call(counters._recover_batches)
+    assert not seed.redis_call(_batch_exists, lost)
+    assert not seed.redis_call(_batch_exists, rolled_back)
+    assert seed.redis_call(_thumbs, number) == (0, 3)
+
+    seed.redis_call(counters._flush_batch, [f"card:{number}"])
+    assert seed.redis_call(_thumbs, number) == (3, 0)
+
+
+def test_reconcile_card_counts(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0])
+    seed.replies(number, [1, 2])
+    seed.client.portal.call(_corrupt_counts, number)
+
+    since = seed.base - timedelta(seconds=1)
+    assert seed.client.portal.call(_reconcile, since, number) == (True, 2, 0)
+    # 已经一致的卡片不再改写
+    assert seed.client.portal.call(_reconcile, since, number) == (False, 2, 0)
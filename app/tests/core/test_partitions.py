@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import partitions
+from app.core.config import settings
+from app.core.db import engine
+from app.models import DefaultCard
+from app.tests.utils.card import CardSeeder
+
+
+async def _hot_first(numbers: list[int], expected: int) -> tuple[list[int], int]:
+    """hot_first 找到的编号，以及执行了几次查询"""
+    async with AsyncSession(engine) as session:
+        queries = 0
+        exec_ = session.exec
+
+        async def counting_exec(statement: Any, **kwargs: Any) -> Any:
+            nonlocal queries
+            queries += 1
+            return await exec_(statement, **kwargs)
+
+        session.exec = counting_exec  # type: ignore[method-assign]
+        statement = select(DefaultCard.number).where(DefaultCard.number.in_(numbers))
+        rows = await partitions.hot_first(session, statement, DefaultCard.time, expected)
+    return sorted(rows), queries
+
+
+def test_add_months() -> None:
+    month = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(month, 0) == month
+    assert partitions.add_months(month, 1) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    # 跨年
+    assert partitions.add_months(month, 2) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(month, 14) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(month, -11) == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert partitions.add_months(month, -12) == datetime(2024, 11, 1, tzinfo=timezone.utc)
+
+
+def test_month_start() -> None:
+    # 按 UTC 取月初：北京时间 2 月 1 日凌晨仍属于 UTC 的 1 月
+    value = datetime.fromisoformat("2026-02-01T05:30:00+08:00")
+    assert partitions.month_start(value) == datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_create_partition_sql() -> None:
+    sql = partitions.create_partition_sql("defaultcard", datetime(2026, 12, 1, tzinfo=timezone.utc))
+    assert sql == (
+        "CREATE TABLE IF NOT EXISTS defaultcard_y2026m12 PARTITION OF defaultcard "
+        "FOR VALUES FROM ('2026-12-01T00:00:00+00:00') TO ('2027-01-01T00:00:00+00:00')"
+    )
+
+
+def test_upcoming_months() -> None:
+    months = partitions.upcoming_months(datetime(2026, 11, 15, tzinfo=timezone.utc))
+    assert len(months) == settings.CARD_PARTITION_MONTHS_AHEAD + 1
+    assert months[0] == datetime(2026, 11, 1, tzinfo=timezone.utc)
+    assert months[1] == datetime(2026, 12, 1, tzinfo=timezone.utc)
+
+
+def test_hot_first(seed: CardSeeder) -> None:
+    cold_seconds = -(settings.CARD_HOT_WINDOW_DAYS + 1) * 24 * 60 * 60
+    hot, cold = seed.cards([0, cold_seconds])
+
+    # 热数据窗口内找到就不再扫全部分区
+    assert seed.client.portal.call(_hot_first, [hot], 1) == ([hot], 1)
+    # 冷数据在窗口内找不到，回退到不带时间条件的查询
+    assert seed.client.portal.call(_hot_first, [cold], 1) == ([cold], 2)
+    # 只找到一部分时也回退
+    assert seed.client.portal.call(_hot_first, [hot, cold], 2) == ([hot, cold], 2)
+    # 不存在的编号：两次查询都为空
+    assert seed.client.portal.call(_hot_first, [-1], 1) == ([], 2)
@@ -0,0 +1,28 @@
+import asyncio
+
+from app.core import redis_pool
+from app.core.config import settings
+
+
+async def _metrics_around_checkout() -> list[dict]:
+    # 单独的客户端，计数不受应用后台任务的影响
+    redis = redis_pool.create_client()
+    pool = redis.connection_pool
+    try:
+        snapshots = [redis_pool.pool_metrics(redis)]
+        connection = await pool.get_connection()
+        snapshots.append(redis_pool.pool_metrics(redis))
+        await pool.release(connection)
+        snapshots.append(redis_pool.pool_metrics(redis))
+    finally:
+        await redis_pool.close(redis)
+    return snapshots
+
+
+def test_pool_metrics_tracks_connections() -> None:
+    # pool_metrics 读取连接池的私有属性，升级 redis 后这里会先失败
+    idle, busy, released = asyncio.run(_metrics_around_checkout())
+    size = settings.REDIS_MAX_CONNECTIONS
+    assert idle == {"max_connections": size, "created": 0, "in_use": 0, "available": 0}
+    assert busy == {"max_connections": size, "created": 1, "in_use": 1, "available": 0}
+    assert released == {"max_connections": size, "created": 1, "in_use": 0, "available": 1}
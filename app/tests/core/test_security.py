@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core import security
+
+
+def test_password_hash_async_round_trip() -> None:
+    async def run() -> None:
+        hashed = await security.get_password_hash_async("changethis")
+        assert await security.verify_password_async("changethis", hashed)
+        assert not await security.verify_password_async("wrong-password", hashed)
+
+    asyncio.run(run())
+    metrics = security.password_hasher_metrics()
+    assert metrics["completed"] >= 3
+    assert metrics["pending"] == 0
+
+
+def test_password_hasher_rejects_when_full(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_MAX_PENDING", 0)
+    rejected = security.password_hasher_metrics()["rejected"]
+    with pytest.raises(security.PasswordHasherBusy):
+        asyncio.run(security.get_password_hash_async("changethis"))
+    assert security.password_hasher_metrics()["rejected"] == rejected + 1
+
+
+def test_password_hasher_rejects_when_pool_is_full(monkeypatch: pytest.MonkeyPatch) -> None:
+    workers = security.settings.PASSWORD_HASH_WORKERS
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_MAX_PENDING", workers)
+    release = threading.Event()
+
+    async def run() -> None:
+        # 占满线程池：每个任务都阻塞到 release
+        blocked = [asyncio.create_task(security._run_hasher(release.wait)) for _ in range(workers)]
+        try:
+            await asyncio.sleep(0)
+            assert security.password_hasher_metrics()["pending"] == workers
+            with pytest.raises(security.PasswordHasherBusy):
+                await security.get_password_hash_async("changethis")
+        finally:
+            release.set()
+        assert await asyncio.gather(*blocked) == [True] * workers
+        # 排队的任务完成后重新接受
+        hashed = await security.get_password_hash_async("changethis")
+        assert await security.verify_password_async("changethis", hashed)
+
+    asyncio.run(run())
+    assert security.password_hasher_metrics()["pending"] == 0
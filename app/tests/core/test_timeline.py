@@ -0,0 +1,127 @@
+import random
+
+import redis.asyncio as aioredis
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import timeline
+from app.core.config import settings
+from app.core.db import engine
+from app.models import DefaultCard
+from app.tests.utils.card import CardSeeder
+
+
+def _boundary_numbers() -> list[int]:
+    # 跨过位数变化的编号：按字符串比较时 "99..." 排在 "100..." 前面
+    boundary = 10 ** random.randint(10, 17)
+    return [boundary - 2, boundary - 1, boundary, boundary + 1]
+
+
+async def _read_page(redis: aioredis.Redis, category: str, skip: int, limit: int) -> list[int] | None:
+    async with AsyncSession(engine) as session:
+        cards = await timeline.read_page(redis, session, category, skip, limit)
+    return None if cards is None else [card.number for card in cards]
+
+
+async def _rebuild(redis: aioredis.Redis, category: str) -> list[int]:
+    async with AsyncSession(engine) as session:
+        assert await timeline.rebuild(redis, session, category)
+    members = await redis.zrevrange(timeline.TIMELINE_KEY.format(category=category), 0, -1)
+    return [int(member) for member in members]
+
+
+async def _cached_numbers(redis: aioredis.Redis, numbers: list[int]) -> list[int]:
+    bodies = await redis.mget([timeline.CARD_BODY_KEY.format(number=n) for n in numbers])
+    return [DefaultCard.model_validate_json(body).number for body in bodies if body]
+
+
+async def _load(redis: aioredis.Redis, numbers: list[int]) -> list[int]:
+    async with AsyncSession(engine) as session:
+        cards = await timeline.get_cards(redis, session, numbers)
+    return [card.number for card in cards]
+
+
+async def _cached_content(redis: aioredis.Redis, number: int) -> str | None:
+    body = await redis.get(timeline.CARD_BODY_KEY.format(number=number))
+    return None if body is None else DefaultCard.model_validate_json(body).content
+
+
+async def _edit_through_stale_replica(redis: aioredis.Redis, number: int, content: str) -> str | None:
+    """
+    在主库修改卡片并删除缓存，再用落后的只读副本读取，返回读到的内容
+    副本用 REPEATABLE READ 事务模拟：快照在修改之前建立，之后读到的仍是旧内容
+    """
+    replica = create_async_engine(
+        str(settings.SQLALCHEMY_DATABASE_URI), isolation_level="REPEATABLE READ", poolclass=NullPool
+    )
+    try:
+        async with AsyncSession(replica) as stale:
+            await stale.exec(select(DefaultCard.number).where(DefaultCard.number == number))
+            async with AsyncSession(engine) as session:
+                await session.execute(update(DefaultCard).where(DefaultCard.number == number).values(content=content))
+                await session.commit()
+            await timeline.invalidate_cards(redis, [number])
+            (card,) = await timeline.get_cards(redis, stale, [number])
+    finally:
+        await replica.dispose()
+    return card.content
+
+
+def test_card_member_orders_like_numbers() -> None:
+    numbers = [9, 10, 99, 100, 10**18]
+    members = sorted((timeline.card_member(n) for n in numbers), reverse=True)
+    assert [int(member) for member in members] == sorted(numbers, reverse=True)
+
+
+def test_rebuild_orders_equal_times_by_number(seed: CardSeeder) -> None:
+    numbers = seed.cards([0] * 4, numbers=_boundary_numbers())
+    assert seed.redis_call(_rebuild, seed.category) == sorted(numbers, reverse=True)
+
+
+def test_read_page_equal_times_across_pages(seed: CardSeeder) -> None:
+    numbers = sorted(seed.cards([0] * 4, numbers=_boundary_numbers()), reverse=True)
+    assert seed.redis_call(_read_page, seed.category, 0, 2) == numbers[:2]
+    assert seed.redis_call(_read_page, seed.category, 2, 2) == numbers[2:]
+
+
+def test_read_page_while_another_request_rebuilds(seed: CardSeeder) -> None:
+    seed.cards([0])
+
+    async def hold_lock(redis: aioredis.Redis) -> None:
+        await redis.set(timeline.TIMELINE_LOCK_KEY.format(category=seed.category), 1, ex=30)
+
+    async def release_lock(redis: aioredis.Redis) -> None:
+        await redis.delete(timeline.TIMELINE_LOCK_KEY.format(category=seed.category))
+
+    seed.redis_call(hold_lock)
+    try:
+        # 时间线未构建、重建锁被占用时回源数据库
+        assert seed.redis_call(_read_page, seed.category, 0, 10) is None
+    finally:
+        seed.redis_call(release_lock)
+
+
+def test_invalidate_cards(seed: CardSeeder) -> None:
+    numbers = seed.cards([0, 1])
+    assert seed.redis_call(_load, numbers) == numbers
+    assert seed.redis_call(_cached_numbers, numbers) == numbers
+
+    seed.redis_call(timeline.invalidate_cards, numbers[:1])
+    assert seed.redis_call(_cached_numbers, numbers) == numbers[1:]
+
+
+def test_stale_replica_read_is_not_cached(seed: CardSeeder) -> None:
+    (number,) = seed.cards([0], content="before")
+    assert seed.redis_call(_load, [number]) == [number]
+    assert seed.redis_call(_cached_content, number) == "before"
+
+    # 副本读到的旧内容照常返回，但不回填缓存
+    assert seed.redis_call(_edit_through_stale_replica, number, "after") == "before"
+    assert seed.redis_call(_cached_content, number) is None
+
+    # 之后从主库读取时回填新内容
+    assert seed.redis_call(_load, [number]) == [number]
+    assert seed.redis_call(_cached_content, number) == "after"
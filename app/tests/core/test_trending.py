@@ -0,0 +1,73 @@
+import pytest
+import redis.asyncio as aioredis
+from sqlalchemy import update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core import trending
+from app.core.config import settings
+from app.core.db import engine
+from app.models import DefaultCard
+from app.tests.utils.card import CardSeeder
+
+
+async def _set_thumbs(number: int, thumbs: int) -> None:
+    async with AsyncSession(engine) as session:
+        await session.execute(update(DefaultCard).where(DefaultCard.number == number).values(thumbs=thumbs))
+        await session.commit()
+
+
+async def _rebuild(redis: aioredis.Redis, category: str) -> list[tuple[int, float]]:
+    async with AsyncSession(engine) as session:
+        assert await trending.rebuild(redis, session, category)
+    return await _scores(redis, category)
+
+
+async def _scores(redis: aioredis.Redis, category: str) -> list[tuple[int, float]]:
+    members = await redis.zrevrange(trending.TRENDING_KEY.format(category=category), 0, -1, withscores=True)
+    return [(int(member), score) for member, score in members]
+
+
+async def _record(redis: aioredis.Redis, category: str, scores: dict[int, float]) -> None:
+    for number, score in scores.items():
+        await trending.record(redis, category, number, score)
+
+
+async def _decay(redis: aioredis.Redis) -> None:
+    # 应用的后台任务衰减过之后锁还没过期，先释放锁再衰减
+    await redis.delete(trending.TRENDING_DECAY_LOCK_KEY)
+    await trending.decay(redis)
+
+
+def test_decay_factor() -> None:
+    assert trending.decay_factor(0) == 1
+    assert trending.decay_factor(settings.TRENDING_HALF_LIFE_SECONDS) == pytest.approx(0.5)
+    assert trending.decay_factor(2 * settings.TRENDING_HALF_LIFE_SECONDS) == pytest.approx(0.25)
+
+
+def test_rebuild_scores_likes_and_replies(seed: CardSeeder) -> None:
+    plain, liked, replied = seed.cards([0, 1, 2])
+    seed.client.portal.call(_set_thumbs, liked, 2)
+    seed.replies(replied, [3])
+    scores = seed.redis_call(_rebuild, seed.category)
+    # 卡片都是一分钟前发布的，衰减后的分数略低于未衰减的分数
+    fresh = trending.decay_factor(60)
+    new_card = settings.TRENDING_NEW_CARD_SCORE
+    assert [number for number, _ in scores] == [replied, liked, plain]
+    assert dict(scores) == {
+        replied: pytest.approx((new_card + settings.TRENDING_REPLY_WEIGHT) * fresh, rel=1e-3),
+        liked: pytest.approx((new_card + 2 * settings.TRENDING_LIKE_WEIGHT) * fresh, rel=1e-3),
+        plain: pytest.approx(new_card * fresh, rel=1e-3),
+    }
+
+
+def test_decay_scales_and_drops_low_scores(seed: CardSeeder) -> None:
+    kept, dropped = 1, 2
+    low = settings.TRENDING_MIN_SCORE / 2
+    seed.redis_call(_record, seed.category, {kept: 1.0, dropped: low})
+    seed.redis_call(_decay)
+    factor = trending.decay_factor(settings.TRENDING_DECAY_INTERVAL_SECONDS)
+    assert seed.redis_call(_scores, seed.category) == [(kept, pytest.approx(factor))]
+
+    # 同一个周期内只衰减一次
+    seed.redis_call(trending.decay)
+    assert seed.redis_call(_scores, seed.category) == [(kept, pytest.approx(factor))]
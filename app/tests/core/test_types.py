@@ -0,0 +1,17 @@
+from sqlalchemy.dialects import postgresql
+
+from app.core.types import StringArray, parse_pg_array
+
+
+def test_parse_pg_array() -> None:
+    assert parse_pg_array("{a.png,b.png}") == ["a.png", "b.png"]
+    assert parse_pg_array("{}") == []
+
+
+def test_string_array_result_value() -> None:
+    column_type = StringArray()
+    dialect = postgresql.dialect()
+    assert column_type.process_result_value(["a.png", "b.png"], dialect) == ["a.png", "b.png"]
+    assert column_type.process_result_value(list("{a.png,b.png}"), dialect) == ["a.png", "b.png"]
+    assert column_type.process_result_value("{a.png}", dialect) == ["a.png"]
+    assert column_type.process_result_value(None, dialect) is None
@@ -0,0 +1,44 @@
+import uuid
+
+from app.core import user_cache
+
+
+def _snapshot(user_id: str) -> dict:
+    return {
+        "id": user_id,
+        "email": "user@example.com",
+        "is_active": True,
+        "is_superuser": False,
+        "full_name": None,
+        "exp": 0,
+    }
+
+
+def test_local_cache_evicts_least_recently_used() -> None:
+    cache = user_cache._LocalCache(2)
+    cache.set("a", _snapshot("1"))
+    cache.set("b", _snapshot("2"))
+    assert cache.get("a") is not None  # a 变为最近使用
+    cache.set("c", _snapshot("3"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_local_cache_discard_user() -> None:
+    cache = user_cache._LocalCache(10)
+    cache.set("a", _snapshot("1"))
+    cache.set("b", _snapshot("1"))
+    cache.set("c", _snapshot("2"))
+    cache.discard_user("1")
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_to_user() -> None:
+    user_id = uuid.uuid4()
+    user = user_cache.to_user(_snapshot(str(user_id)))
+    assert user.id == user_id
+    assert user.email == "user@example.com"
+    assert user.is_active is True
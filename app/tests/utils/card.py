@@ -0,0 +1,178 @@
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any, TypeVar
+
+import redis.asyncio as aioredis
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.core import counters, timeline, trending
+from app.core.db import engine
+from app.models import AddReplyCard, DefaultCard
+from app.tests.utils.utils import random_lower_string
+
+T = TypeVar("T")
+
+
+def random_category() -> str:
+    # 每个测试使用独立的分类，不受库中已有卡片和 Redis 时间线的影响
+    return f"test-{random_lower_string()[:12]}"
+
+
+async def _insert_cards(rows: list[dict]) -> list[int]:
+    async with AsyncSession(engine) as session:
+        result = await session.execute(insert(DefaultCard).values(rows).returning(DefaultCard.number))
+        numbers = sorted(result.scalars())
+        await session.commit()
+    return numbers
+
+
+async def _insert_replies(rows: list[dict]) -> None:
+    async with AsyncSession(engine) as session:
+        for row in rows:
+            # 和回复接口一样通过 crud.create_reply_card 写入并维护卡片的回复数，再改成指定的发布时间
+            time = row.pop("time")
+            await crud.create_reply_card(session=session, reply_card_in=AddReplyCard(**row))
+            await session.execute(
+                update(AddReplyCard).where(AddReplyCard.number_primary == row["number_primary"]).values(time=time)
+            )
+            await session.commit()
+
+
+async def _record_likes(redis: aioredis.Redis, number: int, amount: int) -> None:
+    async with AsyncSession(engine) as session:
+        await counters.record_like(redis, session, "card", number, amount)
+
+
+async def _discard_likes(redis: aioredis.Redis, numbers: list[int]) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        for number in numbers:
+            pipe.delete(counters.LIKE_DELTA_KEY.format(kind="card", key=number))
+            pipe.srem(counters.LIKE_DIRTY_KEY, f"card:{number}")
+        await pipe.execute()
+
+
+async def _discard_category(redis: aioredis.Redis, category: str) -> None:
+    # 分类是测试独有的，删掉它的时间线和热度榜
+    await redis.delete(
+        timeline.TIMELINE_KEY.format(category=category),
+        timeline.TIMELINE_READY_KEY.format(category=category),
+        trending.TRENDING_KEY.format(category=category),
+        trending.TRENDING_READY_KEY.format(category=category),
+    )
+    await redis.srem(trending.TRENDING_CATEGORIES_KEY, category)
+
+
+async def _delete_cards(numbers: list[int]) -> None:
+    async with AsyncSession(engine) as session:
+        await session.execute(delete(AddReplyCard).where(AddReplyCard.number.in_(numbers)))
+        await session.execute(delete(DefaultCard).where(DefaultCard.number.in_(numbers)))
+        await session.commit()
+
+
+def create_cards(
+    client: TestClient,
+    category: str,
+    times: list[datetime],
+    *,
+    cookie: str = "cookie",
+    content: str | None = None,
+    numbers: list[int] | None = None,
+) -> list[int]:
+    """
+    按给定的发布时间直接插入卡片，返回按插入顺序排列的编号；numbers 不为空时使用指定的编号
+    数据库引擎绑定在应用的事件循环上，所以通过 TestClient 的 portal 执行
+    """
+    rows = [
+        {"id": cookie, "content": content or random_lower_string(), "category": category, "thumbs": 0, "time": time}
+        for time in times
+    ]
+    if numbers is not None:
+        for row, number in zip(rows, numbers, strict=True):
+            row["number"] = number
+    return client.portal.call(_insert_cards, rows)
+
+
+def create_replies(
+    client: TestClient, number: int, times: list[datetime], *, cookie: str = "cookie", content: str | None = None
+) -> list[uuid.UUID]:
+    """按给定的发布时间给卡片 number 插入回复，返回按插入顺序排列的回复主键"""
+    rows = [
+        {
+            "number_primary": uuid.uuid4(),
+            "number": number,
+            "id": cookie,
+            "content": content or random_lower_string(),
+            "reply": None,
+            "thumbs": 0,
+            "time": time,
+        }
+        for time in times
+    ]
+    keys = [row["number_primary"] for row in rows]
+    client.portal.call(_insert_replies, rows)
+    return keys
+
+
+def remove_cards(client: TestClient, numbers: list[int]) -> None:
+    """删除卡片和它们的回复"""
+    client.portal.call(_delete_cards, numbers)
+
+
+class CardSeeder:
+    """
+    测试数据：在独立的分类下按相对时间（秒）插入卡片和回复，cleanup 时统一删除
+    时间从一分钟前算起，都在热数据分区和 since 同步的补发窗口之内
+    """
+
+    def __init__(self, client: TestClient) -> None:
+        self.client = client
+        self.category = random_category()
+        self.base = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.numbers: list[int] = []
+
+    def at(self, seconds: float) -> datetime:
+        return self.base + timedelta(seconds=seconds)
+
+    def cards(
+        self,
+        seconds: list[float],
+        *,
+        category: str | None = None,
+        cookie: str = "cookie",
+        content: str | None = None,
+        numbers: list[int] | None = None,
+    ) -> list[int]:
+        numbers = create_cards(
+            self.client,
+            category or self.category,
+            [self.at(s) for s in seconds],
+            cookie=cookie,
+            content=content,
+            numbers=numbers,
+        )
+        self.numbers.extend(numbers)
+        return numbers
+
+    def replies(
+        self, number: int, seconds: list[float], *, cookie: str = "cookie", content: str | None = None
+    ) -> list[str]:
+        replies = create_replies(self.client, number, [self.at(s) for s in seconds], cookie=cookie, content=content)
+        return [str(reply) for reply in replies]
+
+    def like(self, number: int, amount: int = 1) -> None:
+        """记录 amount 个尚未写回的点赞增量（和点赞接口一样走 counters.record_like）"""
+        self.redis_call(_record_likes, number, amount)
+
+    def redis_call(self, func: Callable[..., Awaitable[T]], *args: Any) -> T:
+        """在应用的事件循环上用应用的 Redis 客户端执行 func(redis, *args)"""
+        return self.client.portal.call(func, self.client.app.state.redis, *args)
+
+    def cleanup(self) -> None:
+        self.redis_call(_discard_category, self.category)
+        if self.numbers:
+            self.redis_call(_discard_likes, self.numbers)
+            remove_cards(self.client, self.numbers)
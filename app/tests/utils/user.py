@@ -47,3 +47,18 @@ def authentication_token_from_email(
         user = crud.update_user(session=db, db_user=user, user_in=user_in_update)
 
     return user_authentication_headers(client=client, email=email, password=password)
+
+
+def create_user_through_api(
+    *, client: TestClient, superuser_token_headers: dict[str, str]
+) -> tuple[str, str, str]:
+    """通过超级用户的创建接口新建普通用户，返回 (用户 id, 邮箱, 密码)"""
+    email = random_email()
+    password = random_lower_string()
+    r = client.post(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        json={"email": email, "password": password},
+    )
+    assert r.status_code == 200
+    return r.json()["id"], email, password
@@ -1,8 +1,12 @@
+import base64
+import binascii
+import json
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
+from zoneinfo import ZoneInfo
 
 import emails  # type: ignore
 import jwt
@@ -123,32 +127,98 @@ def verify_password_reset_token(token: str) -> str | None:
         return None
 
 
-def process_image_urls(card_instance: Any) -> None:
+def encode_cursor(*values: Any) -> str:
     """
-    处理卡片实例中的图片URL列表，将字符分割的URL重新组合成正确的格式
-    
+    将排序键编码为不透明的分页游标（base64url 编码的 JSON 数组）
+
+    Args:
+        values: 最后一条记录的排序键，例如 (time, number)
+    """
+    raw = json.dumps(values, default=str, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any] | None:
+    """
+    解码 encode_cursor 生成的游标，格式不正确或长度不符时返回 None
+
+    Args:
+        cursor: 客户端回传的游标
+        size: 期望的排序键个数
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+# 卡片时间以前是客户端上传的字符串，这里按常见格式依次尝试解析（迁移回填旧数据时使用）
+CARD_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d-%H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+)
+
+
+def parse_card_time(value: str | None) -> datetime | None:
+    """
+    解析卡片的 time 字符串，无法识别时返回 None
+
+    Args:
+        value: 客户端上传的时间字符串
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in CARD_TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def localize_card_time(value: datetime) -> datetime:
+    """
+    不带时区的卡片时间视为 CARD_TIME_ZONE 的本地时间（客户端看到和传回的都是这个时区）
+
+    Args:
+        value: 卡片时间
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=ZoneInfo(settings.CARD_TIME_ZONE))
+    return value
+
+
+def format_card_time(value: datetime) -> str:
+    """
+    卡片时间输出给客户端的格式，与原来客户端上传的字符串保持一致：CARD_TIME_ZONE 下的 "%Y-%m-%d %H:%M:%S"
+
+    Args:
+        value: 数据库中的 timestamptz，不带时区时视为 CARD_TIME_ZONE 的本地时间
+    """
+    zone = ZoneInfo(settings.CARD_TIME_ZONE)
+    return localize_card_time(value).astimezone(zone).strftime(CARD_TIME_FORMATS[0])
+
+
+def parse_cursor_time(value: Any) -> datetime:
+    """
+    游标中的卡片时间（ISO 格式）转回 datetime，格式不对时抛出 ValueError
+
     Args:
-        card_instance: 包含 imageUrls 属性的卡片实例
+        value: encode_cursor 写入的时间字符串
     """
-    if hasattr(card_instance, 'imageUrls') and \
-       card_instance.imageUrls is not None and \
-       isinstance(card_instance.imageUrls, list) and \
-       len(card_instance.imageUrls) > 0:
-        
-        first_val = card_instance.imageUrls[0]
-        if len(card_instance.imageUrls) > 1:
-            last_val = card_instance.imageUrls[-1]
-        else:
-            last_val = None
-
-        if isinstance(first_val, str) and first_val == '{' and \
-           isinstance(last_val, str) and last_val == '}':
-            
-            rejoined_string = "".join(str(char_or_item) for char_or_item in card_instance.imageUrls)
-            
-            if rejoined_string.startswith("{") and rejoined_string.endswith("}"):
-                stripped_value = rejoined_string[1:-1]
-                if not stripped_value:  # Handles empty array string "{}"
-                    card_instance.imageUrls = []
-                else:
-                    card_instance.imageUrls = [item.strip() for item in stripped_value.split(',') if item.strip()]
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
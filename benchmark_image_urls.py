@@ -0,0 +1,51 @@
+# 对比一页卡片的 imageUrls 解码：旧的响应模型逐行修复 vs. 列类型在驱动层解码
+# 两种方式使用同一份驱动返回值，只计时解码这一步，不包括构造模型和序列化
+# 在项目根目录运行: python benchmark_image_urls.py
+import timeit
+from typing import Any
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.types import StringArray
+
+PAGE_SIZE = 50
+ROUNDS = 20000
+
+URLS = ["/images/a.png", "/images/b.png", "/images/c.png"]
+# 驱动返回的两种值：按字符拆开的旧数据，以及正常的列表
+PAGES = {
+    "按字符拆开的旧数据": [list("{" + ",".join(URLS) + "}") for _ in range(PAGE_SIZE)],
+    "正常数据": [list(URLS) for _ in range(PAGE_SIZE)],
+}
+
+
+def legacy_decode(urls: Any) -> Any:
+    """原来 DefaultCardResponse 的 model_validator 对每张卡片做的修复"""
+    if urls and len(urls) > 1 and urls[0] == "{" and urls[-1] == "}":
+        stripped_value = "".join(str(c) for c in urls)[1:-1]
+        return [item.strip() for item in stripped_value.split(",") if item.strip()]
+    return urls
+
+
+def legacy_page(values: list[Any]) -> list[Any]:
+    return [legacy_decode(urls) for urls in values]
+
+
+COLUMN_TYPE = StringArray()
+DIALECT = postgresql.dialect()
+
+
+def decoded_page(values: list[Any]) -> list[Any]:
+    return [COLUMN_TYPE.process_result_value(urls, DIALECT) for urls in values]
+
+
+if __name__ == "__main__":
+    print(f"每页 {PAGE_SIZE} 张卡片")
+    for name, values in PAGES.items():
+        assert legacy_page(values) == decoded_page(values) == [URLS] * PAGE_SIZE
+        legacy = timeit.timeit(lambda values=values: legacy_page(values), number=ROUNDS) / ROUNDS
+        decoded = timeit.timeit(lambda values=values: decoded_page(values), number=ROUNDS) / ROUNDS
+        print(f"{name}:")
+        print(f"  逐行修复: {legacy * 1e6:.1f} us/页")
+        print(f"  列类型解码: {decoded * 1e6:.1f} us/页")
+        print(f"  差别: {(legacy - decoded) * 1e6:.1f} us ({(1 - decoded / legacy) * 100:.1f}%)")
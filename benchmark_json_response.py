@@ -0,0 +1,74 @@
+# 对比一页话题卡片（中文内容）的响应序列化：
+# 旧路径：响应模型再校验一遍 + 标准库 json 编码（FastAPI 默认的 JSONResponse）
+# 新路径：model_construct 跳过校验，pydantic-core 直接输出 bytes（getCard 的 _json_response），
+#         以及其余接口默认使用的 ORJSONResponse
+# 在项目根目录运行: python benchmark_json_response.py
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from pydantic import TypeAdapter
+
+from app.models import DefaultCard, DefaultCardResponse
+
+PAGE_SIZE = 50
+ROUNDS = 2000
+
+adapter = TypeAdapter(DefaultCardResponse)
+
+
+def make_page() -> list[DefaultCard]:
+    now = datetime(2024, 5, 1, 4, 0, 0, tzinfo=timezone.utc)
+    return [
+        DefaultCard(
+            number=i,
+            id="cookie",
+            content="今天食堂的麻辣香锅又涨价了，有没有同学知道哪里还有便宜好吃的？" * 3,
+            time=now - timedelta(minutes=i),
+            category="time",
+            thumbs=i,
+            imageUrls=["/images/a.png", "/images/b.png"],
+            reply_count=i % 7,
+            favorite_count=i % 3,
+        )
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def stdlib_page(cards: list[DefaultCard]) -> bytes:
+    # FastAPI 的 serialize_response：按 response_model 校验，再转成 JSON 兼容的 Python 对象
+    value = adapter.validate_python({"data": cards}, from_attributes=True)
+    content = adapter.dump_python(value, mode="json")
+    # starlette JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_page(cards: list[DefaultCard]) -> bytes:
+    value = adapter.validate_python({"data": cards}, from_attributes=True)
+    return orjson.dumps(adapter.dump_python(value, mode="json"))
+
+
+def construct_page(cards: list[DefaultCard]) -> bytes:
+    model = DefaultCardResponse
+    return model.__pydantic_serializer__.to_json(model.model_construct(data=cards))
+
+
+def cpu_per_page(render, cards: list[DefaultCard]) -> float:
+    started = time.process_time()
+    for _ in range(ROUNDS):
+        render(cards)
+    return (time.process_time() - started) / ROUNDS
+
+
+if __name__ == "__main__":
+    cards = make_page()
+    expected = json.loads(stdlib_page(cards))
+    assert json.loads(orjson_page(cards)) == expected
+    assert json.loads(construct_page(cards)) == expected
+    baseline = cpu_per_page(stdlib_page, cards)
+    print(f"每页 {PAGE_SIZE} 张卡片，单进程 CPU 时间")
+    print(f"校验 + 标准库 json: {baseline * 1e6:.1f} us/页")
+    for name, render in (("校验 + orjson", orjson_page), ("跳过校验直接序列化", construct_page)):
+        cost = cpu_per_page(render, cards)
+        print(f"{name}: {cost * 1e6:.1f} us/页 ({(1 - cost / baseline) * 100:.1f}% 减少)")
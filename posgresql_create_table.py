@@ -7,6 +7,7 @@ import time
 # --- IMPORTANT: Adjust this import path if necessary ---
 try:
     from app.models import User, Item, DefaultCard, AddReplyCard, Cookie, ReplyLike
+    from app.core import partitions
 except ImportError as e:
     print(f"Error importing models: {e}")
     sys.exit(1)
@@ -69,8 +70,18 @@ def create_db_and_tables():
                 return
             
             print("No existing tables found. Creating tables...")
+            # 内容搜索的 GIN 索引依赖 pg_trgm 扩展
+            with engine.begin() as ext_connection:
+                ext_connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
             # SQLModel.metadata.create_all will issue CREATE TABLE IF NOT EXISTS statements
             SQLModel.metadata.create_all(engine)
+            # 卡片表和回复表是按月分区的父表，需要先建好分区才能写入
+            months = partitions.upcoming_months()
+            with engine.begin() as partition_connection:
+                for table in partitions.PARTITIONED_TABLES:
+                    partition_connection.execute(text(partitions.create_archive_sql(table, months[0])))
+                    for month in months:
+                        partition_connection.execute(text(partitions.create_partition_sql(table, month)))
             print("Tables created successfully.")
     except Exception as e:
         print(f"Error checking/creating tables: {e}")